@@ -0,0 +1,119 @@
+# one agent per deployment, loaded on first use and evicted least recently used first
+#
+# an entry holds a deployment's agent, its last action (for the thrashing penalty) and a
+# versioned read-only snapshot for decisions. entries are loaded, changed, evicted and
+# saved by the caller's single writer (the server's learner), so only the LRU order is
+# shared with the reader threads. an evicted entry that learned something is saved to its
+# model file first, and loading it again later picks up where it left off.
+import collections
+import re
+import threading
+from typing import Callable, Dict, List, Optional
+from learner import Snapshot
+
+# kubernetes object names (RFC 1123), also safe as file names
+DEPLOYMENT_NAME = re.compile(r"^[a-z0-9]([-a-z0-9.]{0,251}[a-z0-9])?$")
+
+
+def check_deployment_name(name: str) -> str:
+    if not DEPLOYMENT_NAME.match(name or ""):
+        raise ValueError(f"Invalid deployment name: {name!r}")
+    return name
+
+
+class RegisteredAgent:
+    def __init__(self, name: str, agent):
+        self.name = name
+        self.agent = agent
+        self.previous_action: Optional[int] = None
+        self.steps = 0
+        # learned since it was loaded or last saved
+        self.dirty = False
+        self.snapshot = Snapshot(1, agent.snapshot())
+
+    def publish(self):
+        self.snapshot = Snapshot(self.snapshot.version + 1, self.agent.snapshot())
+
+    def info(self) -> dict:
+        return {"deployment": self.name, "version": self.snapshot.version, "steps": self.steps, "dirty": self.dirty}
+
+
+class AgentRegistry:
+    def __init__(
+        self,
+        load_agent: Callable[[str], object],
+        save_agent: Callable[[str, object], None],
+        agent_bytes: Callable[[object], int],
+        max_agents: int = 32,
+        max_bytes: int = 512 * 1024 * 1024,
+    ):
+        # load_agent(name) returns the saved agent of a deployment or a fresh one
+        self.load_agent = load_agent
+        self.save_agent = save_agent
+        self.agent_bytes = agent_bytes
+        self.max_agents = max_agents
+        self.max_bytes = max_bytes
+
+        self.entries: "collections.OrderedDict[str, RegisteredAgent]" = collections.OrderedDict()
+        # guards the order of entries, which readers update on every lookup
+        self.lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @property
+    def nbytes(self) -> int:
+        with self.lock:
+            agents = [entry.agent for entry in self.entries.values()]
+        return sum(self.agent_bytes(agent) for agent in agents)
+
+    # reader side: the loaded entry (marked as recently used) or None
+    def peek(self, name: str) -> Optional[RegisteredAgent]:
+        with self.lock:
+            entry = self.entries.get(name)
+            if entry is not None:
+                self.entries.move_to_end(name)
+            return entry
+
+    # writer side: the entry of a deployment, loading it and evicting others when needed
+    def get(self, name: str) -> RegisteredAgent:
+        entry = self.peek(name)
+        if entry is not None:
+            return entry
+
+        entry = RegisteredAgent(check_deployment_name(name), self.load_agent(name))
+        with self.lock:
+            self.entries[name] = entry
+        self._evict(keep=name)
+        return entry
+
+    def _evict(self, keep: str):
+        while len(self.entries) > 1:
+            if len(self.entries) <= self.max_agents and self.nbytes <= self.max_bytes:
+                return
+            with self.lock:
+                name = next(iter(self.entries))
+                if name == keep:
+                    return
+                entry = self.entries.pop(name)
+            if entry.dirty:
+                self.save_agent(name, entry.agent)
+            self.evictions += 1
+
+    # writer side: saves every entry that learned something since its last save
+    def save_dirty(self) -> List[str]:
+        with self.lock:
+            entries = list(self.entries.values())
+        saved = []
+        for entry in entries:
+            if entry.dirty:
+                self.save_agent(entry.name, entry.agent)
+                entry.dirty = False
+                saved.append(entry.name)
+        return saved
+
+    def info(self) -> Dict:
+        with self.lock:
+            entries = [entry.info() for entry in self.entries.values()]
+        return {"loaded": entries, "max_agents": self.max_agents, "max_bytes": self.max_bytes, "evictions": self.evictions}
@@ -16,8 +16,13 @@ class EpsilonGreedyBandit:
         self.epsilon = epsilon
 
         # [state][action] -> Q value
-        self.q_values: List[List[float]] = [[APP_CONFIG["rl_hyperparameters"]["q_value_init"]] * arms_count for _ in range(num_states)]
-        self.action_counts: List[List[int]] = [[APP_CONFIG["logic_constants"]["action_count_init"]] * arms_count for _ in range(num_states)]
+        self.q_values, self.action_counts = self._new_tables()
+
+    # subclasses can store the tables differently
+    def _new_tables(self):
+        q_values: List[List[float]] = [[APP_CONFIG["rl_hyperparameters"]["q_value_init"]] * self.arms for _ in range(self.num_states)]
+        action_counts: List[List[int]] = [[APP_CONFIG["logic_constants"]["action_count_init"]] * self.arms for _ in range(self.num_states)]
+        return q_values, action_counts
 
     # returns the action with the highest Q value if the probability is higher than epsilon, else a random action
     def select_action(self, state: int) -> int:
@@ -1,7 +1,18 @@
 # filters actions based on their safety and catastrophic failure rates
-from typing import List
+from typing import List, Optional
+import numpy as np
 from config_loader import APP_CONFIG
 from agents.bandit.bandit import EpsilonGreedyBandit
+from agents.q_learning.q_learning import STORAGE_NUMPY, STORAGE_SPARSE
+from agents.sparse_table import SparseTable, add_at
+
+
+# [valid_pod_states, num_actions] mask of the actions the pod limits allow for each pod count
+def build_pod_limit_masks(valid_pod_states: int, num_actions: int) -> np.ndarray:
+    masks = np.ones((valid_pod_states, num_actions), dtype=bool)
+    masks[0, APP_CONFIG["actions"]["scale_down"]] = False
+    masks[valid_pod_states - 1, APP_CONFIG["actions"]["scale_up"]] = False
+    return masks
 
 
 class SafetyBandit(EpsilonGreedyBandit):
@@ -12,38 +23,151 @@ class SafetyBandit(EpsilonGreedyBandit):
         epsilon: float = APP_CONFIG["rl_hyperparameters"]["epsilon"],
         catastrophic_penalty: float = APP_CONFIG["rl_hyperparameters"]["catastrophic_penalty"],
         safe_reward: float = APP_CONFIG["rewards"]["safe_reward"],
+        max_failure_rate: float = 0.4,
+        min_tries: int = 200,
+        storage: str = STORAGE_NUMPY,
     ):
+        if storage not in (STORAGE_NUMPY, STORAGE_SPARSE):
+            raise ValueError(f"Unknown bandit storage: {storage}")
+        # sparse: every per-state table only holds the states an outcome was recorded for
+        self.storage = storage
         super().__init__(num_states=num_states, arms_count=arms_count, epsilon=epsilon)
         self.catastrophic_penalty = catastrophic_penalty
         self.safe_reward = safe_reward
+        # the thresholds the cached safe-action bits are kept for
+        self.max_failure_rate = max_failure_rate
+        self.min_tries = min_tries
+
+        failure_count_init = APP_CONFIG["logic_constants"]["failure_count_init"]
+        if storage == STORAGE_SPARSE:
+            self.failure_counts = SparseTable(num_states, (self.arms,), failure_count_init, dtype=np.int64)
+        else:
+            self.failure_counts = np.full((num_states, self.arms), failure_count_init, dtype=np.int64)
+
+        self._bit_values = 1 << np.arange(self.arms, dtype=np.int64)
+        self.all_actions_bits = (1 << self.arms) - 1
+        self._bits_to_actions = [
+            [action for action in range(self.arms) if bits >> action & 1]
+            for bits in range(1 << self.arms)
+        ]
+
+        # actions the pod limits allow in each state, the pod index is the last part of the state
+        valid_pod_states = APP_CONFIG["system_limits"]["max_pods"] - APP_CONFIG["system_limits"]["min_pods"] + 1
+        pod_limit_bits = build_pod_limit_masks(valid_pod_states, self.arms) @ self._bit_values
+
+        # safe_bits: actions the failure rates allow, allowed_bits: safe (or every action
+        # when nothing is safe) and inside the pod limits
+        if storage == STORAGE_SPARSE:
+            # an untouched state has the initial counts, so its bits only depend on the pod count
+            initial_counts = np.full(self.arms, APP_CONFIG["logic_constants"]["action_count_init"], dtype=np.int64)
+            initial_failures = np.full(self.arms, failure_count_init, dtype=np.int64)
+            initial_safe_bits = int(self._compute_safe(initial_counts, initial_failures, max_failure_rate, min_tries) @ self._bit_values)
+            self.pod_limit_bits = SparseTable(num_states, defaults=pod_limit_bits, dtype=np.int64)
+            self.safe_bits = SparseTable(num_states, default=initial_safe_bits, dtype=np.int64)
+            self.allowed_bits = SparseTable(num_states, defaults=(initial_safe_bits or self.all_actions_bits) & pod_limit_bits, dtype=np.int64)
+        else:
+            self.pod_limit_bits = pod_limit_bits[np.arange(num_states) % valid_pod_states]
+            self.safe_bits = np.zeros(num_states, dtype=np.int64)
+            self.allowed_bits = np.zeros(num_states, dtype=np.int64)
+        self.refresh_safety()
+
+    def _new_tables(self):
+        if self.storage == STORAGE_SPARSE:
+            return (
+                SparseTable(self.num_states, (self.arms,), APP_CONFIG["rl_hyperparameters"]["q_value_init"], dtype=np.float64),
+                SparseTable(self.num_states, (self.arms,), APP_CONFIG["logic_constants"]["action_count_init"], dtype=np.int64),
+            )
+        # [state, action] int array instead of nested lists
+        q_values, action_counts = super()._new_tables()
+        return q_values, np.asarray(action_counts, dtype=np.int64)
 
-        self.failure_counts: List[List[int]] = [[APP_CONFIG["logic_constants"]["failure_count_init"]] * self.arms for _ in range(num_states)]
+    def _compute_safe(self, counts: np.ndarray, failures: np.ndarray, max_failure_rate: float, min_tries: int) -> np.ndarray:
+        return (counts < min_tries) | (failures / np.maximum(counts, 1) <= max_failure_rate)
+
+    # recomputes the cached bits of the given states (all states by default)
+    # needed after action_counts/failure_counts were written directly
+    def refresh_safety(self, states=None):
+        if states is None and self.storage == STORAGE_SPARSE:
+            states = np.union1d(self.action_counts.stored_rows(), self.failure_counts.stored_rows())
+        elif states is None:
+            states = slice(None)
+        safe_bits = self._compute_safe(self.action_counts[states], self.failure_counts[states], self.max_failure_rate, self.min_tries) @ self._bit_values
+        self.safe_bits[states] = safe_bits
+        self.allowed_bits[states] = np.where(safe_bits == 0, self.all_actions_bits, safe_bits) & self.pod_limit_bits[states]
+
+    def _refresh_state(self, state: int):
+        counts = self.action_counts[state].tolist()
+        failures = self.failure_counts[state].tolist()
+        bits = 0
+        for action in range(self.arms):
+            if counts[action] < self.min_tries or failures[action] / max(counts[action], 1) <= self.max_failure_rate:
+                bits |= 1 << action
+        self.safe_bits[state] = bits
+        self.allowed_bits[state] = (bits or self.all_actions_bits) & int(self.pod_limit_bits[state])
+
+    # replaces the counters (e.g. loaded from a model file)
+    # copy=False keeps matching arrays (like shared or memory-mapped ones) as they are
+    # sparse storage keeps only the states whose counters differ from the initial ones
+    def load_counts(self, action_counts, failure_counts, copy: bool = True):
+        convert = np.asarray if not copy or self.storage == STORAGE_SPARSE else np.array
+        action_counts = convert(action_counts, dtype=np.int64)
+        failure_counts = convert(failure_counts, dtype=np.int64)
+        if action_counts.shape != (self.num_states, self.arms) or failure_counts.shape != (self.num_states, self.arms):
+            raise ValueError(f"Bandit count shapes {action_counts.shape}, {failure_counts.shape} do not match ({self.num_states}, {self.arms})")
+        if self.storage == STORAGE_SPARSE:
+            action_counts = SparseTable.from_dense(action_counts, defaults=self.action_counts.defaults)
+            failure_counts = SparseTable.from_dense(failure_counts, defaults=self.failure_counts.defaults)
+        self.action_counts = action_counts
+        self.failure_counts = failure_counts
+        self.refresh_safety()
+
+    # EpsilonGreedyBandit.updateAction with [state, action] indexing, a sparse row read
+    # through [state] is a read-only default until the state is first written
+    def updateAction(self, state: int, action: int, reward: float):
+        if self.storage != STORAGE_SPARSE:
+            return super().updateAction(state, action, reward)
+
+        self.action_counts[state, action] += 1
+        learning_rate = max(APP_CONFIG["logic_constants"]["min_learning_rate"], APP_CONFIG["logic_constants"]["update_factor_numerator"] / self.action_counts[state, action])
+        old_q = self.q_values[state, action]
+        self.q_values[state, action] = old_q + learning_rate * (reward - old_q)
 
     # gives bad reward if the outcome is a catastrophic failure
     # else gives safe reward
     def update_from_outcome(self, state: int, action: int, is_catastrophic_failure: bool):
         if is_catastrophic_failure:
             reward = self.catastrophic_penalty
-            self.failure_counts[state][action] += APP_CONFIG["logic_constants"]["failure_count_increment"]
+            self.failure_counts[state, action] += APP_CONFIG["logic_constants"]["failure_count_increment"]
         else:
             reward = self.safe_reward
 
         self.updateAction(state, action, reward)
+        self._refresh_state(state)
+
+    # counts a batch of outcomes at once, repeated (state, action) pairs add up
+    # only the counters feed the safety check, so the bandit Q values are left alone
+    def update_from_outcomes(self, states, actions, is_catastrophic_failures):
+        states = np.asarray(states, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64)
+        failures = np.asarray(is_catastrophic_failures, dtype=bool)
+
+        add_at(self.action_counts, (states, actions), 1)
+        add_at(self.failure_counts, (states[failures], actions[failures]), APP_CONFIG["logic_constants"]["failure_count_increment"])
+        # duplicate states just recompute the same bits
+        self.refresh_safety(states)
+
+    # without max_failure_rate the bandit's own thresholds are used (a cached lookup)
+    def get_safe_actions(self, state: int, max_failure_rate: Optional[float] = None, min_tries: int = APP_CONFIG["logic_constants"]["min_tries_default"]) -> List[int]:
+        if max_failure_rate is None or (max_failure_rate == self.max_failure_rate and min_tries == self.min_tries):
+            return list(self._bits_to_actions[self.safe_bits[state]])
+
+        safe = self._compute_safe(self.action_counts[state], self.failure_counts[state], max_failure_rate, min_tries)
+        return np.flatnonzero(safe).tolist()
 
-    def get_safe_actions(self,state: int, max_failure_rate: float, min_tries: int = APP_CONFIG["logic_constants"]["min_tries_default"]) -> List[int]:
-        safe = []
-        for i in range(self.arms):
-            total_count = self.action_counts[state][i]
-            if total_count < min_tries:
-                safe.append(i)
-                continue
-            
-            failures_count = self.failure_counts[state][i]
-            failure_rate = failures_count / total_count
-            
-            if failure_rate <= max_failure_rate:
-                safe.append(i)
-
-        return safe
-    
+    # safe actions inside the pod limits, every in-limit action when none is safe
+    def get_allowed_actions(self, state: int) -> List[int]:
+        return list(self._bits_to_actions[self.allowed_bits[state]])
 
+    # [len(states), arms] boolean version of get_allowed_actions for a batch of states
+    def allowed_masks(self, states) -> np.ndarray:
+        return (self.allowed_bits[np.asarray(states, dtype=np.int64)][:, None] & self._bit_values) != 0
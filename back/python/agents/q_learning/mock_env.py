@@ -1,29 +1,36 @@
 #train and check q-learning agent in a mock kubernetes environment
 import random
 from typing import Tuple
-from config_loader import APP_CONFIG
+from config_loader import AppConfig, get_config, subscribe
+from state_codec import StateCodec
+from agents.q_learning import reward_model
 
 def calculate_reward(cpu_bucket: int, ram_bucket: int, replicas: int, action: int, last_action: int = None, done: bool = False) -> float:
     
-    ideal_cpu = APP_CONFIG["logic_constants"]["ideal_cpu_level"]
-    ideal_ram = APP_CONFIG["logic_constants"]["ideal_ram_level"]
-    ideal_replicas = APP_CONFIG["logic_constants"]["ideal_replicas"]
-    high_threshold = APP_CONFIG["logic_constants"]["high_load_threshold"]
-    waste_threshold = APP_CONFIG["logic_constants"]["low_load_threshold"]
+    config = get_config()
+    constants = config.logic_constants
+    actions = config.actions
+    rewards = config.rewards
+
+    ideal_cpu = constants.ideal_cpu_level
+    ideal_ram = constants.ideal_ram_level
+    ideal_replicas = constants.ideal_replicas
+    high_threshold = constants.high_load_threshold
+    waste_threshold = constants.low_load_threshold
     
-    min_pods = APP_CONFIG["system_limits"]["min_pods"]
+    min_pods = config.system_limits.min_pods
     
-    action_scale_up = APP_CONFIG["actions"]["scale_up"]
-    action_scale_down = APP_CONFIG["actions"]["scale_down"]
-    action_restart = APP_CONFIG["actions"]["restart"]
+    action_scale_up = actions.scale_up
+    action_scale_down = actions.scale_down
+    action_restart = actions.restart
     
-    reward_ideal = APP_CONFIG["rewards"]["mock_ideal"]
-    reward_waste = APP_CONFIG["rewards"]["mock_waste"]
-    penalty_cpu_high = APP_CONFIG["rewards"]["mock_cpu_high_load"]
-    penalty_ram_high = APP_CONFIG["rewards"]["mock_ram_high_load"]
-    penalty_restart = APP_CONFIG["rewards"]["mock_restart_penalty"]
-    penalty_thrashing = APP_CONFIG["rewards"]["mock_thrashing_penalty"]
-    penalty_catastrophic = APP_CONFIG["rl_hyperparameters"]["catastrophic_failure_penalty"]
+    reward_ideal = rewards.mock_ideal
+    reward_waste = rewards.mock_waste
+    penalty_cpu_high = rewards.mock_cpu_high_load
+    penalty_ram_high = rewards.mock_ram_high_load
+    penalty_restart = rewards.mock_restart_penalty
+    penalty_thrashing = rewards.mock_thrashing_penalty
+    penalty_catastrophic = config.catastrophic_failure_penalty
     
     if done:
         return penalty_catastrophic
@@ -81,22 +88,42 @@ def calculate_reward(cpu_bucket: int, ram_bucket: int, replicas: int, action: in
 
 class MockKubernetesEnv:
     def __init__(self):
-        self.min_pods = APP_CONFIG["system_limits"]["min_pods"]
-        self.max_pods = APP_CONFIG["system_limits"]["max_pods"]
-        self.num_buckets = APP_CONFIG["metrics_config"]["num_buckets"]
+        self._apply_config(get_config())
         
         self.cpu_bucket = self.num_buckets // 2
         self.ram_bucket = self.num_buckets // 2
-        self.replicas = APP_CONFIG["logic_constants"]["initial_replicas"]
-        self.step_count = APP_CONFIG["logic_constants"]["initial_step_count"]
-        self.max_steps = APP_CONFIG["rl_hyperparameters"]["max_steps"]
+        self.replicas = self.initial_replicas
+        self.step_count = self.initial_step_count
+        self.reward_model = reward_model.RewardModel()
+
+        # config changes from ZK apply from the next step on
+        subscribe(self._apply_config)
+
+    # copies the values step() needs out of the config once, instead of on every call
+    def _apply_config(self, config: AppConfig):
+        constants = config.logic_constants
+        self.min_pods = config.system_limits.min_pods
+        self.max_pods = config.system_limits.max_pods
+        self.num_buckets = config.metrics_config.num_buckets
+        self.max_steps = config.rl_hyperparameters.max_steps
+        self.valid_pod_states = config.valid_pod_states
+        self.codec = StateCodec.from_config(config)
+
+        self.step_size = constants.step_size
+        self.min_level = constants.min_level
+        self.critical_offset = constants.critical_load_offset
+        self.critical_min_pods = constants.critical_min_pods
+        self.initial_replicas = constants.initial_replicas
+        self.initial_step_count = constants.initial_step_count
+        self.noise_choices = [-self.step_size, 0, self.step_size]
+
+        self.action_scale_up = config.actions.scale_up
+        self.action_scale_down = config.actions.scale_down
+        self.action_no_action = config.actions.no_action
+        self.action_restart = config.actions.restart
 
     def _encode_state(self) -> int:
-        valid_pod_states = self.max_pods - self.min_pods + 1
-        
-        pod_index = self.replicas - self.min_pods
-        
-        return (self.cpu_bucket * self.num_buckets + self.ram_bucket) * valid_pod_states + pod_index
+        return self.codec.encode(self.cpu_bucket, self.ram_bucket, self.replicas)
 
     # resets the environment
     # returns the initial state
@@ -104,20 +131,17 @@ class MockKubernetesEnv:
         self.cpu_bucket = random.choice(range(self.num_buckets))
         self.ram_bucket = random.choice(range(self.num_buckets))
         self.replicas = random.randint(self.min_pods, self.max_pods)
-        self.step_count = APP_CONFIG["logic_constants"]["initial_step_count"]
+        self.step_count = self.initial_step_count
         return self._encode_state()
     
     def is_failure(self, action: int) -> bool:
-        if action == APP_CONFIG["actions"]["scale_down"] and self.replicas <= self.min_pods:
+        if action == self.action_scale_down and self.replicas <= self.min_pods:
             return True
-        if action == APP_CONFIG["actions"]["scale_up"] and self.replicas >= self.max_pods:
+        if action == self.action_scale_up and self.replicas >= self.max_pods:
             return True
-            
-        critical_offset = APP_CONFIG["logic_constants"]["critical_load_offset"]
-        critical_min_pods = APP_CONFIG["logic_constants"]["critical_min_pods"]
         
-        if (self.cpu_bucket >= self.num_buckets - critical_offset or self.ram_bucket >= self.num_buckets - critical_offset) and self.replicas <= critical_min_pods:
-            if action != APP_CONFIG["actions"]["scale_up"]:
+        if (self.cpu_bucket >= self.num_buckets - self.critical_offset or self.ram_bucket >= self.num_buckets - self.critical_offset) and self.replicas <= self.critical_min_pods:
+            if action != self.action_scale_up:
                 return True
                 
         return False
@@ -126,38 +150,37 @@ class MockKubernetesEnv:
         self.replicas = max(self.min_pods, min(self.max_pods, self.replicas + replica_delta))
         
         max_bucket = self.num_buckets - 1
-        min_bucket = APP_CONFIG["logic_constants"]["min_level"]
-        self.cpu_bucket = max(min_bucket, min(max_bucket, self.cpu_bucket + load_delta))
-        self.ram_bucket = max(min_bucket, min(max_bucket, self.ram_bucket + load_delta))
+        self.cpu_bucket = max(self.min_level, min(max_bucket, self.cpu_bucket + load_delta))
+        self.ram_bucket = max(self.min_level, min(max_bucket, self.ram_bucket + load_delta))
     
     
     def step(self, action: int) -> Tuple[int, float, bool, dict]:
-        self.step_count += APP_CONFIG["logic_constants"]["step_size"]
+        self.step_count += self.step_size
 
-        noise_cpu = random.choice([-APP_CONFIG["logic_constants"]["step_size"], 0, APP_CONFIG["logic_constants"]["step_size"]])
-        noise_ram = random.choice([-APP_CONFIG["logic_constants"]["step_size"], 0, APP_CONFIG["logic_constants"]["step_size"]])
+        noise_cpu = random.choice(self.noise_choices)
+        noise_ram = random.choice(self.noise_choices)
         
-        self.cpu_bucket = min(self.num_buckets - 1, max(APP_CONFIG["logic_constants"]["min_level"], self.cpu_bucket + noise_cpu))
-        self.ram_bucket = min(self.num_buckets - 1, max(APP_CONFIG["logic_constants"]["min_level"], self.ram_bucket + noise_ram))
+        self.cpu_bucket = min(self.num_buckets - 1, max(self.min_level, self.cpu_bucket + noise_cpu))
+        self.ram_bucket = min(self.num_buckets - 1, max(self.min_level, self.ram_bucket + noise_ram))
 
-        step_size = APP_CONFIG["logic_constants"]["step_size"]
+        step_size = self.step_size
         load_effect = step_size
 
-        if action == APP_CONFIG["actions"]["scale_up"]:
+        if action == self.action_scale_up:
             self._apply_action_effects(step_size, -load_effect)
 
-        elif action == APP_CONFIG["actions"]["scale_down"]:
+        elif action == self.action_scale_down:
             self._apply_action_effects(-step_size, load_effect)
 
-        elif action == APP_CONFIG["actions"]["restart"]:
+        elif action == self.action_restart:
             self._apply_action_effects(0, load_effect)
 
-        elif action == APP_CONFIG["actions"]["no_action"]:
+        elif action == self.action_no_action:
             pass
             
         done = (self.step_count >= self.max_steps) or self.is_failure(action)
 
-        reward = calculate_reward(self.cpu_bucket, self.ram_bucket, self.replicas, action, done)
+        reward = self.reward_model.reward(self.cpu_bucket, self.ram_bucket, self.replicas, action, done)
 
         next_state = self._encode_state()
         info = {
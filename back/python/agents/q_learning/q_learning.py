@@ -1,7 +1,19 @@
 #learning the best actions using q-learning algorithm
 from typing import List, Optional
+import copy
 import random
+import numpy as np
 from config_loader import APP_CONFIG
+from agents.sparse_table import SparseTable, add_at
+from agents.snapshot_buffers import SnapshotBuffers
+
+STORAGE_LIST = "list"
+STORAGE_NUMPY = "numpy"
+# rows allocated on first write, untouched states read q_value_init
+STORAGE_SPARSE = "sparse"
+
+# the greedy cache stores the tied best actions of a state as bits, 2**num_actions lookup entries
+MAX_CACHED_ACTIONS = 12
 
 
 class QLearningAgent:
@@ -13,6 +25,10 @@ class QLearningAgent:
         alpha: float = APP_CONFIG["rl_hyperparameters"]["alpha"],
         gamma: float = APP_CONFIG["rl_hyperparameters"]["gamma"],
         epsilon: float = APP_CONFIG["rl_hyperparameters"]["epsilon"],
+        storage: str = STORAGE_LIST,
+        dtype=np.float64,
+        seed: Optional[int] = None,
+        cache_policy: bool = True,
     ):
         self.num_states = num_states
         self.num_actions = num_actions # [scale up, scale down, nothing, restart]
@@ -21,19 +37,98 @@ class QLearningAgent:
         self.epsilon = epsilon
         self.epsilon_min = APP_CONFIG["rl_hyperparameters"]["epsilon_min"]
         self.epsilon_decay = APP_CONFIG["rl_hyperparameters"]["epsilon_decay"]
+        self.storage = storage
+        self.dtype = np.dtype(dtype)
+        self.rng = np.random.default_rng(seed)
+
+        q_value_init = APP_CONFIG["rl_hyperparameters"]["q_value_init"]
 
         # every cell represents the Q value for a (state, action) pair
-        self.q_table = []
-        for state_index in range(num_states):
-            row = []
-            for action_index in range(num_actions):
-                row.append(APP_CONFIG["rl_hyperparameters"]["q_value_init"])
-            self.q_table.append(row)
-            
+        if storage == STORAGE_NUMPY:
+            # one contiguous [state, action] block instead of a list per state
+            self.q_table = np.full((num_states, num_actions), q_value_init, dtype=self.dtype)
+        elif storage == STORAGE_SPARSE:
+            self.q_table = SparseTable(num_states, (num_actions,), q_value_init, dtype=self.dtype)
+        elif storage == STORAGE_LIST:
+            self.q_table = []
+            for state_index in range(num_states):
+                row = []
+                for action_index in range(num_actions):
+                    row.append(q_value_init)
+                self.q_table.append(row)
+        else:
+            raise ValueError(f"Unknown Q-table storage: {storage}")
+
+        # greedy policy cache: {allowed-actions bitmask: [num_states] bitmask of the best actions}
+        # built lazily per mask, only the rows of updated states are recomputed.
+        # code writing q_table directly has to call invalidate_policy (snapshots rely on it too)
+        # the cache holds an entry per state, which would undo what sparse storage saves
+        self.cache_policy = cache_policy and num_actions <= MAX_CACHED_ACTIONS and storage != STORAGE_SPARSE
+        self.policy_cache = {}
+        self.policy_version = 0
+        self._bit_values = 1 << np.arange(num_actions, dtype=np.int64)
+        if self.cache_policy:
+            self._bits_to_actions = [
+                tuple(action for action in range(num_actions) if bits >> action & 1)
+                for bits in range(1 << num_actions)
+            ]
+        # the read-only copies snapshot() hands out, synced row by row
+        self.snapshot_buffers = SnapshotBuffers()
+
+    # replaces the Q table (e.g. loaded from a model file) keeping the storage mode
+    # copy=False keeps a matching ndarray (like a memory-mapped one) as is
+    # sparse storage keeps only the rows that differ from its default rows
+    def load_q_table(self, q_table, copy: bool = True):
+        if self.storage == STORAGE_SPARSE:
+            table = np.asarray(q_table, dtype=self.dtype)
+            if table.shape != (self.num_states, self.num_actions):
+                raise ValueError(f"Q table shape {table.shape} does not match ({self.num_states}, {self.num_actions})")
+            self.q_table = SparseTable.from_dense(table, defaults=self.q_table.defaults)
+        elif self.storage == STORAGE_NUMPY:
+            table = np.array(q_table, dtype=self.dtype) if copy else np.asarray(q_table, dtype=self.dtype)
+            if table.shape != (self.num_states, self.num_actions):
+                raise ValueError(f"Q table shape {table.shape} does not match ({self.num_states}, {self.num_actions})")
+            self.q_table = table
+        else:
+            self.q_table = [list(row) for row in q_table]
+        self.invalidate_policy()
+
+    # read-only copy for concurrent readers (e.g. the server's /decide), later updates of
+    # this agent do not show up in it. only the rows written since the last snapshot are
+    # copied (see snapshot_buffers.py), the policy cache readers build on a snapshot goes
+    # with its copy and gets the same rows recomputed
+    def snapshot(self) -> "QLearningAgent":
+        frozen = copy.copy(self)
+        frozen.snapshot_buffers = SnapshotBuffers()
+        buffer, rows = self.snapshot_buffers.acquire(self.q_table)
+        frozen.q_table = buffer.table
+        frozen.policy_cache = buffer.extras
+        if rows is not None and len(rows):
+            frozen.invalidate_policy(rows)
+        # masks this agent has cached that the copy has not, so it starts warm
+        for mask_bits, best_bits in self.policy_cache.items():
+            if mask_bits not in buffer.extras:
+                buffer.extras[mask_bits] = best_bits.copy()
+        self.snapshot_buffers.hand_out(buffer, frozen)
+        return frozen
+
+    # returns a plain list copy of the Q values of a state
+    def get_q_values(self, state: int) -> List[float]:
+        if self.storage != STORAGE_LIST:
+            return self.q_table[state].tolist()
+        return list(self.q_table[state])
+
     def decay_epsilon(self):
         if self.epsilon > self.epsilon_min:
             self.epsilon *= self.epsilon_decay
-            
+
+    # builds a [num_actions] boolean mask out of a list of allowed actions
+    def actions_to_mask(self, allowed_actions: Optional[List[int]]) -> np.ndarray:
+        mask = np.zeros(self.num_actions, dtype=bool)
+        if allowed_actions:
+            mask[list(allowed_actions)] = True
+        return mask
+
     def select_action(
         self,
         state: int,
@@ -46,8 +141,12 @@ class QLearningAgent:
         if random.random() < self.epsilon:
             return random.choice(allowed_actions)
 
+        if self.cache_policy:
+            return self._select_greedy_cached(state, allowed_actions)
+
         # choose the action with the highest Q value
-        q_values = self.q_table[state]
+        # numpy rows are read as plain floats, numpy scalars are slower to compare one by one
+        q_values = self.q_table[state] if self.storage == STORAGE_LIST else self.q_table[state].tolist()
         max_q = float('-inf')
         for a in allowed_actions:
             max_q = max(max_q, q_values[a])
@@ -57,11 +156,120 @@ class QLearningAgent:
         for a in allowed_actions:
             if q_values[a] == max_q:
                 candidates.append(a)
-                
+
+        return random.choice(candidates)
+
+    def _mask_bits(self, allowed_actions: List[int]) -> int:
+        bits = 0
+        for action in allowed_actions:
+            bits |= 1 << action
+        return bits
+
+    # [len(states), num_actions] Q values as an array, for either storage
+    def _rows(self, states) -> np.ndarray:
+        if self.storage != STORAGE_LIST:
+            return self.q_table[states]
+        return np.asarray([self.q_table[state] for state in states], dtype=self.dtype)
+
+    # bitmask of the best allowed actions of every given row
+    def _best_bits(self, q_values: np.ndarray, mask_bits: int) -> np.ndarray:
+        allowed = (mask_bits & self._bit_values) != 0
+        masked_q = np.where(allowed, q_values, -np.inf)
+        is_best = (masked_q == masked_q.max(axis=1, keepdims=True)) & allowed
+        return is_best @ self._bit_values
+
+    def _policy_bits(self, mask_bits: int) -> np.ndarray:
+        best_bits = self.policy_cache.get(mask_bits)
+        while best_bits is None:
+            # an update while the table is scanned (another thread) could miss the new
+            # entry, so it is rebuilt until no update happened in between
+            version = self.policy_version
+            best_bits = self._best_bits(np.asarray(self.q_table, dtype=self.dtype), mask_bits)
+            self.policy_cache[mask_bits] = best_bits
+            if version != self.policy_version:
+                best_bits = None
+        return best_bits
+
+    # O(1) greedy choice, ties are still broken randomly
+    def _select_greedy_cached(self, state: int, allowed_actions: List[int]) -> int:
+        candidates = self._bits_to_actions[self._policy_bits(self._mask_bits(allowed_actions))[state]]
+        if len(candidates) == 1:
+            return candidates[0]
         return random.choice(candidates)
 
+    # recomputes the cached entries of the given states, or drops the whole cache
+    def invalidate_policy(self, states=None):
+        self.snapshot_buffers.mark_written(states)
+        if not self.cache_policy:
+            return
+        self.policy_version += 1
+        if states is None:
+            self.policy_cache = {}
+            return
+        if not self.policy_cache:
+            return
+        states = np.unique(np.asarray(states, dtype=np.int64))
+        q_values = self._rows(states)
+        for mask_bits, best_bits in list(self.policy_cache.items()):
+            best_bits[states] = self._best_bits(q_values, mask_bits)
+
+    def _refresh_state(self, state: int):
+        self.snapshot_buffers.mark_written(state)
+        if not self.cache_policy:
+            return
+        self.policy_version += 1
+        if not self.policy_cache:
+            return
+        q_values = self.q_table[state]
+        q_values = q_values.tolist() if self.storage == STORAGE_NUMPY else q_values
+        for mask_bits, best_bits in list(self.policy_cache.items()):
+            allowed = self._bits_to_actions[mask_bits]
+            values = [q_values[action] for action in allowed]
+            max_q = max(values)
+            bits = 0
+            for action, value in zip(allowed, values):
+                if value == max_q:
+                    bits |= 1 << action
+            best_bits[state] = bits
+
+    # best action of every state, the lowest index wins ties
+    # allowed_actions restricts the choice like in select_action
+    def greedy_policy(self, allowed_actions: Optional[List[int]] = None) -> np.ndarray:
+        mask_bits = self._mask_bits(range(self.num_actions) if allowed_actions is None else allowed_actions)
+        if self.cache_policy:
+            best_bits = self._policy_bits(mask_bits)
+        else:
+            best_bits = self._best_bits(np.asarray(self.q_table, dtype=self.dtype), mask_bits)
+        return ((best_bits[:, None] & self._bit_values) != 0).argmax(axis=1)
+
+    # masks is a [batch, num_actions] boolean array of allowed actions (None allows every action)
+    # rows without any allowed action get no_action, like select_action
+    def select_actions(self, states, masks: Optional[np.ndarray] = None) -> np.ndarray:
+        states = np.asarray(states, dtype=np.int64)
+        batch_size = len(states)
+        if masks is None:
+            masks = np.ones((batch_size, self.num_actions), dtype=bool)
+        else:
+            masks = np.asarray(masks, dtype=bool)
+
+        q_values = np.asarray(self.q_table, dtype=self.dtype)[states] if self.storage == STORAGE_LIST else self.q_table[states]
+        masked_q = np.where(masks, q_values, -np.inf)
+        is_best = masked_q == masked_q.max(axis=1, keepdims=True)
+        is_best &= masks
+
+        # random tie breaking: the best candidate gets a random key, the rest get -1
+        explore = self.rng.random(batch_size) < self.epsilon
+        candidates = np.where(explore[:, None], masks, is_best)
+        keys = np.where(candidates, self.rng.random((batch_size, self.num_actions)), -1.0)
+        actions = keys.argmax(axis=1)
+
+        no_allowed = ~masks.any(axis=1)
+        actions[no_allowed] = APP_CONFIG["actions"]["no_action"]
+        return actions
+
     # learns from the action taken and the reward received
     # and updates the Q value accordingly
+    # returns how much the Q value changed
     def updateAction(
         self,
         state: int,
@@ -69,20 +277,64 @@ class QLearningAgent:
         reward: float,
         next_state: int,
         done: bool,
-    ):
-        
-        old_q = self.q_table[state][action]
+    ) -> float:
+
+        # the per-step path works on plain floats for every storage, numpy scalar math costs
+        # more than the update itself. update_batch is the vectorized path
+        if self.storage == STORAGE_LIST:
+            old_q = self.q_table[state][action]
+        else:
+            old_q = float(self.q_table[state, action])
 
         if done:
             target = reward
         else:
-            max_next_q = max(self.q_table[next_state])
+            next_q_values = self.q_table[next_state]
+            max_next_q = max(next_q_values if self.storage == STORAGE_LIST else next_q_values.tolist())
             # the reward plus the future discounted reward
             target = reward + self.gamma * max_next_q
 
         # change the Q value a little bit towards the target
         new_q = old_q + self.alpha * (target - old_q)
-        self.q_table[state][action] = new_q
+        if self.storage == STORAGE_LIST:
+            self.q_table[state][action] = new_q
+        else:
+            self.q_table[state, action] = new_q
+        self._refresh_state(state)
+        return float(new_q - old_q)
+
+    # applies a batch of transitions at once
+    # all targets are computed from the table before the batch, and repeated
+    # (state, action) pairs accumulate their updates
+    # weights scale each update (e.g. importance-sampling weights from a replay buffer)
+    # returns the TD error of every transition
+    def update_batch(self, states, actions, rewards, next_states, dones, weights=None) -> np.ndarray:
+        states = np.asarray(states, dtype=np.int64)
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=self.dtype)
+        next_states = np.asarray(next_states, dtype=np.int64)
+        dones = np.asarray(dones, dtype=bool)
+        weights = np.ones(len(states), dtype=self.dtype) if weights is None else np.asarray(weights, dtype=self.dtype)
+
+        if self.storage == STORAGE_LIST:
+            # every target first, then the updates, like add_at below
+            td_errors = np.zeros(len(states), dtype=self.dtype)
+            for index in range(len(states)):
+                state, action = int(states[index]), int(actions[index])
+                target = rewards[index] if dones[index] else rewards[index] + self.gamma * max(self.q_table[next_states[index]])
+                td_errors[index] = target - self.q_table[state][action]
+            for index in range(len(states)):
+                state, action = int(states[index]), int(actions[index])
+                self.q_table[state][action] = float(self.q_table[state][action] + self.alpha * weights[index] * td_errors[index])
+            self.invalidate_policy(states)
+            return td_errors
+
+        max_next_q = self.q_table[next_states].max(axis=1)
+        targets = np.where(dones, rewards, rewards + self.gamma * max_next_q)
+        td_errors = targets - self.q_table[states, actions]
+        add_at(self.q_table, (states, actions), self.alpha * weights * td_errors)
+        self.invalidate_policy(states)
+        return td_errors
 
     def __repr__(self) -> str:
         return f"QLearningAgent(alpha={self.alpha}, gamma={self.gamma}, epsilon={self.epsilon})"
@@ -0,0 +1,104 @@
+#fixed-capacity ring buffer of transitions for experience replay
+from typing import NamedTuple, Optional
+import numpy as np
+
+
+class ReplayBatch(NamedTuple):
+    indices: np.ndarray
+    states: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    next_states: np.ndarray
+    dones: np.ndarray
+    # importance-sampling weights, all ones without prioritized sampling
+    weights: np.ndarray
+
+
+class ReplayBuffer:
+    def __init__(
+        self,
+        capacity: int,
+        prioritized: bool = False,
+        priority_alpha: float = 0.6,
+        priority_epsilon: float = 1e-3,
+        seed: Optional[int] = None,
+        state_shape: tuple = (),
+        state_dtype=np.int64,
+    ):
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.priority_alpha = priority_alpha
+        self.priority_epsilon = priority_epsilon
+        self.rng = np.random.default_rng(seed)
+
+        # state indices by default, state_shape=(3,) with a float dtype stores raw feature vectors
+        self.states = np.zeros((capacity,) + tuple(state_shape), dtype=state_dtype)
+        self.actions = np.zeros(capacity, dtype=np.int64)
+        self.rewards = np.zeros(capacity, dtype=np.float64)
+        self.next_states = np.zeros((capacity,) + tuple(state_shape), dtype=state_dtype)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.priorities = np.zeros(capacity, dtype=np.float64)
+        # highest priority given so far, new transitions start with it so they are replayed at
+        # least once. only update_priorities raises it, an add never scans the buffer
+        self.max_priority = 1.0
+
+        # next slot to write, the oldest transition is overwritten once full
+        self.position = 0
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        self.add_batch([state], [action], [reward], [next_state], [done])
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        count = len(states)
+        if count == 0:
+            return
+        slots = (self.position + np.arange(count)) % self.capacity
+
+        self.states[slots] = states
+        self.actions[slots] = actions
+        self.rewards[slots] = rewards
+        self.next_states[slots] = next_states
+        self.dones[slots] = dones
+        self.priorities[slots] = self.max_priority
+
+        self.position = int((self.position + count) % self.capacity)
+        self.size = min(self.capacity, self.size + count)
+
+    # uniform sampling, or proportional to priority ** alpha when prioritized
+    # beta controls how much the importance-sampling weights correct for the priorities
+    def sample(self, batch_size: int, beta: float = 0.4) -> ReplayBatch:
+        if self.size == 0:
+            raise ValueError("Cannot sample from an empty replay buffer")
+
+        if self.prioritized:
+            scaled = self.priorities[:self.size] ** self.priority_alpha
+            probabilities = scaled / scaled.sum()
+            indices = self.rng.choice(self.size, size=batch_size, p=probabilities)
+            weights = (self.size * probabilities[indices]) ** -beta
+            weights /= weights.max()
+        else:
+            indices = self.rng.integers(0, self.size, batch_size)
+            weights = np.ones(batch_size, dtype=np.float64)
+
+        return ReplayBatch(
+            indices,
+            self.states[indices],
+            self.actions[indices],
+            self.rewards[indices],
+            self.next_states[indices],
+            self.dones[indices],
+            weights,
+        )
+
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray):
+        priorities = np.abs(td_errors) + self.priority_epsilon
+        self.priorities[indices] = priorities
+        if len(priorities):
+            self.max_priority = max(self.max_priority, float(priorities.max()))
+
+    def __repr__(self) -> str:
+        return f"ReplayBuffer(size={self.size}, capacity={self.capacity}, prioritized={self.prioritized})"
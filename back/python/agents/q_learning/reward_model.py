@@ -0,0 +1,146 @@
+#precomputes calculate_reward for every discrete input into one lookup table
+import itertools
+from typing import Optional
+import numpy as np
+from config_loader import AppConfig, get_config, subscribe
+from agents.q_learning import mock_env
+
+# last_action index used when there is no previous action
+NO_LAST_ACTION = -1
+
+
+class RewardModel:
+    def __init__(self):
+        self._apply_config(get_config())
+        # rebuilt when the config changes, e.g. new reward weights pushed to ZK
+        subscribe(self._apply_config)
+
+    def _apply_config(self, config: AppConfig):
+        # the table is built before any attribute changes, so a failed compile keeps the old one
+        table = self._compile(config)
+        self.min_pods = config.system_limits.min_pods
+        self.max_pods = config.system_limits.max_pods
+        self.num_buckets = config.metrics_config.num_buckets
+        self.num_actions = config.num_actions
+        self.valid_pod_states = config.valid_pod_states
+        self.penalty_catastrophic = config.catastrophic_failure_penalty
+
+        # [cpu_bucket, ram_bucket, pod_index, action, last_action], the last
+        # last_action slot stands for "no previous action"
+        self.table = table
+
+    def _compile(self, config: AppConfig) -> np.ndarray:
+        constants = config.logic_constants
+        actions = config.actions
+        rewards = config.rewards
+        min_pods = config.system_limits.min_pods
+        max_pods = config.system_limits.max_pods
+        num_buckets = config.metrics_config.num_buckets
+        num_actions = config.num_actions
+
+        ideal_cpu = constants.ideal_cpu_level
+        ideal_ram = constants.ideal_ram_level
+        ideal_replicas = constants.ideal_replicas
+        high_threshold = constants.high_load_threshold
+        waste_threshold = constants.low_load_threshold
+
+        reward_ideal = rewards.mock_ideal
+        reward_waste = rewards.mock_waste
+
+        cpu, ram, replicas, action, last_action = np.meshgrid(
+            np.arange(num_buckets),
+            np.arange(num_buckets),
+            np.arange(min_pods, max_pods + 1),
+            np.arange(num_actions),
+            np.append(np.arange(num_actions), NO_LAST_ACTION),
+            indexing="ij",
+        )
+        is_up = action == actions.scale_up
+        is_down = action == actions.scale_down
+
+        reward = np.zeros(cpu.shape, dtype=np.float64)
+
+        is_ideal = (cpu == ideal_cpu) & (ram == ideal_ram) & (replicas == ideal_replicas)
+        reward += np.where(is_ideal, reward_ideal * 1.5, 0.0)
+
+        cpu_high = cpu >= high_threshold
+        ram_high = ram >= high_threshold
+        reward += np.where(cpu_high & ~is_up, rewards.mock_cpu_high_load * (cpu - high_threshold + 1), 0.0)
+        reward += np.where(ram_high & ~is_up, rewards.mock_ram_high_load * (ram - high_threshold + 1), 0.0)
+        reward += np.where((cpu_high | ram_high) & is_up, reward_ideal, 0.0)
+
+        is_low = (cpu <= waste_threshold) & (ram <= waste_threshold)
+        is_waste = is_low & (replicas > min_pods)
+        severity_waste = (waste_threshold - np.maximum(cpu, ram)) + 1
+        waste_reward = np.where(
+            is_up,
+            reward_waste * severity_waste * 3.0,
+            np.where(is_down, reward_ideal, reward_waste * severity_waste),
+        )
+        reward += np.where(is_waste, waste_reward, 0.0)
+
+        reward += np.where(action == actions.restart, rewards.mock_restart_penalty, 0.0)
+
+        is_ping_pong = (is_up & (last_action == actions.scale_down)) | (is_down & (last_action == actions.scale_up))
+        is_emergency = (is_up & (cpu_high | ram_high)) | (is_down & is_low)
+        reward += np.where(is_ping_pong & ~is_emergency, rewards.mock_thrashing_penalty, 0.0)
+
+        return reward
+
+    def _in_table(self, cpu_bucket: int, ram_bucket: int, replicas: int, action: int, last_action: Optional[int]) -> bool:
+        return (
+            0 <= cpu_bucket < self.num_buckets
+            and 0 <= ram_bucket < self.num_buckets
+            and self.min_pods <= replicas <= self.max_pods
+            and 0 <= action < self.num_actions
+            and (last_action is None or 0 <= last_action < self.num_actions)
+        )
+
+    # same arguments and result as calculate_reward
+    def reward(self, cpu_bucket: int, ram_bucket: int, replicas: int, action: int, last_action: Optional[int] = None, done: bool = False) -> float:
+        if done:
+            return self.penalty_catastrophic
+
+        if not self._in_table(cpu_bucket, ram_bucket, replicas, action, last_action):
+            return mock_env.calculate_reward(cpu_bucket, ram_bucket, replicas, action, last_action, done)
+
+        last_index = NO_LAST_ACTION if last_action is None else int(last_action)
+        return float(self.table[cpu_bucket, ram_bucket, replicas - self.min_pods, action, last_index])
+
+    # array version of reward, use NO_LAST_ACTION for rows without a previous action
+    # every input has to be inside the table
+    def reward_batch(self, cpu_buckets, ram_buckets, replicas, actions, last_actions=None, dones=None) -> np.ndarray:
+        replicas = np.asarray(replicas)
+        if last_actions is None:
+            last_actions = np.full(replicas.shape, NO_LAST_ACTION)
+
+        rewards = self.table[cpu_buckets, ram_buckets, replicas - self.min_pods, actions, last_actions]
+        if dones is not None:
+            rewards = np.where(dones, self.penalty_catastrophic, rewards)
+        return rewards
+
+    # compares the table against calculate_reward for every input
+    # raises ValueError on the first mismatch
+    def verify(self, tolerance: float = 1e-9):
+        last_actions = list(range(self.num_actions)) + [None]
+        for cpu_bucket, ram_bucket, replicas, action, last_action in itertools.product(
+            range(self.num_buckets),
+            range(self.num_buckets),
+            range(self.min_pods, self.max_pods + 1),
+            range(self.num_actions),
+            last_actions,
+        ):
+            expected = mock_env.calculate_reward(cpu_bucket, ram_bucket, replicas, action, last_action)
+            actual = self.reward(cpu_bucket, ram_bucket, replicas, action, last_action)
+            if abs(expected - actual) > tolerance:
+                raise ValueError(
+                    f"Reward table mismatch for cpu={cpu_bucket} ram={ram_bucket} replicas={replicas} "
+                    f"action={action} last_action={last_action}: {actual} != {expected}"
+                )
+
+        expected = mock_env.calculate_reward(0, 0, self.min_pods, 0, None, True)
+        if abs(expected - self.penalty_catastrophic) > tolerance:
+            raise ValueError(f"Catastrophic reward mismatch: {self.penalty_catastrophic} != {expected}")
+
+    def __repr__(self) -> str:
+        return f"RewardModel(shape={self.table.shape})"
@@ -0,0 +1,110 @@
+#solves the mock kubernetes environment exactly with value iteration
+import itertools
+from typing import NamedTuple, Optional
+import numpy as np
+from config_loader import APP_CONFIG, get_config
+from state_codec import StateCodec
+from agents.q_learning.vector_env import VectorizedMockKubernetesEnv
+
+
+class TransitionModel(NamedTuple):
+    # [state, action, outcome] arrays, one outcome per combination of cpu/ram noise
+    next_states: np.ndarray
+    rewards: np.ndarray
+    terminal: np.ndarray
+    # [outcome] probability of each noise combination
+    probabilities: np.ndarray
+    # [state, action] actions allowed by the pod limits
+    allowed: np.ndarray
+
+
+class SolverResult(NamedTuple):
+    q_table: np.ndarray
+    iterations: int
+    delta: float
+
+
+# enumerates every (state, action, noise) outcome of the mock environment
+# the time limit (max_steps) is not part of the state, so only failures end an episode
+def build_transition_model(env: Optional[VectorizedMockKubernetesEnv] = None) -> TransitionModel:
+    codec = StateCodec.from_config(get_config())
+    num_states = codec.num_states
+    valid_pod_states = codec.valid_pod_states
+    num_actions = len(APP_CONFIG["actions"])
+    catastrophic_penalty = APP_CONFIG["rl_hyperparameters"]["catastrophic_penalty"]
+    step_size = APP_CONFIG["logic_constants"]["step_size"]
+
+    if env is None:
+        env = VectorizedMockKubernetesEnv(num_envs=num_states)
+    if env.num_envs != num_states:
+        raise ValueError(f"The environment must hold one cluster per state ({num_states}), got {env.num_envs}")
+
+    states = np.arange(num_states)
+    cpu_bucket, ram_bucket, replicas = codec.decode(states)
+    pod_index = replicas - codec.min_pods
+
+    noise_values = [-step_size, 0, step_size]
+    outcomes = list(itertools.product(noise_values, noise_values))
+    shape = (num_states, num_actions, len(outcomes))
+
+    next_states = np.zeros(shape, dtype=np.int64)
+    rewards = np.zeros(shape, dtype=np.float64)
+    terminal = np.zeros(shape, dtype=bool)
+
+    for action in range(num_actions):
+        actions = np.full(num_states, action, dtype=np.int64)
+        for outcome, (noise_cpu, noise_ram) in enumerate(outcomes):
+            env.cpu_bucket = cpu_bucket.copy()
+            env.ram_bucket = ram_bucket.copy()
+            env.replicas = replicas.copy()
+            env.step_count = np.zeros(num_states, dtype=np.int64)
+
+            # train.py checks is_failure before stepping and adds the catastrophic penalty
+            is_catastrophic = env.is_failure(actions)
+            dones = env.apply_transition(actions, noise_cpu, noise_ram)
+
+            next_states[:, action, outcome] = env._encode_state()
+            rewards[:, action, outcome] = env.rewards_for(actions, dones) + np.where(is_catastrophic, catastrophic_penalty, 0.0)
+            terminal[:, action, outcome] = dones | is_catastrophic
+
+    allowed = np.ones((num_states, num_actions), dtype=bool)
+    allowed[pod_index == 0, APP_CONFIG["actions"]["scale_down"]] = False
+    allowed[pod_index == valid_pod_states - 1, APP_CONFIG["actions"]["scale_up"]] = False
+
+    probabilities = np.full(len(outcomes), 1.0 / len(outcomes))
+    return TransitionModel(next_states, rewards, terminal, probabilities, allowed)
+
+
+# runs value iteration on the whole Q table until the largest change is below tolerance
+# actions the pod limits forbid get invalid_q, like the trained tables
+def value_iteration(
+    model: TransitionModel,
+    gamma: float = APP_CONFIG["rl_hyperparameters"]["gamma"],
+    tolerance: float = 1e-6,
+    max_iterations: int = 100000,
+    q_init: Optional[np.ndarray] = None,
+    invalid_q: float = -1e9,
+) -> SolverResult:
+    num_states, num_actions, _ = model.next_states.shape
+    continues = ~model.terminal
+    expected_rewards = model.rewards @ model.probabilities
+
+    if q_init is None:
+        q_table = np.zeros((num_states, num_actions), dtype=np.float64)
+    else:
+        q_table = np.array(q_init, dtype=np.float64)
+    q_table[~model.allowed] = invalid_q
+
+    delta = float("inf")
+    iterations = 0
+    while delta > tolerance and iterations < max_iterations:
+        values = np.where(model.allowed, q_table, -np.inf).max(axis=1)
+        future = np.where(continues, values[model.next_states], 0.0) @ model.probabilities
+        new_q_table = expected_rewards + gamma * future
+        new_q_table[~model.allowed] = invalid_q
+
+        delta = float(np.abs(new_q_table - q_table).max())
+        q_table = new_q_table
+        iterations += 1
+
+    return SolverResult(q_table, iterations, delta)
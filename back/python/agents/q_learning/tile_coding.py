@@ -0,0 +1,217 @@
+#linear Q-learning over tile-coded raw metrics instead of a table of buckets
+#
+# every tiling is a coarse grid over (cpu %, ram %, replicas), shifted by a fraction of a
+# tile. a state activates exactly one tile per tiling and Q(s, a) is the sum of their
+# weights, so neighbouring states share most of their tiles and learn from each other.
+# memory is num_tilings * tiles per tiling * num_actions, independent of bucket_step and
+# only linear in max_pods through replica_tiles.
+from typing import List, Optional
+import copy
+import random
+import numpy as np
+from config_loader import APP_CONFIG, get_config
+from agents.snapshot_buffers import SnapshotBuffers
+
+
+class TileCoder:
+    def __init__(self, lows, highs, tiles_per_dimension, num_tilings: int):
+        self.lows = np.asarray(lows, dtype=np.float64)
+        self.highs = np.asarray(highs, dtype=np.float64)
+        self.tiles_per_dimension = np.asarray(tiles_per_dimension, dtype=np.int64)
+        self.num_tilings = num_tilings
+
+        self.tile_widths = (self.highs - self.lows) / self.tiles_per_dimension
+        # one extra tile per dimension covers the part the offset pushes past the edge
+        self.grid_shape = self.tiles_per_dimension + 1
+        self.tiles_per_tiling = int(np.prod(self.grid_shape))
+        self.num_tiles = num_tilings * self.tiles_per_tiling
+
+        # asymmetric offsets (1, 3, 5, ... per dimension) avoid the diagonal artifacts of
+        # shifting every dimension by the same amount
+        dimensions = len(self.lows)
+        displacement = 2 * np.arange(dimensions) + 1
+        self.offsets = (np.arange(num_tilings)[:, None] * displacement[None, :] % num_tilings) / num_tilings
+        self.strides = np.cumprod(np.concatenate(([1], self.grid_shape[:0:-1])))[::-1]
+        self.tiling_base = np.arange(num_tilings, dtype=np.int64) * self.tiles_per_tiling
+
+    # [..., dimensions] features -> [..., num_tilings] active tile indices
+    def tiles(self, features) -> np.ndarray:
+        features = np.clip(np.asarray(features, dtype=np.float64), self.lows, self.highs)
+        scaled = (features - self.lows) / self.tile_widths
+        coordinates = np.floor(scaled[..., None, :] + self.offsets).astype(np.int64)
+        return coordinates @ self.strides + self.tiling_base
+
+
+class TileCodingAgent:
+
+    def __init__(
+        self,
+        num_actions: int,
+        alpha: float = APP_CONFIG["rl_hyperparameters"]["alpha"],
+        gamma: float = APP_CONFIG["rl_hyperparameters"]["gamma"],
+        epsilon: float = APP_CONFIG["rl_hyperparameters"]["epsilon"],
+        num_tilings: int = 8,
+        cpu_tiles: int = 10,
+        ram_tiles: int = 10,
+        replica_tiles: int = 8,
+        seed: Optional[int] = None,
+    ):
+        self.num_actions = num_actions
+        self.alpha = alpha
+        self.gamma = gamma
+        self.epsilon = epsilon
+        self.epsilon_min = APP_CONFIG["rl_hyperparameters"]["epsilon_min"]
+        self.epsilon_decay = APP_CONFIG["rl_hyperparameters"]["epsilon_decay"]
+        self.rng = np.random.default_rng(seed)
+
+        # states are (cpu %, ram %, replicas) in their raw units
+        max_percentage = APP_CONFIG["metrics_config"]["max_percentage"]
+        self.tile_coder = TileCoder(
+            lows=(0, 0, APP_CONFIG["system_limits"]["min_pods"]),
+            highs=(max_percentage, max_percentage, APP_CONFIG["system_limits"]["max_pods"]),
+            tiles_per_dimension=(cpu_tiles, ram_tiles, replica_tiles),
+            num_tilings=num_tilings,
+        )
+        self.num_tilings = num_tilings
+
+        # every state sums num_tilings weights, so each starts at an equal share of q_value_init
+        q_value_init = APP_CONFIG["rl_hyperparameters"]["q_value_init"]
+        self.weights = np.full((self.tile_coder.num_tiles, num_actions), q_value_init / num_tilings, dtype=np.float64)
+        # the read-only copies snapshot() hands out, code writing weights directly has to call mark_written
+        self.snapshot_buffers = SnapshotBuffers()
+
+    # built from the "agent" config section
+    @classmethod
+    def from_config(cls, num_actions: int, config=None, **kwargs) -> "TileCodingAgent":
+        agent_config = (config or get_config()).agent
+        return cls(
+            num_actions=num_actions,
+            num_tilings=agent_config.num_tilings,
+            cpu_tiles=agent_config.cpu_tiles,
+            ram_tiles=agent_config.ram_tiles,
+            replica_tiles=agent_config.replica_tiles,
+            **kwargs,
+        )
+
+    # replaces the weights (e.g. loaded from a model file)
+    # copy=False keeps a matching ndarray (like a memory-mapped one) as is
+    def load_weights(self, weights, copy: bool = True):
+        weights = np.array(weights, dtype=np.float64) if copy else np.asarray(weights, dtype=np.float64)
+        if weights.shape != self.weights.shape:
+            raise ValueError(f"Tile weights shape {weights.shape} does not match {self.weights.shape}")
+        self.weights = weights
+        self.mark_written()
+
+    # tiles whose weights changed since the last snapshot, None for all of them
+    def mark_written(self, tiles=None):
+        self.snapshot_buffers.mark_written(tiles)
+
+    # read-only copy for concurrent readers, later updates of this agent do not show up in it
+    # only the tiles written since the last snapshot are copied (see snapshot_buffers.py)
+    def snapshot(self) -> "TileCodingAgent":
+        frozen = copy.copy(self)
+        frozen.snapshot_buffers = SnapshotBuffers()
+        buffer, _ = self.snapshot_buffers.acquire(self.weights)
+        frozen.weights = buffer.table
+        self.snapshot_buffers.hand_out(buffer, frozen)
+        return frozen
+
+    # the tile rows a state (or a [n, 3] batch of states) reads and updates
+    def active_tiles(self, state) -> np.ndarray:
+        return self.tile_coder.tiles(state)
+
+    def _q_values(self, tiles: np.ndarray) -> np.ndarray:
+        return self.weights[tiles].sum(axis=-2)
+
+    # returns a plain list of the Q values of a state
+    def get_q_values(self, state) -> List[float]:
+        return self._q_values(self.active_tiles(state)).tolist()
+
+    def decay_epsilon(self):
+        if self.epsilon > self.epsilon_min:
+            self.epsilon *= self.epsilon_decay
+
+    def select_action(
+        self,
+        state,
+        allowed_actions: Optional[List[int]] = None,
+    ) -> int:
+
+        if not allowed_actions:
+            return APP_CONFIG["actions"]["no_action"]
+
+        if random.random() < self.epsilon:
+            return random.choice(allowed_actions)
+
+        allowed = np.asarray(allowed_actions)
+        q_values = self._q_values(self.active_tiles(state))[allowed]
+        candidates = allowed[q_values == q_values.max()]
+        if len(candidates) == 1:
+            return int(candidates[0])
+        return int(random.choice(candidates))
+
+    # masks is a [batch, num_actions] boolean array of allowed actions (None allows every action)
+    # rows without any allowed action get no_action, like select_action
+    def select_actions(self, states, masks: Optional[np.ndarray] = None) -> np.ndarray:
+        q_values = self._q_values(self.active_tiles(states))
+        batch_size = len(q_values)
+        if masks is None:
+            masks = np.ones((batch_size, self.num_actions), dtype=bool)
+        else:
+            masks = np.asarray(masks, dtype=bool)
+
+        masked_q = np.where(masks, q_values, -np.inf)
+        is_best = (masked_q == masked_q.max(axis=1, keepdims=True)) & masks
+
+        explore = self.rng.random(batch_size) < self.epsilon
+        candidates = np.where(explore[:, None], masks, is_best)
+        keys = np.where(candidates, self.rng.random((batch_size, self.num_actions)), -1.0)
+        actions = keys.argmax(axis=1)
+        actions[~masks.any(axis=1)] = APP_CONFIG["actions"]["no_action"]
+        return actions
+
+    # semi-gradient Q-learning step, the error is split evenly over the active tiles
+    # returns how much Q(state, action) changed
+    def updateAction(
+        self,
+        state,
+        action: int,
+        reward: float,
+        next_state,
+        done: bool,
+    ) -> float:
+
+        tiles = self.active_tiles(state)
+        old_q = self.weights[tiles, action].sum()
+
+        if done:
+            target = reward
+        else:
+            target = reward + self.gamma * self._q_values(self.active_tiles(next_state)).max()
+
+        step = self.alpha * (target - old_q)
+        self.weights[tiles, action] += step / self.num_tilings
+        self.mark_written(tiles)
+        return float(step)
+
+    # applies a batch of transitions at once, all targets come from the weights before the batch
+    # weights scale each update (e.g. importance-sampling weights from a replay buffer)
+    # returns the TD error of every transition
+    def update_batch(self, states, actions, rewards, next_states, dones, weights=None) -> np.ndarray:
+        tiles = self.active_tiles(states)
+        actions = np.asarray(actions, dtype=np.int64)
+        rewards = np.asarray(rewards, dtype=np.float64)
+        dones = np.asarray(dones, dtype=bool)
+        weights = np.ones(len(actions), dtype=np.float64) if weights is None else np.asarray(weights, dtype=np.float64)
+
+        max_next_q = self._q_values(self.active_tiles(next_states)).max(axis=1)
+        targets = np.where(dones, rewards, rewards + self.gamma * max_next_q)
+        td_errors = targets - self.weights[tiles, actions[:, None]].sum(axis=1)
+
+        steps = self.alpha * weights * td_errors / self.num_tilings
+        np.add.at(self.weights, (tiles, np.broadcast_to(actions[:, None], tiles.shape)), np.broadcast_to(steps[:, None], tiles.shape))
+        self.mark_written(tiles)
+        return td_errors
+
+    def __repr__(self) -> str:
+        return f"TileCodingAgent(alpha={self.alpha}, gamma={self.gamma}, epsilon={self.epsilon}, tiles={self.tile_coder.num_tiles})"
@@ -0,0 +1,122 @@
+#steps many independent mock kubernetes clusters at once on numpy arrays
+from typing import Optional, Tuple
+import numpy as np
+from config_loader import AppConfig, get_config, subscribe
+from state_codec import StateCodec
+from agents.q_learning.reward_model import RewardModel
+
+
+class VectorizedMockKubernetesEnv:
+    def __init__(self, num_envs: int, seed: Optional[int] = None):
+        self.num_envs = num_envs
+        self.rng = np.random.default_rng(seed)
+        self._apply_config(get_config())
+        self.reward_model = RewardModel()
+
+        self.cpu_bucket = np.full(num_envs, self.num_buckets // 2, dtype=np.int64)
+        self.ram_bucket = np.full(num_envs, self.num_buckets // 2, dtype=np.int64)
+        self.replicas = np.full(num_envs, self.initial_replicas, dtype=np.int64)
+        self.step_count = np.full(num_envs, self.initial_step_count, dtype=np.int64)
+
+        # config changes from ZK apply from the next step on, like MockKubernetesEnv
+        subscribe(self._apply_config)
+
+    # copies the values step() needs out of the config once, instead of on every call
+    def _apply_config(self, config: AppConfig):
+        constants = config.logic_constants
+        self.min_pods = config.system_limits.min_pods
+        self.max_pods = config.system_limits.max_pods
+        self.num_buckets = config.metrics_config.num_buckets
+        self.max_steps = config.rl_hyperparameters.max_steps
+        self.valid_pod_states = config.valid_pod_states
+        self.codec = StateCodec.from_config(config)
+
+        self.step_size = constants.step_size
+        self.min_level = constants.min_level
+        self.critical_offset = constants.critical_load_offset
+        self.critical_min_pods = constants.critical_min_pods
+        self.initial_replicas = constants.initial_replicas
+        self.initial_step_count = constants.initial_step_count
+
+        self.action_scale_up = config.actions.scale_up
+        self.action_scale_down = config.actions.scale_down
+        self.action_restart = config.actions.restart
+
+    def _encode_state(self) -> np.ndarray:
+        return self.codec.encode(self.cpu_bucket, self.ram_bucket, self.replicas)
+
+    def _reset_where(self, mask: np.ndarray):
+        count = int(mask.sum())
+        if count == 0:
+            return
+        self.cpu_bucket[mask] = self.rng.integers(0, self.num_buckets, count)
+        self.ram_bucket[mask] = self.rng.integers(0, self.num_buckets, count)
+        self.replicas[mask] = self.rng.integers(self.min_pods, self.max_pods + 1, count)
+        self.step_count[mask] = self.initial_step_count
+
+    # resets every environment
+    # returns the initial states
+    def reset(self) -> np.ndarray:
+        self._reset_where(np.ones(self.num_envs, dtype=bool))
+        return self._encode_state()
+
+    def is_failure(self, actions: np.ndarray) -> np.ndarray:
+        actions = np.asarray(actions)
+        failure = (actions == self.action_scale_down) & (self.replicas <= self.min_pods)
+        failure |= (actions == self.action_scale_up) & (self.replicas >= self.max_pods)
+
+        critical_level = self.num_buckets - self.critical_offset
+        is_critical = (self.cpu_bucket >= critical_level) | (self.ram_bucket >= critical_level)
+        failure |= is_critical & (self.replicas <= self.critical_min_pods) & (actions != self.action_scale_up)
+        return failure
+
+    def _apply_action_effects(self, replica_delta: np.ndarray, load_delta: np.ndarray):
+        self.replicas = np.clip(self.replicas + replica_delta, self.min_pods, self.max_pods)
+
+        max_bucket = self.num_buckets - 1
+        self.cpu_bucket = np.clip(self.cpu_bucket + load_delta, self.min_level, max_bucket)
+        self.ram_bucket = np.clip(self.ram_bucket + load_delta, self.min_level, max_bucket)
+
+    # deterministic part of step: applies the given noise and the action effects
+    # returns the done flags of the environments without resetting them
+    def apply_transition(self, actions: np.ndarray, noise_cpu: np.ndarray, noise_ram: np.ndarray) -> np.ndarray:
+        self.step_count += self.step_size
+
+        self.cpu_bucket = np.clip(self.cpu_bucket + noise_cpu, self.min_level, self.num_buckets - 1)
+        self.ram_bucket = np.clip(self.ram_bucket + noise_ram, self.min_level, self.num_buckets - 1)
+
+        is_up = actions == self.action_scale_up
+        is_down = actions == self.action_scale_down
+        is_restart = actions == self.action_restart
+        replica_delta = np.where(is_up, self.step_size, np.where(is_down, -self.step_size, 0))
+        load_delta = np.where(is_up, -self.step_size, np.where(is_down | is_restart, self.step_size, 0))
+        self._apply_action_effects(replica_delta, load_delta)
+
+        return (self.step_count >= self.max_steps) | self.is_failure(actions)
+
+    # MockKubernetesEnv.step passes done positionally as last_action, keep the same rewards
+    def rewards_for(self, actions: np.ndarray, dones: np.ndarray) -> np.ndarray:
+        return self.reward_model.reward_batch(self.cpu_bucket, self.ram_bucket, self.replicas, actions, dones.astype(np.int64))
+
+    # advances every environment by one step
+    # finished environments are reset automatically: the returned states are the
+    # states to act on next, and info["final_states"] holds the states the step
+    # actually landed in (use those as next_state when learning)
+    def step(self, actions) -> Tuple[np.ndarray, np.ndarray, np.ndarray, dict]:
+        actions = np.asarray(actions, dtype=np.int64)
+
+        noise_cpu = self.rng.integers(-1, 2, self.num_envs) * self.step_size
+        noise_ram = self.rng.integers(-1, 2, self.num_envs) * self.step_size
+        dones = self.apply_transition(actions, noise_cpu, noise_ram)
+        rewards = self.rewards_for(actions, dones)
+
+        final_states = self._encode_state()
+        info = {
+            "cpu_bucket": self.cpu_bucket.copy(),
+            "ram_bucket": self.ram_bucket.copy(),
+            "replicas": self.replicas.copy(),
+            "final_states": final_states,
+        }
+
+        self._reset_where(dones)
+        return self._encode_state(), rewards, dones, info
@@ -0,0 +1,98 @@
+# read-only copies of a table one thread keeps writing, for publishing snapshots of it
+#
+# two copies take turns. a publish picks the one no snapshot holds any more, copies in
+# only the rows written since that copy was last synced and hands it out read-only, so a
+# publish after a single update costs a row instead of the whole table. whether a copy is
+# still held is tracked with a weak reference to the snapshot it went out with: a reader
+# keeping an old snapshot never sees its table change, the publish pays for a fresh full
+# copy instead. readers have to keep the snapshot alive while they use its table.
+import weakref
+from typing import Optional, Tuple
+import numpy as np
+from agents.sparse_table import SparseTable
+
+
+# independent read-only copy of a dense array, sparse table or list of rows
+def copy_table(table):
+    if isinstance(table, SparseTable):
+        return table.copy(readonly=True)
+    if isinstance(table, np.ndarray):
+        copied = np.array(table)
+        copied.flags.writeable = False
+        return copied
+    return [list(row) for row in table]
+
+# target[rows] = source[rows] for a copy made by copy_table, which stays read-only
+def copy_rows(target, source, rows: np.ndarray):
+    if isinstance(target, list):
+        for row in rows.tolist():
+            target[row] = list(source[row])
+        return
+    if isinstance(target, SparseTable):
+        target.data.flags.writeable = True
+        target[rows] = source[rows]
+        # storing new rows can replace the data block
+        target.data.flags.writeable = False
+        return
+    target.flags.writeable = True
+    target[rows] = source[rows]
+    target.flags.writeable = False
+
+
+class SnapshotBuffer:
+    def __init__(self, table):
+        self.table = table
+        # rows written to the live table since this copy was synced, None for all of them
+        self.dirty = set()
+        # whatever the caller keeps next to the copy (e.g. a policy cache), dropped on a full copy
+        self.extras = {}
+        self.owner = None
+
+    def in_use(self) -> bool:
+        return self.owner is not None and self.owner() is not None
+
+
+class SnapshotBuffers:
+    def __init__(self, count: int = 2, full_copy_fraction: float = 0.25):
+        self.count = count
+        # past this share of dirty rows one full copy is cheaper than row by row
+        self.full_copy_fraction = full_copy_fraction
+        self.buffers = []
+
+    # to be called on every write to the live table, rows=None when all of it may have changed
+    def mark_written(self, rows=None):
+        for buffer in self.buffers:
+            if buffer.dirty is None:
+                continue
+            if rows is None:
+                buffer.dirty = None
+            elif isinstance(rows, (int, np.integer)):
+                buffer.dirty.add(int(rows))
+            else:
+                buffer.dirty.update(np.asarray(rows).reshape(-1).tolist())
+
+    # a free copy brought up to date with live, and the rows copied into it since it was last
+    # handed out (None when it was copied in full). hand it out with hand_out()
+    def acquire(self, live) -> Tuple[SnapshotBuffer, Optional[np.ndarray]]:
+        buffer = next((buffer for buffer in self.buffers if not buffer.in_use()), None)
+        if buffer is None:
+            buffer = SnapshotBuffer(copy_table(live))
+            # the copies still in use stay alive with their snapshots
+            if len(self.buffers) >= self.count:
+                self.buffers.pop(0)
+            self.buffers.append(buffer)
+            return buffer, None
+
+        dirty, buffer.dirty = buffer.dirty, set()
+        if dirty is None or len(dirty) > self.full_copy_fraction * len(live):
+            buffer.table = copy_table(live)
+            buffer.extras = {}
+            return buffer, None
+        rows = np.fromiter(sorted(dirty), dtype=np.int64, count=len(dirty))
+        if len(rows):
+            copy_rows(buffer.table, live, rows)
+        return buffer, rows
+
+    # buffer stays untouched for as long as owner is alive
+    def hand_out(self, buffer: SnapshotBuffer, owner):
+        buffer.owner = weakref.ref(owner)
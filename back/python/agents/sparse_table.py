@@ -0,0 +1,189 @@
+# a [num_rows, *row_shape] table that only stores the rows written so far
+#
+# untouched rows read as a default row, which may repeat every len(defaults) rows (e.g. one
+# default per pod count). written rows live in one growable block, so gathers over many
+# rows are a dict lookup per row plus a single numpy take. supports the indexing the
+# agents use: table[row], table[rows], table[row, column], table[rows, columns] and
+# assignments to them, add_at() in place of np.add.at, and np.asarray(table) / to_dense()
+# to compact it back into the dense format.
+from typing import Optional
+import numpy as np
+
+
+class SparseTable:
+    def __init__(self, num_rows: int, row_shape: tuple = (), default=0, dtype=np.float64, defaults: Optional[np.ndarray] = None):
+        self.num_rows = num_rows
+        self.row_shape = tuple(row_shape)
+        self.dtype = np.dtype(dtype)
+        self.shape = (num_rows,) + self.row_shape
+        self.ndim = len(self.shape)
+
+        self.slots = {}
+        self.row_ids = np.zeros(0, dtype=np.int64)
+        self.data = np.zeros((0,) + self.row_shape, dtype=self.dtype)
+        self.set_defaults(np.full((1,) + self.row_shape, default, dtype=self.dtype) if defaults is None else defaults)
+
+    # defaults[row % len(defaults)] is what an untouched row reads as
+    def set_defaults(self, defaults: np.ndarray):
+        defaults = np.array(defaults, dtype=self.dtype)
+        if defaults.shape[1:] != self.row_shape:
+            raise ValueError(f"Default rows of shape {defaults.shape[1:]} do not match {self.row_shape}")
+        self.defaults = defaults
+        # handed out for reads of untouched rows, writes to it must fail instead of getting lost
+        self._readonly_defaults = defaults.copy()
+        self._readonly_defaults.flags.writeable = False
+
+    @classmethod
+    def from_dense(cls, array, defaults: Optional[np.ndarray] = None, default=0) -> "SparseTable":
+        array = np.asarray(array)
+        table = cls(array.shape[0], array.shape[1:], default=default, dtype=array.dtype, defaults=defaults)
+        rows = np.arange(array.shape[0])
+        differs = (array != table.defaults[rows % len(table.defaults)]).reshape(len(array), -1).any(axis=1)
+        table[np.flatnonzero(differs)] = array[differs]
+        return table
+
+    @property
+    def allocated_rows(self) -> int:
+        return len(self.slots)
+
+    @property
+    def nbytes(self) -> int:
+        # the dict costs roughly 100 bytes per stored row on top of the data block
+        return self.data.nbytes + self.row_ids.nbytes + self.defaults.nbytes + 100 * len(self.slots)
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    # the rows written so far, sorted
+    def stored_rows(self) -> np.ndarray:
+        return np.sort(self.row_ids[:len(self.slots)])
+
+    def _check_row(self, row: int) -> int:
+        row = int(row)
+        if row < 0:
+            row += self.num_rows
+        if not 0 <= row < self.num_rows:
+            raise IndexError(f"Row {row} is out of bounds for {self.num_rows} rows")
+        return row
+
+    # slot of every row, -1 for untouched ones
+    def _lookup(self, rows: np.ndarray) -> np.ndarray:
+        slots = self.slots
+        return np.fromiter((slots.get(row, -1) for row in rows.tolist()), dtype=np.int64, count=len(rows))
+
+    # slots of the rows, allocating (with their default values) the ones not stored yet
+    def _allocate(self, rows: np.ndarray) -> np.ndarray:
+        slots = self._lookup(rows)
+        missing = slots < 0
+        if missing.any():
+            new_rows = np.unique(rows[missing])
+            first = len(self.slots)
+            needed = first + len(new_rows)
+            if needed > len(self.data):
+                capacity = max(needed, 2 * len(self.data), 16)
+                data = np.empty((capacity,) + self.row_shape, dtype=self.dtype)
+                data[:first] = self.data[:first]
+                row_ids = np.zeros(capacity, dtype=np.int64)
+                row_ids[:first] = self.row_ids[:first]
+                self.data, self.row_ids = data, row_ids
+            self.data[first:needed] = self.defaults[new_rows % len(self.defaults)]
+            self.row_ids[first:needed] = new_rows
+            for offset, row in enumerate(new_rows.tolist()):
+                self.slots[row] = first + offset
+            slots[missing] = self._lookup(rows[missing])
+        return slots
+
+    # slot of one row, allocated on first use (the per-step path, no array work)
+    def _slot(self, row) -> int:
+        row = self._check_row(row)
+        slot = self.slots.get(row)
+        if slot is None:
+            slot = int(self._allocate(np.array([row], dtype=np.int64))[0])
+        return slot
+
+    def _rows(self, index) -> np.ndarray:
+        rows = np.asarray(index, dtype=np.int64).reshape(-1)
+        rows = np.where(rows < 0, rows + self.num_rows, rows)
+        if len(rows) and (rows.min() < 0 or rows.max() >= self.num_rows):
+            raise IndexError(f"Rows out of bounds for {self.num_rows} rows")
+        return rows
+
+    def _gather(self, rows: np.ndarray) -> np.ndarray:
+        slots = self._lookup(rows)
+        values = self.defaults[rows % len(self.defaults)]
+        stored = slots >= 0
+        values[stored] = self.data[slots[stored]]
+        return values
+
+    def __getitem__(self, index):
+        if isinstance(index, tuple):
+            rows, columns = index[0], index[1:]
+            if np.isscalar(rows) or np.ndim(rows) == 0:
+                return self[rows][columns]
+            row_values = self._gather(self._rows(rows))
+            return row_values[(np.arange(len(row_values)),) + columns]
+
+        if np.isscalar(index) or np.ndim(index) == 0:
+            row = self._check_row(index)
+            slot = self.slots.get(row)
+            if slot is None:
+                return self._readonly_defaults[row % len(self.defaults)]
+            return self.data[slot]
+
+        shape = np.shape(index)
+        return self._gather(self._rows(index)).reshape(shape + self.row_shape)
+
+    # the slots are looked up before self.data is touched, allocating can replace the block
+    def __setitem__(self, index, values):
+        if isinstance(index, tuple):
+            rows, columns = index[0], index[1:]
+            if np.isscalar(rows) or np.ndim(rows) == 0:
+                slot = self._slot(rows)
+            else:
+                slot = self._allocate(self._rows(rows))
+            self.data[(slot,) + columns] = values
+            return
+
+        slots = self._allocate(self._rows(index))
+        self.data[slots] = values
+
+    # unbuffered add like np.add.at, repeated (row, column) pairs add up
+    def add_at(self, index, values):
+        rows, columns = (index[0], index[1:]) if isinstance(index, tuple) else (index, ())
+        slots = self._allocate(self._rows(rows))
+        np.add.at(self.data, (slots,) + tuple(columns), values)
+
+    # independent copy holding only the stored rows, readonly=True makes writes to them fail
+    def copy(self, readonly: bool = False) -> "SparseTable":
+        table = SparseTable(self.num_rows, self.row_shape, dtype=self.dtype, defaults=self.defaults)
+        count = len(self.slots)
+        table.slots = dict(self.slots)
+        table.row_ids = self.row_ids[:count].copy()
+        table.data = self.data[:count].copy()
+        table.data.flags.writeable = not readonly
+        return table
+
+    def to_dense(self) -> np.ndarray:
+        dense = np.resize(self.defaults, self.shape)
+        count = len(self.slots)
+        dense[self.row_ids[:count]] = self.data[:count]
+        return dense
+
+    def __array__(self, dtype=None, copy=None):
+        dense = self.to_dense()
+        return dense if dtype is None else dense.astype(dtype)
+
+    def __repr__(self) -> str:
+        return f"SparseTable(shape={self.shape}, stored_rows={len(self.slots)})"
+
+
+# np.add.at for both dense arrays and sparse tables
+def add_at(table, index, values):
+    if isinstance(table, SparseTable):
+        table.add_at(index, values)
+    else:
+        np.add.at(table, index, values)
+
+# rows actually held in memory
+def stored_row_count(table) -> int:
+    return table.allocated_rows if isinstance(table, SparseTable) else len(table)
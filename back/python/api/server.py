@@ -1,14 +1,18 @@
 import sys
 import os
 import json
-import subprocess
-import pickle
+import asyncio
+import threading
 import time
+import weakref
 from typing import Optional, List
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+import numpy as np
 import uvicorn
 
 # in order to import from agents module
@@ -16,14 +20,43 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 project_root = os.path.dirname(current_dir)
 sys.path.append(project_root)
 
-from config_loader import APP_CONFIG
+import agent_registry
+import cluster_control
+import config_loader
+from config_loader import APP_CONFIG, AppConfig, get_config
+import dashboard_feed
+from learner import Learner
+import metrics
+import model_store
+import online_journal
+import policy_export
+import policy_report
 from agents.q_learning.q_learning import QLearningAgent
+from agents.q_learning.tile_coding import TileCodingAgent
 from agents.bandit.bandit_safety import SafetyBandit
+from agents.sparse_table import stored_row_count
+from state_codec import StateCodec
 
-from agents.q_learning.mock_env import calculate_reward
+from agents.q_learning.reward_model import RewardModel
+from agents.q_learning.replay_buffer import ReplayBuffer
 
 app = FastAPI(title="K8s RL Learning Engine")
 
+metrics_registry = metrics.Registry()
+REQUEST_SECONDS = metrics_registry.histogram("autoscaler_request_seconds", "Time spent handling a request", ["endpoint"])
+AGENT_SECONDS = metrics_registry.histogram("autoscaler_agent_seconds", "Time spent inside the Q-learning agent", ["operation"])
+ACTIONS_CHOSEN = metrics_registry.counter("autoscaler_actions_chosen", "Actions returned by the agent", ["endpoint", "action"])
+CATASTROPHIC_REWARDS = metrics_registry.counter("autoscaler_catastrophic_rewards", "Learned transitions with a catastrophic reward")
+RESTING_SKIPPED = metrics_registry.counter("autoscaler_resting_skipped", "Requests skipped during the cooldown period", ["endpoint"])
+Q_TABLE_STATES = metrics_registry.gauge("autoscaler_q_table_states", "Number of states in the Q table")
+Q_TABLE_BYTES = metrics_registry.gauge("autoscaler_q_table_bytes", "Memory used by the Q table")
+REGISTRY_AGENTS = metrics_registry.gauge("autoscaler_registry_agents", "Per-deployment agents currently loaded")
+VISITED_STATES_RATIO = metrics_registry.gauge("autoscaler_visited_states_ratio", "Fraction of states seen by /decide, /predict or /train since start")
+
+# children are looked up once, the hot paths only observe
+SELECT_ACTION_SECONDS = AGENT_SECONDS.labels("select_action")
+UPDATE_ACTION_SECONDS = AGENT_SECONDS.labels("update_action")
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -32,64 +65,401 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-last_system_status = {
+status_board = dashboard_feed.StatusBoard({
     "pods": 0, "cpu_usage": 0.0, "ram_usage": 0.0, "cpu_bucket": 0, "ram_bucket": 0,
     "action": "Waiting...", "reward": 0.0, "q_values": [0,0,0,0]
-}
+})
+
+def update_status(**values):
+    status_board.update(**values)
 
-brain_logs_buffer = []
+LOG_CAPACITY = int(os.environ.get("LOG_CAPACITY", "100"))
+log_ring = dashboard_feed.LogRing(LOG_CAPACITY)
+console = dashboard_feed.ConsoleWriter()
 
+# the action of the last learned transition, only the learner thread reads and writes it
 previous_action_id = None
 
 def add_log(msg: str):
-    print(msg)
-    brain_logs_buffer.append(msg)
-    if len(brain_logs_buffer) > 100:
-        brain_logs_buffer.pop(0)
+    log_ring.append(msg)
+    console.write(msg)
 
 @app.get("/status")
 def get_dashboard_status():
-    return last_system_status
+    return status_board.status
 
+# since=<cursor from the last call> returns only the newer entries, missed counts the
+# entries that were pushed out of the ring before the client asked for them
 @app.get("/logs-data")
-def get_logs_data():
-    return {"logs": brain_logs_buffer}
-
-system_resting = False
-
+def get_logs_data(since: Optional[int] = None):
+    entries, cursor, missed = log_ring.since(since)
+    return {"logs": [entry["message"] for entry in entries], "entries": entries, "cursor": cursor, "missed": missed}
+
+# pushes "status" and "log" events as they happen instead of being polled
+# a reconnecting EventSource sends Last-Event-ID and only gets the log entries it missed
+@app.get("/events")
+async def stream_events(request: Request, since: Optional[int] = None):
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        dashboard_feed.stream(log_ring, status_board, request.is_disconnected, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+COOLDOWN_SECONDS = float(os.environ.get("COOLDOWN_SECONDS", "30"))
+# /decide, /predict, /train and the replay learner skip their work while it is active
+cooldown = cluster_control.Cooldown()
+scaler = cluster_control.scaler_from_env()
+
+def announce_cooldown_end(deadline: float):
+    # a later action may have pushed the deadline out, that one announces the end
+    if cooldown.resting_until == deadline:
+        add_log("[SYSTEM] Cooldown finished. AI is awake.\n")
+
+# called from the async dashboard handlers, nothing sleeps until the deadline
 def apply_system_rest():
-    global system_resting
-    system_resting = True
-    add_log("\n[SYSTEM] Entering 30 seconds cooldown period...")
-    time.sleep(30)
-    system_resting = False
-    add_log("[SYSTEM] Cooldown finished. AI is awake.\n")
-
-MIN_PODS = APP_CONFIG.get("system_limits", {}).get("min_pods", 1)
-MAX_PODS = APP_CONFIG.get("system_limits", {}).get("max_pods", 15)
-NUM_BUCKETS = APP_CONFIG.get("metrics_config", {}).get("num_buckets", 34)
-
-VALID_POD_STATES = MAX_PODS - MIN_PODS + 1
-num_states = NUM_BUCKETS * NUM_BUCKETS * VALID_POD_STATES
+    deadline = cooldown.start(COOLDOWN_SECONDS)
+    add_log(f"\n[SYSTEM] Entering {COOLDOWN_SECONDS:.0f} seconds cooldown period...")
+    asyncio.get_running_loop().call_later(COOLDOWN_SECONDS, announce_cooldown_end, deadline)
+
+# built once like the tables it indexes, a bucket layout change warns and waits for a restart
+STATE_CODEC = StateCodec.from_config(get_config())
+MAX_PODS = STATE_CODEC.max_pods
+num_states = STATE_CODEC.num_states
 num_actions = len(APP_CONFIG["actions"])
 
-agent = QLearningAgent(num_states=num_states, num_actions=num_actions)
-safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+AGENT_TABULAR = "tabular"
+AGENT_TILE_CODING = "tile_coding"
+
+# picked once at start, the model file and the online journal depend on it
+AGENT_TYPE = get_config().agent.type
+if AGENT_TYPE not in (AGENT_TABULAR, AGENT_TILE_CODING):
+    raise ValueError(f"Unknown agent type in config: {AGENT_TYPE}")
+# the array holding what the agent learned, in the agent and in model files
+AGENT_ARRAY = "weights" if AGENT_TYPE == AGENT_TILE_CODING else "q_table"
+# "numpy" or "sparse" for the Q table and the bandit counters, model files are always dense
+TABLE_STORAGE = get_config().agent.storage
+
+def new_agent():
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        return TileCodingAgent.from_config(num_actions)
+    return QLearningAgent(num_states=num_states, num_actions=num_actions, storage=TABLE_STORAGE)
+
+def new_bandit():
+    return SafetyBandit(num_states=num_states, arms_count=num_actions, storage=TABLE_STORAGE)
+
+# the Q table, tile weights or a sparse table, np.asarray gives the dense array
+def agent_table(current_agent):
+    return getattr(current_agent, AGENT_ARRAY)
+
+# what the agent is given as a state: the bucketed state index, or the raw metrics for tile coding
+def agent_state(cpu_percentage: float, ram_percentage: float, replicas: int, state_idx: int):
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        return np.array([cpu_percentage, ram_percentage, replicas], dtype=np.float64)
+    return state_idx
+
+# the rows of agent_table an update of these states touches
+def table_rows(states) -> List[int]:
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        return np.unique(agent.active_tiles(np.asarray(states, dtype=np.float64))).tolist()
+    return states
+
+agent = new_agent()
+safety_bandit = new_bandit()
+reward_model = RewardModel()
+
+visited_states = np.zeros(num_states, dtype=bool)
+Q_TABLE_STATES.set_function(lambda: stored_row_count(agent_table(agent)))
+Q_TABLE_BYTES.set_function(lambda: agent_table(agent).nbytes)
+VISITED_STATES_RATIO.set_function(lambda: float(visited_states.mean()))
+
+MODEL_PATH = "brain_model.bin" if AGENT_TYPE == AGENT_TABULAR else f"brain_model_{AGENT_TYPE}.bin"
+LEGACY_MODEL_PATH = "brain_model.pkl"
+# /admin/reload-model only loads files from here, whatever path the client sends
+MODEL_DIR = os.path.dirname(os.path.realpath(MODEL_PATH))
+
+RELOAD_REPLACE = "replace"
+RELOAD_MERGE = "merge"
+
+# held by the learner while it changes agent/safety_bandit, the journal takes it to copy rows
+model_lock = threading.Lock()
+# every write to the model runs on the learner thread, requests read learner.snapshot
+learner = Learner(model_lock, lambda: agent.snapshot())
+# the arrays as they were loaded from disk, online deltas are measured against them
+base_arrays = {}
+model_info = {"path": None, "run_id": None, "loaded_at": None, "policy": None}
+
+# a path of the request resolved (symlinks and ..) inside MODEL_DIR, relative ones start there
+def resolve_model_path(path: Optional[str]) -> str:
+    resolved = os.path.realpath(os.path.join(MODEL_DIR, path or os.path.basename(MODEL_PATH)))
+    if os.path.commonpath([resolved, MODEL_DIR]) != MODEL_DIR:
+        raise PermissionError(f"Model files are only loaded from {MODEL_DIR}")
+    return resolved
+
+# returns (read-only base arrays, writable live arrays, run id)
+# only the binary format, pickles are never loaded by the server (model_store.py convert them)
+def read_model_file(path: str):
+    # a model trained under another config raises here instead of serving wrong states
+    base = model_store.load_model(path, mode="r")
+    # copy-on-write mapping: no copy at load, /train updates stay in memory
+    live = model_store.load_model(path, mode="c")
+    return base.arrays, live.arrays, base.header["run_id"]
+
+# loads a model next to the running one and swaps it in at once
+# merge keeps what /train learned online by adding the live deltas on top of the new model
+# the file is read on the calling thread, only the swap itself runs on the learner
+def load_brain(path: str, policy: str = RELOAD_REPLACE) -> dict:
+    if policy not in (RELOAD_REPLACE, RELOAD_MERGE):
+        raise ValueError(f"Unknown reload policy: {policy}")
+
+    base, live, run_id = read_model_file(path)
+    if AGENT_ARRAY not in live:
+        raise model_store.ModelConfigMismatchError(f"{path} has no '{AGENT_ARRAY}' array for the {AGENT_TYPE} agent")
+
+    loaded_agent = new_agent()
+    loaded_agent.epsilon = 0.05
+    loaded_bandit = new_bandit()
+    return learner.call(install_model, path, policy, base, live, run_id, loaded_agent, loaded_bandit)
+
+# the dense tables of a fresh agent and bandit, in the layout of a model file
+def initial_arrays() -> dict:
+    fresh_bandit = new_bandit()
+    return {
+        AGENT_ARRAY: np.asarray(agent_table(new_agent()), dtype=np.float64),
+        "bandit_counts": np.asarray(fresh_bandit.action_counts, dtype=np.int64),
+        "bandit_failures": np.asarray(fresh_bandit.failure_counts, dtype=np.int64),
+    }
 
-if os.path.exists("brain_model.pkl"):
-    with open("brain_model.pkl", "rb") as f:
-        data = pickle.load(f)
-        agent.q_table = data["q_table"]
-        
-        if "bandit_counts" in data and "bandit_failures" in data:
-            safety_bandit.action_counts = data["bandit_counts"]
-            safety_bandit.failure_counts = data["bandit_failures"]
-            
-        agent.epsilon = 0.05
-    print("Loaded pre-trained model successfully!")
+# learner job of load_brain
+def install_model(path: str, policy: str, base: dict, live: dict, run_id: str, loaded_agent, loaded_bandit) -> dict:
+    global agent, safety_bandit, base_arrays
+    merged_states = []
+    if policy == RELOAD_MERGE:
+        # started without a model file: what was learned online is the change from a fresh agent
+        merge_base = base_arrays or initial_arrays()
+        q_delta = np.asarray(agent_table(agent)) - merge_base[AGENT_ARRAY]
+        merged_states = np.flatnonzero(q_delta.any(axis=1))
+        live[AGENT_ARRAY] = base[AGENT_ARRAY] + q_delta
+        if "bandit_counts" in live and "bandit_counts" in merge_base:
+            live["bandit_counts"] = base["bandit_counts"] + (np.asarray(safety_bandit.action_counts) - merge_base["bandit_counts"])
+            live["bandit_failures"] = base["bandit_failures"] + (np.asarray(safety_bandit.failure_counts) - merge_base["bandit_failures"])
+
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        loaded_agent.load_weights(live["weights"], copy=False)
+    else:
+        loaded_agent.load_q_table(live["q_table"], copy=False)
+    if "bandit_counts" in live and "bandit_failures" in live:
+        loaded_bandit.load_counts(live["bandit_counts"], live["bandit_failures"], copy=False)
+
+    agent, safety_bandit, base_arrays = loaded_agent, loaded_bandit, base
+    model_info.update({"path": path, "run_id": run_id, "loaded_at": time.time(), "policy": policy})
+
+    # the journal now builds on the new model, merged rows still need a checkpoint
+    if journal is not None:
+        journal.rebase(journal_run_id(run_id), merged_states)
+
+    return dict(model_info)
+
+journal = None
+
+# journal rows are Q-table states or tile rows, so the agent type is part of the journaled run
+def journal_run_id(run_id: str) -> str:
+    return run_id if AGENT_TYPE == AGENT_TABULAR else f"{run_id}+{AGENT_TYPE}"
+
+if os.path.exists(MODEL_PATH):
+    load_brain(MODEL_PATH)
+    print(f"Loaded pre-trained model successfully! (run {model_info['run_id']})")
+elif AGENT_TYPE == AGENT_TABULAR and os.path.exists(LEGACY_MODEL_PATH):
+    print(f"Found only the legacy {LEGACY_MODEL_PATH}, which is not loaded. Convert it with: python model_store.py convert {LEGACY_MODEL_PATH} {MODEL_PATH}")
+    print("Starting with fresh agent.")
 else:
     print("No pre-trained model found. Starting with fresh agent.")
-    
+
+REPLAY_CAPACITY = int(os.environ.get("REPLAY_CAPACITY", "50000"))
+REPLAY_BATCH_SIZE = int(os.environ.get("REPLAY_BATCH_SIZE", "32"))
+REPLAY_INTERVAL = float(os.environ.get("REPLAY_INTERVAL", "1.0"))
+REPLAY_PRIORITIZED = os.environ.get("REPLAY_PRIORITIZED", "0") == "1"
+# replayed samples each new /train transition pays for, an idle server replays nothing
+REPLAY_RATIO = float(os.environ.get("REPLAY_RATIO", "4"))
+
+if AGENT_TYPE == AGENT_TILE_CODING:
+    replay_buffer = ReplayBuffer(REPLAY_CAPACITY, prioritized=REPLAY_PRIORITIZED, state_shape=(3,), state_dtype=np.float64)
+else:
+    replay_buffer = ReplayBuffer(REPLAY_CAPACITY, prioritized=REPLAY_PRIORITIZED)
+
+JOURNAL_DIR = os.environ.get("JOURNAL_DIR", "online_journal")
+CHECKPOINT_INTERVAL = float(os.environ.get("CHECKPOINT_INTERVAL", "60"))
+
+# copies the rows of the given states for a checkpoint, called with model_lock held
+# for tile coding the rows are tile indices, the bandit is not learned online so it is left out
+def snapshot_rows(states: List[int]) -> dict:
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        return {"weights": agent.weights[states]}
+    return {
+        "q_table": agent.q_table[states],
+        "bandit_counts": safety_bandit.action_counts[states],
+        "bandit_failures": safety_bandit.failure_counts[states],
+    }
+
+def apply_checkpoint_rows(states, arrays: dict):
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        agent.weights[states] = arrays["weights"]
+        agent.mark_written(states)
+        return
+    agent.q_table[states] = arrays["q_table"]
+    agent.invalidate_policy(states)
+    safety_bandit.action_counts[states] = arrays["bandit_counts"]
+    safety_bandit.failure_counts[states] = arrays["bandit_failures"]
+    safety_bandit.refresh_safety(states)
+
+def replay_journal_entry(entry: dict):
+    global previous_action_id
+    if entry["kind"] == "train":
+        agent.updateAction(state=entry["state"], action=entry["action"], reward=entry["reward"], next_state=entry["next_state"], done=entry["done"])
+        previous_action_id = entry["action"]
+        replay_buffer.add(entry["state"], entry["action"], entry["reward"], entry["next_state"], entry["done"])
+    elif entry["kind"] == "replay":
+        agent.update_batch(entry["states"], entry["actions"], entry["rewards"], entry["next_states"], entry["dones"], entry["weights"])
+
+journal = online_journal.OnlineJournal(JOURNAL_DIR, model_lock, snapshot_rows, checkpoint_interval=CHECKPOINT_INTERVAL)
+replayed = learner.call(journal.recover, journal_run_id(model_info["run_id"] or "fresh"), apply_checkpoint_rows, replay_journal_entry)
+if replayed:
+    print(f"Replayed {replayed} online updates from {JOURNAL_DIR}")
+journal.start()
+learner.start()
+
+# one replayed minibatch, journaled so a restart replays it exactly (learner job)
+# samples the replay learner may still take, earned by learn_transition, changed on the learner only
+replay_credit = 0.0
+
+def replay_step(batch_size: int) -> int:
+    global replay_credit
+    if len(replay_buffer) < batch_size or replay_credit < batch_size:
+        return 0
+    replay_credit -= batch_size
+    batch = replay_buffer.sample(batch_size)
+    td_errors = agent.update_batch(batch.states, batch.actions, batch.rewards, batch.next_states, batch.dones, batch.weights)
+    replay_buffer.update_priorities(batch.indices, td_errors)
+    journal.record({
+        "kind": "replay",
+        "states": batch.states.tolist(),
+        "actions": batch.actions.tolist(),
+        "rewards": batch.rewards.tolist(),
+        "next_states": batch.next_states.tolist(),
+        "dones": batch.dones.tolist(),
+        "weights": batch.weights.tolist(),
+    }, table_rows(batch.states))
+    return batch_size
+
+# keeps learning from stored transitions between /train calls, REPLAY_RATIO samples per new one
+def replay_learner(interval_seconds: float, batch_size: int):
+    while True:
+        time.sleep(interval_seconds)
+        # nothing new to learn from: no job, no journal entry and no new snapshot
+        if cooldown.active or replay_credit < batch_size:
+            continue
+        try:
+            learner.call(replay_step, batch_size)
+        except Exception as e:
+            add_log(f"[ERROR] Replay learner failed: {e}")
+
+if REPLAY_INTERVAL > 0:
+    threading.Thread(target=replay_learner, args=(REPLAY_INTERVAL, REPLAY_BATCH_SIZE), daemon=True).start()
+
+DEPLOYMENT_MODEL_DIR = os.environ.get("DEPLOYMENT_MODEL_DIR", "deployment_models")
+REGISTRY_MAX_AGENTS = int(os.environ.get("REGISTRY_MAX_AGENTS", "32"))
+REGISTRY_MAX_BYTES = int(os.environ.get("REGISTRY_MAX_BYTES", str(512 * 1024 * 1024)))
+
+def deployment_model_path(name: str) -> str:
+    return os.path.join(DEPLOYMENT_MODEL_DIR, f"{name}.bin")
+
+# a deployment starts from its own model file, or else from the server's agent as it is now
+# (the registry only calls this on the learner, like every other write)
+def load_deployment_agent(name: str):
+    loaded_agent = new_agent()
+    loaded_agent.epsilon = agent.epsilon
+    path = deployment_model_path(name)
+    if os.path.exists(path):
+        # copy-on-write like load_brain, what the deployment learns stays in memory until saved
+        table, copy = model_store.load_model(path, mode="c").arrays[AGENT_ARRAY], False
+    else:
+        table, copy = agent_table(agent), True
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        loaded_agent.load_weights(table, copy=copy)
+    else:
+        loaded_agent.load_q_table(table, copy=copy)
+    return loaded_agent
+
+def save_deployment_agent(name: str, deployment_agent):
+    os.makedirs(DEPLOYMENT_MODEL_DIR, exist_ok=True)
+    model_store.save_model(deployment_model_path(name), {AGENT_ARRAY: np.asarray(agent_table(deployment_agent), dtype=np.float64)}, run_id=f"deployment-{name}")
+    add_log(f"[SYSTEM] Saved the agent of deployment {name}")
+
+deployments = agent_registry.AgentRegistry(
+    load_deployment_agent,
+    save_deployment_agent,
+    lambda deployment_agent: agent_table(deployment_agent).nbytes,
+    max_agents=REGISTRY_MAX_AGENTS,
+    max_bytes=REGISTRY_MAX_BYTES,
+)
+REGISTRY_AGENTS.set_function(lambda: len(deployments))
+
+# snapshot of a deployment's agent, the first request for it loads it on the learner
+def deployment_snapshot(name: str):
+    entry = deployments.peek(name)
+    if entry is None:
+        entry = learner.call(deployments.get, name)
+    return entry.snapshot
+
+def model_file_version(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+# polls MODEL_PATH and reloads it whenever a new file is written there
+# train.py replaces the file atomically, so a changed mtime/inode means a complete model
+def watch_model_file(interval_seconds: float, policy: str):
+    last_seen = model_file_version(MODEL_PATH)
+    while True:
+        time.sleep(interval_seconds)
+        current = model_file_version(MODEL_PATH)
+        if current is None or current == last_seen:
+            continue
+        last_seen = current
+        try:
+            info = load_brain(MODEL_PATH, policy)
+            add_log(f"[SYSTEM] Reloaded model from {MODEL_PATH} (run {info['run_id']}, policy {policy})")
+        except Exception as e:
+            add_log(f"[ERROR] Failed to reload model: {e}")
+
+# reward weights and thresholds apply live (the reward model and APP_CONFIG follow the update),
+# a different state/action layout needs a restart with a model trained for it
+loaded_config_hash = model_store.config_hash(APP_CONFIG)
+loaded_agent_config = get_config().agent
+
+def on_config_change(config: AppConfig):
+    if model_store.config_hash(config.raw) != loaded_config_hash:
+        add_log("[WARNING] Config update changes the state/action layout, restart the server to apply it")
+    elif config.agent != loaded_agent_config:
+        add_log("[WARNING] Config update changes the agent settings, restart the server to apply them")
+    else:
+        add_log("[SYSTEM] Applied config update from ZooKeeper")
+
+config_loader.subscribe(on_config_change)
+config_loader.start_watch()
+
+MODEL_WATCH_INTERVAL = float(os.environ.get("MODEL_WATCH_INTERVAL", "0"))
+if MODEL_WATCH_INTERVAL > 0:
+    threading.Thread(
+        target=watch_model_file,
+        args=(MODEL_WATCH_INTERVAL, os.environ.get("MODEL_RELOAD_POLICY", RELOAD_REPLACE)),
+        daemon=True,
+    ).start()
+
 class ClusterState(BaseModel):
     pod_count: int
     cpu_usage: float
@@ -97,11 +467,10 @@ class ClusterState(BaseModel):
     is_crashed: bool
 
 def get_bucket(usage: float) -> int:
-    return int(max(0, min(100, usage)) // APP_CONFIG.get("metrics_config", {}).get("bucket_step", 3))
+    return STATE_CODEC.bucket(usage)
 
 def encode_state(cpu_bucket: int, ram_bucket: int, replicas: int) -> int:
-    pod_index = replicas - MIN_PODS
-    return (cpu_bucket * NUM_BUCKETS + ram_bucket) * VALID_POD_STATES + pod_index
+    return STATE_CODEC.encode(cpu_bucket, ram_bucket, replicas)
 
 def get_action_string(action_id: int) -> str:
     mapping = {
@@ -123,42 +492,73 @@ class LearnRequest(BaseModel):
     action: int
     next_state: StateRequest
     done: bool
+    # trains that deployment's agent from the registry instead of the server's own
+    deployment: Optional[str] = None
+
+def check_deployments(names):
+    try:
+        for name in names:
+            if name is not None:
+                agent_registry.check_deployment_name(name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# /decide and /decide-batch share these two so a state gets the same answer from both
+# cluster metrics -> (replicas clipped to the pod limits, state indices, what the agent is given)
+def encode_cluster_states(cpu_usage, ram_usage, pod_counts):
+    cpu_usage = np.asarray(cpu_usage, dtype=np.float64)
+    ram_usage = np.asarray(ram_usage, dtype=np.float64)
+    replicas = np.clip(np.asarray(pod_counts, dtype=np.int64), STATE_CODEC.min_pods, MAX_PODS)
+    state_indices = STATE_CODEC.encode_usage(cpu_usage, ram_usage, replicas)
+    if AGENT_TYPE == AGENT_TILE_CODING:
+        return replicas, state_indices, np.column_stack((cpu_usage, ram_usage, replicas))
+    return replicas, state_indices, state_indices
+
+# the action of every state, any action allowed
+def choose_actions(current_agent, states) -> np.ndarray:
+    with SELECT_ACTION_SECONDS.time():
+        if len(states) == 1:
+            # a single state takes the agent's cached greedy choice, same rule as select_actions
+            return np.array([current_agent.select_action(states[0], allowed_actions=list(APP_CONFIG["actions"].values()))])
+        return current_agent.select_actions(states)
 
 @app.get("/")
 def read_root():
     return {"status": "Learning Engine is Running"}
 
 @app.post("/decide")
+@metrics.timed(REQUEST_SECONDS.labels("/decide"))
 def decide(req: ClusterState):
-    global system_resting
-    if system_resting:
-        last_system_status["action"] = "Resting (30s)..."
+    if cooldown.active:
+        RESTING_SKIPPED.labels("/decide").inc()
+        update_status(action=f"Resting ({cooldown.remaining():.0f}s)...")
         return {"action": "Resting"}
 
-    cpu_bucket = get_bucket(req.cpu_usage)
-    ram_bucket = get_bucket(req.ram_usage)
-    current_replicas = min(req.pod_count, MAX_PODS)
-    
-    state_idx = encode_state(cpu_bucket, ram_bucket, current_replicas)
-    
-    safe_actions = list(APP_CONFIG["actions"].values())
-    action_id = agent.select_action(state_idx, allowed_actions=safe_actions)
-    action_str = get_action_string(action_id)
+    # one immutable snapshot for the whole request, training and reloads publish new ones
+    current_agent = learner.snapshot.model
+    replicas, state_indices, states = encode_cluster_states([req.cpu_usage], [req.ram_usage], [req.pod_count])
+    current_replicas, state_idx, state = int(replicas[0]), int(state_indices[0]), states[0]
+    action_str = get_action_string(int(choose_actions(current_agent, states)[0]))
+    visited_states[state_idx] = True
+    ACTIONS_CHOSEN.labels("/decide", action_str).inc()
     
-    last_system_status["pods"] = current_replicas
-    last_system_status["cpu_usage"] = req.cpu_usage
-    last_system_status["ram_usage"] = req.ram_usage
-    last_system_status["cpu_bucket"] = cpu_bucket
-    last_system_status["ram_bucket"] = ram_bucket
-    last_system_status["action"] = action_str
-    last_system_status["q_values"] = agent.q_table[state_idx]
+    update_status(
+        pods=current_replicas,
+        cpu_usage=req.cpu_usage,
+        ram_usage=req.ram_usage,
+        cpu_bucket=get_bucket(req.cpu_usage),
+        ram_bucket=get_bucket(req.ram_usage),
+        action=action_str,
+        q_values=current_agent.get_q_values(state),
+    )
     
     return {"action": action_str}
 
 @app.post("/predict")
+@metrics.timed(REQUEST_SECONDS.labels("/predict"))
 def get_action(req: StateRequest):
-    global system_resting
-    if system_resting:
+    if cooldown.active:
+        RESTING_SKIPPED.labels("/predict").inc()
         return {
             "recommended_action": APP_CONFIG["actions"]["no_action"],
             "state_index": 0,
@@ -173,71 +573,206 @@ def get_action(req: StateRequest):
     if state_idx >= num_states or state_idx < APP_CONFIG["logic_constants"]["min_index"]:
         raise HTTPException(status_code=400, detail="State out of bounds")
         
-    action = agent.select_action(state_idx, allowed_actions=req.allowed_actions)
-    
+    state = agent_state(req.cpu_percentage, req.ram_percentage, req.replicas, state_idx)
+    snapshot = learner.snapshot
+    current_agent = snapshot.model
+    with SELECT_ACTION_SECONDS.time():
+        action = current_agent.select_action(state, allowed_actions=req.allowed_actions)
+    visited_states[state_idx] = True
+    ACTIONS_CHOSEN.labels("/predict", get_action_string(action)).inc()
+
     return {
         "recommended_action": action,
         "state_index": state_idx,
         "action_string": get_action_string(action),
-        "q_values": agent.q_table[state_idx]
+        "q_values": current_agent.get_q_values(state),
+        "model_version": snapshot.version
     }
 
+class DeploymentState(BaseModel):
+    deployment: str
+    pod_count: int
+    cpu_usage: float
+    ram_usage: float
+    is_crashed: bool = False
+
+class DecideBatchRequest(BaseModel):
+    states: List[DeploymentState]
+
+# /decide for many deployments at once: every state is encoded in one array pass, then
+# each deployment's agent picks the actions of all its rows with one select_actions call
+@app.post("/decide-batch")
+@metrics.timed(REQUEST_SECONDS.labels("/decide-batch"))
+def decide_batch(req: DecideBatchRequest):
+    if cooldown.active:
+        RESTING_SKIPPED.labels("/decide-batch").inc()
+        return {"decisions": [{"deployment": state.deployment, "action": "Resting"} for state in req.states]}
+    names = [state.deployment for state in req.states]
+    check_deployments(names)
+
+    _, _, states = encode_cluster_states(
+        [state.cpu_usage for state in req.states],
+        [state.ram_usage for state in req.states],
+        [state.pod_count for state in req.states],
+    )
+
+    rows_by_deployment = {}
+    for row, name in enumerate(names):
+        rows_by_deployment.setdefault(name, []).append(row)
+
+    actions = np.zeros(len(names), dtype=np.int64)
+    versions = np.zeros(len(names), dtype=np.int64)
+    for name, rows in rows_by_deployment.items():
+        snapshot = deployment_snapshot(name)
+        actions[rows] = choose_actions(snapshot.model, states[rows])
+        versions[rows] = snapshot.version
+
+    decisions = []
+    for name, action, version in zip(names, actions.tolist(), versions.tolist()):
+        action_str = get_action_string(action)
+        ACTIONS_CHOSEN.labels("/decide-batch", action_str).inc()
+        decisions.append({"deployment": name, "action": action_str, "model_version": version})
+    return {"decisions": decisions}
+
+@app.get("/deployments")
+def get_deployments():
+    return deployments.info()
+
+# writes every deployment agent that learned something to DEPLOYMENT_MODEL_DIR
+@app.post("/admin/deployments/save")
+def save_deployments():
+    return {"saved": learner.call(deployments.save_dirty)}
+
+# (deployment, with margin) -> (weak ref to the snapshot's model, etag, file bytes), rebuilt once
+# a newer snapshot is published. the weak ref lets the learner reuse the copy of an old snapshot
+policy_payloads = {}
+
+def policy_payload(deployment: Optional[str], snapshot, with_margin: bool):
+    key = (deployment, with_margin)
+    cached = policy_payloads.get(key)
+    if cached is not None and cached[0]() is snapshot.model:
+        return cached[1], cached[2]
+
+    q_table = agent_table(snapshot.model)
+    arrays = policy_export.build_policy(q_table, with_margin)
+    policy_export.verify_policy(arrays, q_table)
+    etag = policy_export.policy_etag(arrays)
+    _, body = model_store.encode_model(arrays, run_id=f"policy-{model_info['run_id'] or 'fresh'}-v{snapshot.version}")
+
+    # names of evicted deployments would pile up otherwise
+    if len(policy_payloads) > 2 * (REGISTRY_MAX_AGENTS + 1):
+        policy_payloads.clear()
+    policy_payloads[key] = (weakref.ref(snapshot.model), etag, body)
+    return etag, body
+
+# the greedy action of every state as a model file (policy_export.py), for controllers that
+# decide locally. they send the ETag back in If-None-Match and get a 304 while it is unchanged,
+# margin=false leaves out the margins, which change with every update while the actions rarely do
+@app.get("/policy")
+@metrics.timed(REQUEST_SECONDS.labels("/policy"))
+def get_policy(request: Request, margin: bool = True, deployment: Optional[str] = None):
+    if AGENT_TYPE != AGENT_TABULAR:
+        raise HTTPException(status_code=409, detail=f"Policy tables are only exported for the {AGENT_TABULAR} agent")
+    if deployment is None:
+        snapshot = learner.snapshot
+    else:
+        check_deployments([deployment])
+        snapshot = deployment_snapshot(deployment)
+
+    etag, body = policy_payload(deployment, snapshot, margin)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "X-Model-Version": str(snapshot.version)}
+    if policy_export.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/octet-stream", headers=headers)
+
+# streams a report of the live model as CSV or JSON lines (see policy_report.py), e.g.
+# /policy/query?cpu=80:&pods=1:3 or /policy/query?changed=true for the states whose best
+# action online learning has changed since the model file was loaded
+@app.get("/policy/query")
+def query_policy(cpu: Optional[str] = None, ram: Optional[str] = None, pods: Optional[str] = None, changed: bool = False, format: str = policy_report.FORMAT_CSV):
+    if AGENT_TYPE != AGENT_TABULAR:
+        raise HTTPException(status_code=409, detail=f"Policy reports are only generated for the {AGENT_TABULAR} agent")
+    if format not in policy_report.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format}, expected one of {list(policy_report.FORMATS)}")
+    try:
+        query = policy_report.ReportQuery(policy_report.parse_range(cpu), policy_report.parse_range(ram), policy_report.parse_range(pods, int))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    snapshot = learner.snapshot
+    q_table = agent_table(snapshot.model)
+    best = previous = None
+    if changed:
+        loaded_arrays = base_arrays
+        if AGENT_ARRAY not in loaded_arrays:
+            raise HTTPException(status_code=409, detail="No model file was loaded to compare with")
+        best = policy_export.build_policy(q_table, with_margin=False)[policy_export.POLICY_ARRAY]
+        previous = policy_export.build_policy(loaded_arrays[AGENT_ARRAY], with_margin=False)[policy_export.POLICY_ARRAY]
+    states = policy_report.select_states(STATE_CODEC, query, best, previous)
+
+    # the stream holds on to the snapshot, its table is not reused for a newer one before it is done
+    def lines():
+        yield from policy_report.report_lines(agent_table(snapshot.model), states, STATE_CODEC, format, previous)
+
+    return StreamingResponse(
+        lines(),
+        media_type=policy_report.MEDIA_TYPES[format],
+        headers={"X-Model-Version": str(snapshot.version), "X-Matching-States": str(len(states))},
+    )
+
 is_dynamic_load_active = False
 
 @app.get("/is-load-active")
 def check_load():
     return {"active": is_dynamic_load_active}
 
+# the dashboard actions are async: they run on the event loop and never hold a worker
+# thread, so they cannot starve the sync /decide and /train handlers
 @app.post("/start-load")
-def start_load(background_tasks: BackgroundTasks):
+async def start_load():
     global is_dynamic_load_active
     is_dynamic_load_active = True
     add_log("[SYSTEM] Dashboard triggered Dynamic Load! (Total Traffic: 500%)")
-    
-    background_tasks.add_task(apply_system_rest)
+
+    apply_system_rest()
     return {"status": "Dynamic Load Started"}
 
 @app.post("/stop-load")
-def stop_load(background_tasks: BackgroundTasks):
+async def stop_load():
     global is_dynamic_load_active
     is_dynamic_load_active = False
     add_log("[SYSTEM] Dashboard stopped Dynamic Load. Traffic back to normal.")
-    
-    background_tasks.add_task(apply_system_rest)
+
+    apply_system_rest()
     return {"status": "Load Stopped"}
 
-@app.post("/scale-min")
-def scale_min(background_tasks: BackgroundTasks):
-    cmd = "kubectl scale deployment yair-api-python --replicas=1"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode == 0:
-        add_log("[SYSTEM] Scaled K8s deployment to 1 pods!")
+# deployment=None scales the scaler's default deployment (SCALER_DEPLOYMENT)
+async def scale_to(replicas: int, deployment: Optional[str]):
+    check_deployments([deployment])
+    result = await scaler.scale(replicas, deployment)
+    target = deployment or "K8s deployment"
+    if result.ok:
+        add_log(f"[SYSTEM] Scaled {target} to {replicas} pods!")
     else:
-        add_log(f"[ERROR] Failed to scale to 1: {result.stderr}")
-        
-    background_tasks.add_task(apply_system_rest)
-    return {"status": "Scaled to 1, entering cooldown"}
+        add_log(f"[ERROR] Failed to scale {target} to {replicas}: {result.output}")
+    apply_system_rest()
+
+@app.post("/scale-min")
+async def scale_min(deployment: Optional[str] = None):
+    await scale_to(STATE_CODEC.min_pods, deployment)
+    return {"status": f"Scaled to {STATE_CODEC.min_pods}, entering cooldown"}
 
 @app.post("/scale-max")
-def scale_max(background_tasks: BackgroundTasks):
-    cmd = "kubectl scale deployment yair-api-python --replicas=15"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    if result.returncode == 0:
-        add_log("[SYSTEM] Scaled K8s deployment to 15 pods!")
-    else:
-        add_log(f"[ERROR] Failed to scale to 15: {result.stderr}")
-        
-    background_tasks.add_task(apply_system_rest)
-    return {"status": "Scaled to 15, entering cooldown"}
+async def scale_max(deployment: Optional[str] = None):
+    await scale_to(MAX_PODS, deployment)
+    return {"status": f"Scaled to {MAX_PODS}, entering cooldown"}
 
 step_counter = 0
 
-@app.post("/train")
-def update_agent(req: LearnRequest):
-    global step_counter, system_resting, previous_action_id
-    if system_resting:
-        return {"status": "resting, skipped training"}
-    
+CATASTROPHIC_THRESHOLD = APP_CONFIG["rl_hyperparameters"].get("catastrophic_penalty", -10.0)
+
+# state indices, agent states and reward of one LearnRequest, given the action taken before it
+def encode_transition(req: LearnRequest, previous_action: Optional[int]):
     current_replicas = min(req.state.replicas, MAX_PODS)
     next_replicas = min(req.next_state.replicas, MAX_PODS)
     
@@ -249,27 +784,82 @@ def update_agent(req: LearnRequest):
     next_ram_bucket = get_bucket(req.next_state.ram_percentage)
     next_state_idx = encode_state(next_cpu_bucket, next_ram_bucket, next_replicas)
 
-    calculated_reward = calculate_reward(
+    calculated_reward = reward_model.reward(
         cpu_bucket,
         ram_bucket,
         current_replicas,
         req.action,
-        previous_action_id,
+        previous_action,
         req.done)
-    
+
+    state = agent_state(req.state.cpu_percentage, req.state.ram_percentage, current_replicas, state_idx)
+    next_state = agent_state(req.next_state.cpu_percentage, req.next_state.ram_percentage, next_replicas, next_state_idx)
+    return state_idx, state, next_state, calculated_reward, current_replicas
+
+def journal_state(state):
+    return state.tolist() if isinstance(state, np.ndarray) else state
+
+# applies one transition to the live agent, runs on the learner
+def learn_transition(req: LearnRequest, state_idx: int, state, next_state, calculated_reward: float) -> float:
+    global replay_credit
+    with UPDATE_ACTION_SECONDS.time():
+        agent.updateAction(state=state, action=req.action, reward=calculated_reward, next_state=next_state, done=req.done)
+    visited_states[state_idx] = True
+    if calculated_reward <= CATASTROPHIC_THRESHOLD:
+        CATASTROPHIC_REWARDS.inc()
+    replay_buffer.add(state, req.action, calculated_reward, next_state, req.done)
+    replay_credit += REPLAY_RATIO
+    journal.record({
+        "kind": "train",
+        "request": jsonable_encoder(req),
+        "state": journal_state(state),
+        "action": req.action,
+        "reward": calculated_reward,
+        "next_state": journal_state(next_state),
+        "done": req.done,
+    }, table_rows([state]))
+    return agent.get_q_values(state)[req.action]
+
+# learner job of one transition of a registered deployment
+def train_deployment_step(req: LearnRequest):
+    entry = deployments.get(req.deployment)
+    state_idx, state, next_state, calculated_reward, current_replicas = encode_transition(req, entry.previous_action)
+    entry.previous_action = req.action
+
+    with UPDATE_ACTION_SECONDS.time():
+        entry.agent.updateAction(state=state, action=req.action, reward=calculated_reward, next_state=next_state, done=req.done)
+    entry.steps += 1
+    entry.dirty = True
+    learner.after_batch(entry.publish)
+    q_values = entry.agent.get_q_values(state)
+    return q_values[req.action], q_values, calculated_reward, current_replicas, entry.steps
+
+# learner job of /train, the previous action and the step count only change here
+def train_step(req: LearnRequest):
+    global step_counter, previous_action_id
+    if req.deployment is not None:
+        return train_deployment_step(req)
+    state_idx, state, next_state, calculated_reward, current_replicas = encode_transition(req, previous_action_id)
     previous_action_id = req.action
 
-    agent.updateAction(state=state_idx, action=req.action, reward=calculated_reward, next_state=next_state_idx, done=req.done)
-    last_system_status["reward"] = calculated_reward
-    
-    is_catastrophic = calculated_reward <= APP_CONFIG["rl_hyperparameters"].get("catastrophic_penalty", -10.0)
-    new_q_val = agent.q_table[state_idx][req.action]
-    
+    new_q_val = learn_transition(req, state_idx, state, next_state, calculated_reward)
     step_counter += 1
-    if step_counter % 2 == 0:
-        q_values = agent.q_table[state_idx]
+    return new_q_val, agent.get_q_values(state), calculated_reward, current_replicas, step_counter
+
+@app.post("/train")
+@metrics.timed(REQUEST_SECONDS.labels("/train"))
+def update_agent(req: LearnRequest):
+    if cooldown.active:
+        RESTING_SKIPPED.labels("/train").inc()
+        return {"status": "resting, skipped training"}
+    check_deployments([req.deployment])
+
+    new_q_val, q_values, calculated_reward, current_replicas, step = learner.call(train_step, req)
+    update_status(reward=calculated_reward)
+
+    if step % 2 == 0:
         log_text = (
-            f"--- Q-Table Snapshot (Step {step_counter}) ---\n"
+            f"--- Q-Table Snapshot (Step {step}) ---\n"
             f"State: [CPU:{req.state.cpu_percentage}% RAM:{req.state.ram_percentage}% Pods:{current_replicas}] | Action: {get_action_string(req.action)} | Reward: {calculated_reward}\n"
             f"Brain Knowledge -> ScaleUp: {q_values[APP_CONFIG['actions']['scale_up']]:.2f} | "
             f"ScaleDown: {q_values[APP_CONFIG['actions']['scale_down']]:.2f} | "
@@ -279,5 +869,71 @@ def update_agent(req: LearnRequest):
 
     return {"status": "updated", "new_q_value": new_q_val}
 
+class TrainBatchRequest(BaseModel):
+    transitions: List[LearnRequest]
+
+# learner job of /train-batch, returns the new Q values and the last reward
+def train_batch_step(transitions: List[LearnRequest]):
+    global step_counter, previous_action_id
+    new_q_values = []
+    calculated_reward = None
+    for transition in transitions:
+        if transition.deployment is not None:
+            new_q_val, _, calculated_reward, _, _ = train_deployment_step(transition)
+            new_q_values.append(new_q_val)
+            continue
+        state_idx, state, next_state, calculated_reward, _ = encode_transition(transition, previous_action_id)
+        previous_action_id = transition.action
+        new_q_values.append(learn_transition(transition, state_idx, state, next_state, calculated_reward))
+        step_counter += 1
+    return new_q_values, calculated_reward
+
+# same as calling /train once per transition, in order, as one learner job
+@app.post("/train-batch")
+@metrics.timed(REQUEST_SECONDS.labels("/train-batch"))
+def update_agent_batch(req: TrainBatchRequest):
+    if cooldown.active:
+        RESTING_SKIPPED.labels("/train-batch").inc()
+        return {"status": "resting, skipped training", "applied": 0}
+    check_deployments(transition.deployment for transition in req.transitions)
+
+    new_q_values, last_reward = learner.call(train_batch_step, req.transitions)
+    if new_q_values:
+        update_status(reward=last_reward)
+        add_log(f"[SYSTEM] Learned a batch of {len(new_q_values)} transitions")
+
+    return {"status": "updated", "applied": len(new_q_values), "new_q_values": new_q_values}
+
+class ReloadRequest(BaseModel):
+    path: Optional[str] = None
+    policy: str = RELOAD_REPLACE
+
+@app.post("/admin/reload-model")
+def reload_model(req: ReloadRequest):
+    try:
+        path = resolve_model_path(req.path)
+    except PermissionError as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail=f"Model file {path} not found")
+
+    try:
+        info = load_brain(path, req.policy)
+    except model_store.ModelConfigMismatchError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    add_log(f"[SYSTEM] Reloaded model from {path} (run {info['run_id']}, policy {req.policy})")
+    return {"status": "reloaded", "model": info}
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(content=metrics_registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/admin/model")
+def get_model_info():
+    return {**model_info, "snapshot_version": learner.snapshot.version}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
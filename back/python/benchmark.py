@@ -0,0 +1,268 @@
+# offline benchmarks for the training loop, the agent and the API
+# results are written as JSON so runs before and after a change can be compared:
+#   python benchmark.py run --output before.json
+#   python benchmark.py compare before.json after.json
+import argparse
+import atexit
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import setup_config
+
+# the benchmarks never talk to ZooKeeper, config_loader reads a local snapshot instead
+# (an existing AUTOSCALER_CONFIG_SNAPSHOT is used as is)
+WORK_DIR = tempfile.mkdtemp(prefix="autoscaler-bench-")
+atexit.register(shutil.rmtree, WORK_DIR, ignore_errors=True)
+if "AUTOSCALER_CONFIG_SNAPSHOT" not in os.environ:
+    os.environ["AUTOSCALER_CONFIG_SNAPSHOT"] = os.path.join(WORK_DIR, "config_snapshot.json")
+    with open(os.environ["AUTOSCALER_CONFIG_SNAPSHOT"], "w") as f:
+        json.dump(setup_config.CONFIG_DATA, f)
+os.environ["AUTOSCALER_CONFIG_SOURCE"] = "snapshot"
+
+from config_loader import APP_CONFIG
+from agents.q_learning.mock_env import MockKubernetesEnv
+from agents.q_learning.vector_env import VectorizedMockKubernetesEnv
+from agents.q_learning.q_learning import QLearningAgent
+from agents.bandit.bandit_safety import SafetyBandit
+import model_store
+import train
+
+
+def _percentiles(samples: list) -> dict:
+    values = np.asarray(samples, dtype=np.float64) * 1e6
+    return {
+        "p50_us": float(np.percentile(values, 50)),
+        "p99_us": float(np.percentile(values, 99)),
+        "mean_us": float(values.mean()),
+        "samples": len(samples),
+    }
+
+def bench_env(steps: int) -> dict:
+    num_actions = len(APP_CONFIG["actions"])
+    env = MockKubernetesEnv()
+    env.reset()
+    actions = [random.randrange(num_actions) for _ in range(steps)]
+
+    start = time.perf_counter()
+    for action in actions:
+        _, _, done, _ = env.step(action)
+        if done:
+            env.reset()
+    single = steps / (time.perf_counter() - start)
+
+    num_envs = 256
+    vector_env = VectorizedMockKubernetesEnv(num_envs=num_envs, seed=0)
+    vector_env.reset()
+    rng = np.random.default_rng(0)
+    batches = max(1, steps // num_envs)
+    start = time.perf_counter()
+    for _ in range(batches):
+        vector_env.step(rng.integers(0, num_actions, num_envs))
+    vectorized = batches * num_envs / (time.perf_counter() - start)
+
+    return {"steps_per_second": single, "vectorized_steps_per_second": vectorized, "vectorized_num_envs": num_envs}
+
+def bench_training(episodes: int) -> dict:
+    num_states, num_actions, valid_pod_states = train.get_state_space()
+    env = MockKubernetesEnv()
+    agent = train.build_agent(num_states, num_actions, valid_pod_states)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+
+    start = time.perf_counter()
+    for _ in range(episodes):
+        train.run_episode(env, agent, safety_bandit)
+        agent.decay_epsilon()
+    return {"episodes_per_second": episodes / (time.perf_counter() - start), "episodes": episodes}
+
+def bench_agent(calls: int) -> dict:
+    num_states, num_actions, _ = train.get_state_space()
+    all_actions = list(range(num_actions))
+    rng = np.random.default_rng(0)
+    states = rng.integers(0, num_states, calls).tolist()
+    next_states = rng.integers(0, num_states, calls).tolist()
+    actions = rng.integers(0, num_actions, calls).tolist()
+
+    results = {}
+    for storage in ("list", "numpy", "sparse"):
+        agent = QLearningAgent(num_states=num_states, num_actions=num_actions, storage=storage, seed=0)
+        agent.load_q_table(rng.random((num_states, num_actions)))
+
+        for epsilon in (1.0, 0.05):
+            agent.epsilon = epsilon
+            start = time.perf_counter()
+            for state in states:
+                agent.select_action(state, allowed_actions=all_actions)
+            results[f"{storage}_select_action_epsilon_{epsilon}_ns"] = (time.perf_counter() - start) / calls * 1e9
+
+        start = time.perf_counter()
+        for state, action, next_state in zip(states, actions, next_states):
+            agent.updateAction(state, action, 1.0, next_state, False)
+        results[f"{storage}_update_action_ns"] = (time.perf_counter() - start) / calls * 1e9
+    return results
+
+def _table_bytes(storage: str, num_states: int, num_actions: int) -> int:
+    tracemalloc.start()
+    agent = QLearningAgent(num_states=num_states, num_actions=num_actions, storage=storage)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del agent
+    return size
+
+def bench_model(model_path: str) -> dict:
+    num_states, num_actions, valid_pod_states = train.get_state_space()
+    agent = train.build_agent(num_states, num_actions, valid_pod_states)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+    train.save_model(agent, safety_bandit, model_path)
+
+    timings = {}
+    for mode in ("r", "c"):
+        samples = []
+        for _ in range(20):
+            start = time.perf_counter()
+            model_store.load_model(model_path, mode=mode)
+            samples.append(time.perf_counter() - start)
+        timings[f"load_mode_{mode}_us"] = float(np.median(samples) * 1e6)
+
+    samples = []
+    for _ in range(20):
+        start = time.perf_counter()
+        loaded = model_store.load_model(model_path, mode="c")
+        fresh = QLearningAgent(num_states=num_states, num_actions=num_actions, storage="numpy")
+        fresh.load_q_table(loaded.arrays["q_table"])
+        samples.append(time.perf_counter() - start)
+    timings["load_into_agent_us"] = float(np.median(samples) * 1e6)
+
+    timings["file_bytes"] = os.path.getsize(model_path)
+    timings["q_table_numpy_bytes"] = _table_bytes("numpy", num_states, num_actions)
+    timings["q_table_list_bytes"] = _table_bytes("list", num_states, num_actions)
+    timings["q_table_sparse_bytes"] = _table_bytes("sparse", num_states, num_actions)
+    return timings
+
+def bench_api(requests: int, model_path: str) -> dict:
+    # the server loads brain_model.bin and keeps its journal relative to the working directory
+    api_dir = os.path.dirname(model_path)
+    os.environ["JOURNAL_DIR"] = os.path.join(api_dir, "online_journal")
+    os.environ["REPLAY_INTERVAL"] = "0"
+    os.environ["MODEL_WATCH_INTERVAL"] = "0"
+    previous_dir = os.getcwd()
+    os.chdir(api_dir)
+    try:
+        from fastapi.testclient import TestClient
+        from api import server
+        client = TestClient(server.app)
+    finally:
+        os.chdir(previous_dir)
+
+    rng = np.random.default_rng(0)
+    decide_samples = []
+    for _ in range(requests):
+        body = {"pod_count": int(rng.integers(1, 16)), "cpu_usage": float(rng.uniform(0, 100)), "ram_usage": float(rng.uniform(0, 100)), "is_crashed": False}
+        start = time.perf_counter()
+        client.post("/decide", json=body)
+        decide_samples.append(time.perf_counter() - start)
+
+    train_samples = []
+    for _ in range(requests):
+        state = {"cpu_percentage": float(rng.uniform(0, 100)), "ram_percentage": float(rng.uniform(0, 100)), "replicas": int(rng.integers(1, 16))}
+        next_state = {"cpu_percentage": float(rng.uniform(0, 100)), "ram_percentage": float(rng.uniform(0, 100)), "replicas": int(rng.integers(1, 16))}
+        body = {"state": state, "action": int(rng.integers(0, 4)), "next_state": next_state, "done": False}
+        start = time.perf_counter()
+        client.post("/train", json=body)
+        train_samples.append(time.perf_counter() - start)
+
+    return {"decide": _percentiles(decide_samples), "train": _percentiles(train_samples)}
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+BENCHMARKS = ("env", "training", "agent", "model", "api")
+
+def run(selected, output: str, scale: float = 1.0):
+    random.seed(0)
+    model_path = os.path.join(WORK_DIR, "api", "brain_model.bin")
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "config_hash": model_store.config_hash(),
+            "scale": scale,
+        },
+    }
+    if "env" in selected:
+        results["env"] = bench_env(int(200000 * scale))
+    if "training" in selected:
+        results["training"] = bench_training(int(500 * scale))
+    if "agent" in selected:
+        results["agent"] = bench_agent(int(200000 * scale))
+    # the API benchmark serves the model written here
+    if "model" in selected or "api" in selected:
+        results["model"] = bench_model(model_path)
+    if "api" in selected:
+        results["api"] = bench_api(int(2000 * scale), model_path)
+
+    print(json.dumps(results, indent=4))
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to {output}")
+    return results
+
+def _flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+# prints every metric of two result files side by side with the relative change
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = _flatten(json.load(f))
+    with open(after_path) as f:
+        after = _flatten(json.load(f))
+
+    print(f"{'metric':55} {'before':>14} {'after':>14} {'change':>9}")
+    for key in sorted(set(before) | set(after)):
+        old, new = before.get(key), after.get(key)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else ""
+        print(f"{key:55} {'' if old is None else f'{old:.2f}':>14} {'' if new is None else f'{new:.2f}':>14} {change:>9}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark training throughput, the agent and API latency")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS))
+    run_parser.add_argument("--output", default=None, help="JSON file for the results")
+    run_parser.add_argument("--scale", type=float, default=1.0, help="multiplies the iteration counts")
+
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("before")
+    compare_parser.add_argument("after")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args.only, args.output, args.scale)
+    else:
+        compare(args.before, args.after)
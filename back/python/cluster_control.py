@@ -0,0 +1,96 @@
+# cooldown and replica scaling for the dashboard actions, without tying up worker threads
+#
+# the cooldown is a monotonic "resting until" deadline: checking it is a clock read and
+# nothing sleeps while it runs. scalers are awaited on the event loop, KubectlScaler runs
+# kubectl as an async subprocess (no shell), FakeScaler only records what it was asked to
+# do, for running the server and its tests without a cluster.
+#   SCALER_BACKEND=fake python api/server.py
+import asyncio
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Cooldown:
+    def __init__(self):
+        self.resting_until = 0.0
+
+    # starts (or extends) a cooldown of the given length, returns the deadline
+    def start(self, seconds: float) -> float:
+        self.resting_until = max(self.resting_until, time.monotonic() + seconds)
+        return self.resting_until
+
+    def remaining(self) -> float:
+        return max(0.0, self.resting_until - time.monotonic())
+
+    @property
+    def active(self) -> bool:
+        return time.monotonic() < self.resting_until
+
+
+class ScaleResult(NamedTuple):
+    ok: bool
+    output: str
+
+
+class KubectlScaler:
+    def __init__(self, deployment: str, kubectl: str = "kubectl", timeout_seconds: float = 30.0):
+        self.deployment = deployment
+        self.kubectl = kubectl
+        self.timeout_seconds = timeout_seconds
+
+    # deployment=None scales the default one
+    async def scale(self, replicas: int, deployment: Optional[str] = None) -> ScaleResult:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                self.kubectl, "scale", "deployment", deployment or self.deployment, f"--replicas={replicas}",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except OSError as e:
+            return ScaleResult(False, str(e))
+
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout_seconds)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            return ScaleResult(False, f"kubectl did not finish within {self.timeout_seconds}s")
+
+        if process.returncode == 0:
+            return ScaleResult(True, stdout.decode("utf-8", "replace"))
+        return ScaleResult(False, stderr.decode("utf-8", "replace"))
+
+
+class FakeScaler:
+    def __init__(self, replicas: int = 1, delay_seconds: float = 0.0, fail: bool = False):
+        # replicas of every deployment it was asked to scale, None is the default one
+        self.replicas: Dict[Optional[str], int] = {None: replicas}
+        self.delay_seconds = delay_seconds
+        self.fail = fail
+        self.calls: List[Tuple[Optional[str], int]] = []
+
+    async def scale(self, replicas: int, deployment: Optional[str] = None) -> ScaleResult:
+        self.calls.append((deployment, replicas))
+        if self.delay_seconds:
+            await asyncio.sleep(self.delay_seconds)
+        if self.fail:
+            return ScaleResult(False, "fake scaler set to fail")
+        self.replicas[deployment] = replicas
+        return ScaleResult(True, f"deployment {deployment or 'default'} scaled to {replicas}")
+
+
+SCALER_KUBECTL = "kubectl"
+SCALER_FAKE = "fake"
+
+# the backend named by SCALER_BACKEND ("kubectl" by default)
+def scaler_from_env(backend: Optional[str] = None):
+    backend = backend or os.environ.get("SCALER_BACKEND", SCALER_KUBECTL)
+    if backend == SCALER_KUBECTL:
+        return KubectlScaler(
+            os.environ.get("SCALER_DEPLOYMENT", "yair-api-python"),
+            timeout_seconds=float(os.environ.get("SCALER_TIMEOUT", "30")),
+        )
+    if backend == SCALER_FAKE:
+        return FakeScaler()
+    raise ValueError(f"Unknown scaler backend: {backend}")
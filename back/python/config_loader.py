@@ -1,21 +1,397 @@
 from kazoo.client import KazooClient
+from dataclasses import MISSING, dataclass, field, fields
+from typing import Callable, Dict, List, Optional
+import copy
 import json
+import os
 import sys
+import threading
+import time
+import weakref
+
+ZK_HOSTS = os.environ.get("ZK_HOSTS", "127.0.0.1:2181")
+CONFIG_PATH = "/autoscaler/config"
+ZK_CONNECT_TIMEOUT = float(os.environ.get("ZK_CONNECT_TIMEOUT", "5"))
+# how often a watch that could not be registered yet is retried in the background
+ZK_WATCH_RETRY_SECONDS = float(os.environ.get("ZK_WATCH_RETRY_SECONDS", "5"))
+# "zookeeper" reads ZK and falls back to the snapshot, "snapshot" never touches ZK (offline runs)
+CONFIG_SOURCE = os.environ.get("AUTOSCALER_CONFIG_SOURCE", "zookeeper")
+SNAPSHOT_PATH = os.environ.get(
+    "AUTOSCALER_CONFIG_SNAPSHOT",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "config_snapshot.json"),
+)
+
+
+class ConfigUnavailableError(RuntimeError):
+    pass
+
+
+def _section(cls, data: dict, name: str):
+    values = {}
+    for section_field in fields(cls):
+        if section_field.name in data:
+            values[section_field.name] = data[section_field.name]
+        elif section_field.default is not MISSING:
+            continue
+        else:
+            raise ValueError(f"Config section '{name}' is missing '{section_field.name}'")
+    return cls(**values)
+
+@dataclass(frozen=True)
+class SystemLimits:
+    min_pods: int
+    max_pods: int
+    replica_change_up: int
+    replica_change_down: int
+    loop_delay_seconds: int
+
+@dataclass(frozen=True)
+class MetricsConfig:
+    max_percentage: int
+    bucket_step: int
+    num_buckets: int
+    # num_buckets - 1 increasing bucket boundaries in %, None cuts every bucket_step % (see state_codec.py)
+    bucket_edges: Optional[List[float]] = None
+
+@dataclass(frozen=True)
+class RLHyperparameters:
+    num_episodes: int
+    epsilon: float
+    alpha: float
+    gamma: float
+    epsilon_min: float
+    epsilon_decay: float
+    max_steps: int
+    q_value_init: float
+    catastrophic_penalty: float
+    convergence_threshold: float
+    catastrophic_failure_penalty: Optional[float] = None
+    # stop training once the EMA of the per-episode max |dQ| stays below this (None: reward window only)
+    q_delta_threshold: Optional[float] = None
+    convergence_patience: int = 1
+
+@dataclass(frozen=True)
+class Rewards:
+    good: float
+    neutral: float
+    bad: float
+    safe_reward: float
+    mock_ideal: float
+    mock_cpu_high_load: float
+    mock_ram_high_load: float
+    mock_waste: float
+    mock_restart_penalty: float
+    mock_thrashing_penalty: float
+
+@dataclass(frozen=True)
+class Actions:
+    scale_up: int
+    scale_down: int
+    no_action: int
+    restart: int
+
+@dataclass(frozen=True)
+class LogicConstants:
+    action_count_init: int
+    random_range_start: int
+    offset_to_last_index: int
+    update_factor_numerator: float
+    min_learning_rate: float
+    failure_count_init: int
+    failure_count_increment: int
+    min_tries_default: int
+    step_size: int
+    min_level: int
+    ideal_cpu_level: int
+    ideal_ram_level: int
+    initial_cpu_percentage: int
+    initial_ram_percentage: int
+    high_load_threshold: int
+    low_load_threshold: int
+    critical_load_offset: int
+    critical_min_pods: int
+    ideal_replicas: int
+    initial_replicas: int
+    initial_step_count: int
+    initial_reward: float
+    min_index: int
+
+# which agent the server runs, "tabular" (QLearningAgent) or "tile_coding" (TileCodingAgent)
+# storage is "numpy" or "sparse" for the tabular agent and the safety bandit
+# the tile settings only apply to tile_coding: memory is num_tilings * tiles, whatever bucket_step is
+@dataclass(frozen=True)
+class AgentConfig:
+    type: str = "tabular"
+    storage: str = "numpy"
+    num_tilings: int = 8
+    cpu_tiles: int = 10
+    ram_tiles: int = 10
+    replica_tiles: int = 8
+
+# typed, read-only view of the /autoscaler/config node
+# raw keeps the original dict (including keys this module does not know yet)
+@dataclass(frozen=True)
+class AppConfig:
+    system_limits: SystemLimits
+    metrics_config: MetricsConfig
+    rl_hyperparameters: RLHyperparameters
+    rewards: Rewards
+    actions: Actions
+    logic_constants: LogicConstants
+    agent: AgentConfig
+    raw: dict = field(compare=False, repr=False)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AppConfig":
+        return cls(
+            system_limits=_section(SystemLimits, data["system_limits"], "system_limits"),
+            metrics_config=_section(MetricsConfig, data["metrics_config"], "metrics_config"),
+            rl_hyperparameters=_section(RLHyperparameters, data["rl_hyperparameters"], "rl_hyperparameters"),
+            rewards=_section(Rewards, data["rewards"], "rewards"),
+            actions=_section(Actions, data["actions"], "actions"),
+            logic_constants=_section(LogicConstants, data["logic_constants"], "logic_constants"),
+            # optional, configs written before it existed get the tabular agent
+            agent=_section(AgentConfig, data.get("agent", {}), "agent"),
+            raw=copy.deepcopy(data),
+        )
+
+    @property
+    def num_actions(self) -> int:
+        return len(self.raw["actions"])
+
+    @property
+    def valid_pod_states(self) -> int:
+        return self.system_limits.max_pods - self.system_limits.min_pods + 1
+
+    @property
+    def num_states(self) -> int:
+        return self.metrics_config.num_buckets * self.metrics_config.num_buckets * self.valid_pod_states
+
+    @property
+    def catastrophic_failure_penalty(self) -> float:
+        penalty = self.rl_hyperparameters.catastrophic_failure_penalty
+        return self.rl_hyperparameters.catastrophic_penalty if penalty is None else penalty
+
+
+# minimal in-process stand-in for the parts of KazooClient this module uses
+# lets tests and offline tools drive config updates without a ZooKeeper server
+class InMemoryZooKeeper:
+    def __init__(self, nodes: Optional[Dict[str, bytes]] = None):
+        self.nodes = dict(nodes or {})
+        self.watchers: Dict[str, List[Callable]] = {}
+        self.version = 0
+
+    def start(self, timeout: float = None):
+        pass
+
+    def start_async(self) -> threading.Event:
+        connected = threading.Event()
+        connected.set()
+        return connected
+
+    def stop(self):
+        pass
+
+    def exists(self, path: str):
+        return path in self.nodes
+
+    def get(self, path: str):
+        return self.nodes[path], None
+
+    def create(self, path: str, value: bytes, makepath: bool = False):
+        self.set(path, value)
+
+    def set(self, path: str, value: bytes):
+        self.nodes[path] = value
+        self.version += 1
+        for watcher in self.watchers.get(path, []):
+            watcher(value, None)
+
+    def DataWatch(self, path: str, func: Callable):
+        self.watchers.setdefault(path, []).append(func)
+        func(self.nodes.get(path), None)
+        return func
+
+
+class ConfigStore:
+    def __init__(
+        self,
+        hosts: str = ZK_HOSTS,
+        path: str = CONFIG_PATH,
+        snapshot_path: Optional[str] = SNAPSHOT_PATH,
+        client_factory: Callable = KazooClient,
+        connect_timeout: float = ZK_CONNECT_TIMEOUT,
+        watch_retry_seconds: float = ZK_WATCH_RETRY_SECONDS,
+    ):
+        self.hosts = hosts
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.client_factory = client_factory
+        self.connect_timeout = connect_timeout
+        self.watch_retry_seconds = watch_retry_seconds
+        self.client = None
+        # set while the client is connected
+        self.connected = None
+        self.config: Optional[AppConfig] = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+    # the client keeps connecting in the background after a timeout, so a later watch() reuses
+    # it instead of waiting through another connect timeout
+    def _connect(self, timeout: Optional[float] = None):
+        if self.client is None:
+            self.client = self.client_factory(hosts=self.hosts)
+            self.connected = self.client.start_async()
+        timeout = self.connect_timeout if timeout is None else timeout
+        if not self.connected.wait(timeout):
+            raise ConfigUnavailableError(f"No connection to ZooKeeper at {self.hosts} within {timeout:g}s")
+        return self.client
+
+    def _read_zookeeper(self) -> dict:
+        client = self._connect()
+        if not client.exists(self.path):
+            raise ConfigUnavailableError(f"Path {self.path} does not exist in Zookeeper.")
+        data, stat = client.get(self.path)
+        return json.loads(data.decode("utf-8"))
+
+    def _read_snapshot(self) -> dict:
+        with open(self.snapshot_path) as f:
+            return json.load(f)
+
+    def _write_snapshot(self, data: dict):
+        if not self.snapshot_path:
+            return
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=4)
+        os.replace(tmp_path, self.snapshot_path)
+
+    # ZooKeeper first (refreshing the snapshot), the on-disk snapshot when ZK is unreachable
+    def load(self, source: str = "zookeeper") -> AppConfig:
+        errors = []
+        if source == "zookeeper":
+            try:
+                data = self._read_zookeeper()
+                self.config = AppConfig.from_dict(data)
+                self._write_snapshot(data)
+                return self.config
+            except Exception as e:
+                errors.append(f"ZooKeeper: {e}")
+
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                self.config = AppConfig.from_dict(self._read_snapshot())
+                return self.config
+            except Exception as e:
+                errors.append(f"snapshot {self.snapshot_path}: {e}")
+        else:
+            errors.append(f"no snapshot at {self.snapshot_path}")
+
+        raise ConfigUnavailableError("; ".join(errors))
+
+    # callback(new_config) runs on every config change
+    # bound methods are held weakly so subscribing objects can still be garbage collected
+    def subscribe(self, callback: Callable[[AppConfig], None]):
+        if hasattr(callback, "__self__"):
+            reference = weakref.WeakMethod(callback)
+        else:
+            reference = lambda: callback
+        with self.lock:
+            self.subscribers.append(reference)
+
+    def publish(self, data: dict):
+        new_config = AppConfig.from_dict(data)
+        with self.lock:
+            if self.config is not None and new_config == self.config:
+                return
+            self.config = new_config
+            self._write_snapshot(data)
+            _update_app_config(data)
+        self.notify(new_config)
+
+    def notify(self, config: AppConfig):
+        with self.lock:
+            live = [(reference, reference()) for reference in self.subscribers]
+            self.subscribers = [reference for reference, callback in live if callback is not None]
+
+        for _, callback in live:
+            if callback is None:
+                continue
+            try:
+                callback(config)
+            except Exception as e:
+                print(f"Config subscriber failed: {e}")
+
+    def _on_data(self, data: Optional[bytes], stat):
+        if data is None:
+            return
+        try:
+            self.publish(json.loads(data.decode("utf-8")))
+        except Exception as e:
+            print(f"Ignoring invalid config update from ZK: {e}")
+
+    # keeps a ZK watch on the config node and pushes every change to the subscribers
+    # never waits for ZooKeeper: without a connection (load() fell back to the snapshot) the
+    # watch is registered from a background thread once the client gets through
+    def watch(self):
+        try:
+            self._connect(timeout=0).DataWatch(self.path, self._on_data)
+        except Exception as e:
+            print(f"Config watch not registered ({e}), retrying in the background")
+            threading.Thread(target=self._watch_until_registered, daemon=True).start()
+
+    def _watch_until_registered(self):
+        while True:
+            try:
+                self._connect(timeout=self.watch_retry_seconds).DataWatch(self.path, self._on_data)
+                print(f"Config watch registered on {self.path}")
+                return
+            except ConfigUnavailableError:
+                continue
+            except Exception as e:
+                print(f"Config watch failed ({e}), retrying in {self.watch_retry_seconds:g}s")
+                time.sleep(self.watch_retry_seconds)
+
+
+# replaces the sections of APP_CONFIG in place, code holding the dict sees new values
+# each section is swapped as a whole so readers never see a half updated section
+def _update_app_config(data: dict):
+    for key, value in copy.deepcopy(data).items():
+        APP_CONFIG[key] = value
+    for key in list(APP_CONFIG):
+        if key not in data:
+            del APP_CONFIG[key]
+
+def get_config() -> AppConfig:
+    return config_store.config
+
+def subscribe(callback: Callable[[AppConfig], None]):
+    config_store.subscribe(callback)
+
+def start_watch():
+    if CONFIG_SOURCE == "zookeeper":
+        config_store.watch()
+
+# swaps the module-level store (e.g. for one backed by InMemoryZooKeeper in tests)
+# existing subscribers move over and hear about the new config
+def use_store(store: ConfigStore, source: str = "zookeeper") -> AppConfig:
+    global config_store
+    previous = config_store.config
+    store.subscribers = config_store.subscribers + store.subscribers
+    config_store = store
+
+    config = store.load(source)
+    _update_app_config(config.raw)
+    if config != previous:
+        store.notify(config)
+    return config
 
 def load_zk_config():
     try:
-        zk = KazooClient(hosts='127.0.0.1:2181')
-        zk.start(timeout=5)
-        path = "/autoscaler/config"
-        if not zk.exists(path):
-            print(f"Error: Path {path} does not exist in Zookeeper.")
-            sys.exit(1)
-            
-        data, stat = zk.get(path)
-        zk.stop()
-        return json.loads(data.decode('utf-8'))
+        return config_store.load(CONFIG_SOURCE).raw
     except Exception as e:
         print(f"Failed to load config from ZK: {e}")
         sys.exit(1)
 
-APP_CONFIG = load_zk_config()
\ No newline at end of file
+config_store = ConfigStore()
+APP_CONFIG = copy.deepcopy(load_zk_config())
@@ -0,0 +1,130 @@
+# decides when training has converged, with O(1) work per episode
+#
+# rewards go into a fixed ring buffer (window mean), Welford's running mean/variance
+# and an EMA. the Q table's stability is tracked through the max and mean absolute
+# Q-value change of each episode (also smoothed with an EMA). every check_every
+# episodes the monitor checks the stop criterion and training stops after `patience`
+# stable checks in a row:
+#   - with q_delta_threshold: the EMA of the per-episode max |dQ| is below it
+#   - without: the window mean moved less than reward_threshold since the last check
+import math
+from typing import Optional
+import numpy as np
+from config_loader import APP_CONFIG
+
+
+class ConvergenceMonitor:
+    def __init__(
+        self,
+        window_size: int = 1000,
+        check_every: int = 5000,
+        reward_threshold: float = APP_CONFIG["rl_hyperparameters"]["convergence_threshold"],
+        q_delta_threshold: Optional[float] = APP_CONFIG["rl_hyperparameters"].get("q_delta_threshold"),
+        patience: int = APP_CONFIG["rl_hyperparameters"].get("convergence_patience", 1),
+        ema_alpha: float = 0.001,
+    ):
+        self.window_size = window_size
+        self.check_every = check_every
+        self.reward_threshold = reward_threshold
+        self.q_delta_threshold = q_delta_threshold
+        self.patience = patience
+        self.ema_alpha = ema_alpha
+
+        self.episodes = 0
+
+        # ring buffer of the last window_size rewards with a running sum
+        self.window = np.zeros(window_size, dtype=np.float64)
+        self.window_position = 0
+        self.window_count = 0
+        self.window_sum = 0.0
+
+        # Welford's running mean/variance over every episode
+        self.reward_mean = 0.0
+        self._reward_m2 = 0.0
+
+        self.reward_ema = None
+        self.q_max_delta_ema = None
+        self.q_mean_delta_ema = None
+        self.last_q_max_delta = None
+        self.last_q_mean_delta = None
+
+        self.previous_window_mean = None
+        self.window_diff = math.inf
+        self.stable_checks = 0
+        self.converged = False
+        # True when the last end_episode ran a convergence check
+        self.checked = False
+
+    @property
+    def window_mean(self) -> float:
+        return self.window_sum / self.window_count if self.window_count else 0.0
+
+    @property
+    def reward_variance(self) -> float:
+        return self._reward_m2 / (self.episodes - 1) if self.episodes > 1 else 0.0
+
+    def _ema(self, current: Optional[float], value: float) -> float:
+        return value if current is None else current + self.ema_alpha * (value - current)
+
+    # records one finished episode, returns True once training has converged
+    # q_max_delta/q_mean_delta: max and mean |dQ| of the updates made in the episode
+    def end_episode(self, total_reward: float, q_max_delta: Optional[float] = None, q_mean_delta: Optional[float] = None) -> bool:
+        total_reward = float(total_reward)
+        self.episodes += 1
+
+        if self.window_count == self.window_size:
+            self.window_sum -= self.window[self.window_position]
+        else:
+            self.window_count += 1
+        self.window[self.window_position] = total_reward
+        self.window_sum += total_reward
+        self.window_position = (self.window_position + 1) % self.window_size
+
+        delta = total_reward - self.reward_mean
+        self.reward_mean += delta / self.episodes
+        self._reward_m2 += delta * (total_reward - self.reward_mean)
+        self.reward_ema = self._ema(self.reward_ema, total_reward)
+
+        if q_max_delta is not None:
+            self.last_q_max_delta = float(q_max_delta)
+            self.last_q_mean_delta = float(q_mean_delta if q_mean_delta is not None else q_max_delta)
+            self.q_max_delta_ema = self._ema(self.q_max_delta_ema, self.last_q_max_delta)
+            self.q_mean_delta_ema = self._ema(self.q_mean_delta_ema, self.last_q_mean_delta)
+
+        self.checked = self.episodes % self.check_every == 0 and self.window_count == self.window_size
+        if self.checked:
+            self._check()
+        return self.converged
+
+    def _check(self):
+        window_mean = self.window_mean
+        if self.previous_window_mean is not None:
+            self.window_diff = abs(window_mean - self.previous_window_mean)
+        self.previous_window_mean = window_mean
+
+        if self.q_delta_threshold is not None and self.q_max_delta_ema is not None:
+            stable = self.q_max_delta_ema < self.q_delta_threshold
+        else:
+            stable = self.window_diff <= self.reward_threshold
+
+        self.stable_checks = self.stable_checks + 1 if stable else 0
+        self.converged = self.stable_checks >= self.patience
+
+    def criteria(self) -> str:
+        if self.q_delta_threshold is not None:
+            rule = f"max |dQ| EMA < {self.q_delta_threshold}"
+        else:
+            rule = f"reward window diff <= {self.reward_threshold:.3f}"
+        return f"Convergence: {rule} at {self.patience} checks in a row (every {self.check_every} episodes)"
+
+    def describe(self) -> str:
+        text = (
+            f"--- Episode {self.episodes}: Window Avg: {self.window_mean:.2f}, Diff: {self.window_diff:.4f}, "
+            f"EMA: {self.reward_ema:.2f}, Std: {math.sqrt(self.reward_variance):.2f}"
+        )
+        if self.q_max_delta_ema is not None:
+            text += f", Max |dQ| EMA: {self.q_max_delta_ema:.4f}, Mean |dQ| EMA: {self.q_mean_delta_ema:.6f}"
+        return text + f", Stable checks: {self.stable_checks}/{self.patience} ---"
+
+    def __repr__(self) -> str:
+        return f"ConvergenceMonitor(episodes={self.episodes}, converged={self.converged})"
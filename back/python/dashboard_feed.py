@@ -0,0 +1,154 @@
+# what the dashboard shows: the server log and the latest status, pushed as they change
+#
+# LogRing keeps the last entries with increasing sequence numbers, so a client passes the
+# last seq it has seen and only gets what is new. StatusBoard swaps in a new status dict
+# on every update and counts versions. both call their listeners after a change, which is
+# how stream() wakes up to push Server-Sent Events. ConsoleWriter prints in the background.
+import asyncio
+import collections
+import json
+import queue
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+
+class _Listeners:
+    def __init__(self):
+        self.listeners = set()
+
+    def add_listener(self, callback: Callable[[], None]):
+        self.listeners.add(callback)
+
+    def remove_listener(self, callback: Callable[[], None]):
+        self.listeners.discard(callback)
+
+    def _notify(self):
+        for callback in list(self.listeners):
+            callback()
+
+
+# "[ERROR] ..." -> "error", messages without a tag are "info"
+def log_level(message: str) -> str:
+    for level in ("ERROR", "WARNING", "SYSTEM"):
+        if f"[{level}]" in message:
+            return level.lower()
+    return "info"
+
+
+class LogRing(_Listeners):
+    def __init__(self, capacity: int = 100):
+        super().__init__()
+        self.entries = collections.deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.seq = 0
+
+    def append(self, message: str) -> dict:
+        with self.lock:
+            self.seq += 1
+            entry = {"seq": self.seq, "time": time.time(), "level": log_level(message), "message": message}
+            self.entries.append(entry)
+        self._notify()
+        return entry
+
+    # entries after the given seq (all of them for None) and how many of the asked ones
+    # were already pushed out of the ring
+    # returns (entries, last seq, missed count)
+    def since(self, cursor: Optional[int] = None):
+        with self.lock:
+            entries = list(self.entries)
+            last_seq = self.seq
+        # a cursor from before a server restart starts over
+        if cursor is None or cursor > last_seq:
+            return entries, last_seq, 0
+        new_entries = [entry for entry in entries if entry["seq"] > cursor]
+        first_seq = new_entries[0]["seq"] if new_entries else last_seq + 1
+        return new_entries, last_seq, max(0, first_seq - cursor - 1)
+
+
+class StatusBoard(_Listeners):
+    def __init__(self, status: dict):
+        super().__init__()
+        self.lock = threading.Lock()
+        self.status = dict(status)
+        self.version = 0
+
+    # readers get the current dict as is, so it is replaced instead of changed
+    # an update that changes nothing keeps the version and wakes nobody
+    def update(self, **values):
+        with self.lock:
+            if all(key in self.status and self.status[key] == value for key, value in values.items()):
+                return
+            self.status = {**self.status, **values}
+            self.version += 1
+        self._notify()
+
+    def read(self):
+        with self.lock:
+            return self.version, self.status
+
+
+# print() of every log line would block the request thread on a slow terminal or pipe
+class ConsoleWriter:
+    def __init__(self, max_pending: int = 10000):
+        self.lines = queue.Queue(maxsize=max_pending)
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def write(self, line: str):
+        try:
+            self.lines.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            line = self.lines.get()
+            if self.dropped:
+                print(f"[WARNING] {self.dropped} log lines were not printed, stdout is too slow")
+                self.dropped = 0
+            print(line, flush=self.lines.empty())
+
+
+def sse_event(event: str, data, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+# Server-Sent Events: the status whenever it changes and every log entry after cursor
+# runs on the event loop and only wakes up when something changed (or to send a keep-alive)
+async def stream(ring: LogRing, board: StatusBoard, is_disconnected: Callable[[], Awaitable[bool]], cursor: Optional[int] = None, keepalive_seconds: float = 15.0):
+    loop = asyncio.get_running_loop()
+    wake = asyncio.Event()
+
+    def notify():
+        loop.call_soon_threadsafe(wake.set)
+
+    ring.add_listener(notify)
+    board.add_listener(notify)
+    try:
+        sent_version = None
+        while not await is_disconnected():
+            wake.clear()
+            version, status = board.read()
+            if version != sent_version:
+                sent_version = version
+                yield sse_event("status", status)
+
+            entries, last_seq, missed = ring.since(cursor)
+            if missed:
+                yield sse_event("missed", {"count": missed})
+            for entry in entries:
+                yield sse_event("log", entry, entry["seq"])
+            cursor = last_seq
+
+            try:
+                await asyncio.wait_for(wake.wait(), keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+    finally:
+        ring.remove_listener(notify)
+        board.remove_listener(notify)
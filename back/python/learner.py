@@ -0,0 +1,101 @@
+# single writer for a model that is read concurrently
+#
+# request handlers hand their updates to the learner thread as plain callables and wait
+# for the result. the thread runs whatever is queued back to back under the model lock,
+# then publishes one new snapshot for the whole batch. publishing is a single reference
+# swap, so readers never take a lock, never wait behind training and always see one
+# consistent, versioned model. before start() jobs run inline on the calling thread.
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, NamedTuple, Optional
+
+
+class Snapshot(NamedTuple):
+    version: int
+    model: Any
+
+
+class Learner:
+    def __init__(self, lock: threading.RLock, make_snapshot: Callable[[], Any], max_batch: int = 256):
+        # the caller's model lock, held while jobs run (e.g. against journal checkpoints)
+        self.lock = lock
+        # builds the read-only view readers get, runs on the learner thread only
+        self.make_snapshot = make_snapshot
+        self.max_batch = max_batch
+
+        self.jobs = queue.SimpleQueue()
+        self.snapshot: Optional[Snapshot] = None
+        self.thread = None
+        # callbacks jobs asked for, run once after the batch (a dict keeps order and drops repeats)
+        self.batch_callbacks = {}
+
+    def _publish(self):
+        version = self.snapshot.version + 1 if self.snapshot else 1
+        self.snapshot = Snapshot(version, self.make_snapshot())
+        callbacks, self.batch_callbacks = self.batch_callbacks, {}
+        for callback in callbacks:
+            callback()
+
+    # called from a job: runs callback once after the current batch, e.g. to publish the
+    # snapshot of another model the job changed
+    def after_batch(self, callback: Callable[[], None]):
+        self.batch_callbacks[callback] = None
+
+    # queues job(*args, **kwargs), the future resolves once its snapshot is published
+    def submit(self, job: Callable, *args, **kwargs) -> Future:
+        future = Future()
+        self.jobs.put((future, job, args, kwargs))
+        return future
+
+    # runs job on the learner and returns its result (or raises its exception)
+    def call(self, job: Callable, *args, **kwargs):
+        if self.thread is None:
+            with self.lock:
+                result = job(*args, **kwargs)
+                self._publish()
+            return result
+        if threading.current_thread() is self.thread:
+            # a job calling another job is already the single writer
+            return job(*args, **kwargs)
+        return self.submit(job, *args, **kwargs).result()
+
+    def start(self):
+        if self.snapshot is None:
+            self._publish()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _next_batch(self) -> list:
+        batch = [self.jobs.get()]
+        try:
+            # drain whatever else is waiting so it shares one snapshot
+            while len(batch) < self.max_batch:
+                batch.append(self.jobs.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            outcomes = []
+            with self.lock:
+                for future, job, args, kwargs in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        outcomes.append((future, job(*args, **kwargs), None))
+                    except Exception as e:
+                        outcomes.append((future, None, e))
+            try:
+                self._publish()
+            except Exception as e:
+                print(f"[ERROR] Learner snapshot failed: {e}")
+
+            # callers only hear back once their update is visible to readers
+            for future, result, error in outcomes:
+                if error is None:
+                    future.set_result(result)
+                else:
+                    future.set_exception(error)
@@ -0,0 +1,177 @@
+# binary, memory-mapped model format for the trained brain
+#
+# layout: 8 byte magic | uint32 format version | uint32 header length | JSON header
+# followed by the raw arrays, each one starting on a 64 byte boundary.
+# the header records where every array lives, so loading is a few np.memmap calls
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import struct
+import time
+import uuid
+from typing import Dict, NamedTuple, Optional
+import numpy as np
+from config_loader import APP_CONFIG
+
+MAGIC = b"APSEMDL\0"
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+PREAMBLE = struct.Struct("<8sII")
+
+
+class ModelConfigMismatchError(ValueError):
+    pass
+
+
+class LoadedModel(NamedTuple):
+    header: dict
+    arrays: Dict[str, np.ndarray]
+
+
+# hash of the config sections that decide how states and actions are indexed
+# a model trained under a different layout would silently index the wrong states
+def config_hash(config: dict = APP_CONFIG) -> str:
+    layout = {
+        "metrics_config": config["metrics_config"],
+        "min_pods": config["system_limits"]["min_pods"],
+        "max_pods": config["system_limits"]["max_pods"],
+        "actions": config["actions"],
+    }
+    encoded = json.dumps(layout, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def new_run_id() -> str:
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+# the whole model file in memory, returns (header, file bytes)
+def encode_model(arrays: Dict[str, np.ndarray], run_id: Optional[str] = None, config: dict = APP_CONFIG):
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "num_buckets": config["metrics_config"]["num_buckets"],
+        "min_pods": config["system_limits"]["min_pods"],
+        "max_pods": config["system_limits"]["max_pods"],
+        "num_actions": len(config["actions"]),
+        "config_hash": config_hash(config),
+        "run_id": run_id or new_run_id(),
+        "created_at": time.time(),
+        "arrays": {},
+    }
+
+    # the array offsets depend on the header size, so lay out with a guess and retry until stable
+    header_size = 0
+    while True:
+        offset = _align(PREAMBLE.size + header_size)
+        for name, array in arrays.items():
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset = _align(offset + array.nbytes)
+        encoded_header = json.dumps(header).encode("utf-8")
+        if len(encoded_header) <= header_size:
+            break
+        header_size = len(encoded_header) + 32
+
+    data = bytearray(offset)
+    data[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_size)
+    data[PREAMBLE.size:PREAMBLE.size + header_size] = encoded_header.ljust(header_size, b" ")
+    for name, array in arrays.items():
+        start = header["arrays"][name]["offset"]
+        data[start:start + array.nbytes] = array.tobytes()
+    return header, bytes(data)
+
+def save_model(path: str, arrays: Dict[str, np.ndarray], run_id: Optional[str] = None, config: dict = APP_CONFIG) -> dict:
+    header, data = encode_model(arrays, run_id=run_id, config=config)
+
+    # write next to the target and rename, readers never see a half written model
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return header
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, version, header_size = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a model file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has model format version {version}, expected {FORMAT_VERSION}")
+        return json.loads(f.read(header_size).decode("utf-8"))
+
+def check_config(header: dict, path: str = "model", config: dict = APP_CONFIG):
+    expected = {
+        "num_buckets": config["metrics_config"]["num_buckets"],
+        "min_pods": config["system_limits"]["min_pods"],
+        "max_pods": config["system_limits"]["max_pods"],
+        "num_actions": len(config["actions"]),
+        "config_hash": config_hash(config),
+    }
+    for key, value in expected.items():
+        if header.get(key) != value:
+            raise ModelConfigMismatchError(f"{path} was trained with {key}={header.get(key)}, current config has {value}")
+
+# maps the arrays of a model file without copying them
+# mode "r" is read only, "c" is copy-on-write (writes stay in memory), "r+" writes back to the file
+def load_model(path: str, mode: str = "r", verify_config: bool = True, config: dict = APP_CONFIG) -> LoadedModel:
+    header = read_header(path)
+    if verify_config:
+        check_config(header, path, config)
+
+    arrays = {}
+    for name, info in header["arrays"].items():
+        arrays[name] = np.memmap(path, dtype=np.dtype(info["dtype"]), mode=mode, offset=info["offset"], shape=tuple(info["shape"]))
+    return LoadedModel(header, arrays)
+
+# reads the old brain_model.pkl payload into arrays
+def load_legacy_pickle(path: str) -> Dict[str, np.ndarray]:
+    with open(path, "rb") as f:
+        data = pickle.load(f)
+
+    arrays = {"q_table": np.asarray(data["q_table"], dtype=np.float64)}
+    if "bandit_counts" in data and "bandit_failures" in data:
+        arrays["bandit_counts"] = np.asarray(data["bandit_counts"], dtype=np.int64)
+        arrays["bandit_failures"] = np.asarray(data["bandit_failures"], dtype=np.int64)
+    return arrays
+
+# loads either format by looking at the file itself
+def load_model_arrays(path: str, mode: str = "r") -> Dict[str, np.ndarray]:
+    with open(path, "rb") as f:
+        is_binary = f.read(len(MAGIC)) == MAGIC
+    if is_binary:
+        return load_model(path, mode=mode).arrays
+    return load_legacy_pickle(path)
+
+def convert_pickle(pickle_path: str, output_path: str, run_id: Optional[str] = None, config: dict = APP_CONFIG) -> dict:
+    arrays = load_legacy_pickle(pickle_path)
+
+    expected_states = config["metrics_config"]["num_buckets"] ** 2 * (config["system_limits"]["max_pods"] - config["system_limits"]["min_pods"] + 1)
+    expected_shape = (expected_states, len(config["actions"]))
+    if arrays["q_table"].shape != expected_shape:
+        raise ModelConfigMismatchError(f"{pickle_path} has a Q table of shape {arrays['q_table'].shape}, current config needs {expected_shape}")
+
+    return save_model(output_path, arrays, run_id=run_id or f"converted-{os.path.basename(pickle_path)}", config=config)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and convert brain model files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    convert_parser = commands.add_parser("convert", help="convert a brain_model.pkl into the binary format")
+    convert_parser.add_argument("pickle_path")
+    convert_parser.add_argument("output_path")
+    convert_parser.add_argument("--run-id", default=None)
+
+    info_parser = commands.add_parser("info", help="print the header of a binary model")
+    info_parser.add_argument("path")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        header = convert_pickle(args.pickle_path, args.output_path, run_id=args.run_id)
+        print(f"Converted {args.pickle_path} -> {args.output_path} (run {header['run_id']})")
+    else:
+        print(json.dumps(read_header(args.path), indent=4))
@@ -0,0 +1,225 @@
+# persists what the server learns online between model deployments
+#
+# every applied update is appended to a write-ahead log (wal_<first seq>.jsonl) and
+# the states it touched are marked dirty. a background thread writes the log and,
+# every checkpoint_interval seconds, saves only the dirty rows to ckpt_<seq>.npz.
+# after a restart, checkpoints are applied in order and then the log entries newer
+# than the last checkpoint are replayed, giving back the exact pre-crash tables.
+import glob
+import json
+import os
+import queue
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+import numpy as np
+
+META_FILE = "journal.json"
+CHECKPOINT_PATTERN = "ckpt_*.npz"
+WAL_PATTERN = "wal_*.jsonl"
+
+
+def _file_seq(path: str) -> int:
+    return int(os.path.basename(path).split("_", 1)[1].split(".", 1)[0])
+
+
+class OnlineJournal:
+    def __init__(
+        self,
+        directory: str,
+        lock: threading.Lock,
+        snapshot_rows: Callable[[List[int]], Dict[str, np.ndarray]],
+        checkpoint_interval: float = 60.0,
+        max_checkpoints: int = 50,
+    ):
+        self.directory = directory
+        # the caller's lock around updates, held here while dirty rows are copied
+        self.lock = lock
+        self.snapshot_rows = snapshot_rows
+        self.checkpoint_interval = checkpoint_interval
+        self.max_checkpoints = max_checkpoints
+
+        self.run_id = None
+        self.seq = 0
+        self.dirty = set()
+        self.rebase_pending = 0
+        self.entries = queue.SimpleQueue()
+        self.wal_file = None
+        self.last_checkpoint = time.monotonic()
+        self.thread = None
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _remove_files(self, pattern: str, up_to_seq: Optional[int] = None):
+        for path in glob.glob(self._path(pattern)):
+            if up_to_seq is None or _file_seq(path) <= up_to_seq:
+                os.remove(path)
+
+    def _open_wal(self, first_seq: int):
+        if self.wal_file is not None:
+            self.wal_file.close()
+        self.wal_file = open(self._path(f"wal_{first_seq:012d}.jsonl"), "a")
+
+    # starts a fresh journal on top of the given model run, dropping older history
+    # caller holds self.lock
+    def rebase(self, run_id: str, dirty_states: Iterable[int] = ()):
+        self.run_id = run_id
+        self.dirty = set(int(state) for state in dirty_states)
+        # checkpoints wait until the writer has dropped the old files
+        self.rebase_pending += 1
+        self.entries.put(("rebase", run_id, self.seq))
+
+    # replays checkpoints and log entries written for this model run
+    # apply_rows(states, arrays) restores checkpointed rows, apply_entry(entry) replays one update
+    # returns the number of replayed log entries
+    def recover(self, run_id: str, apply_rows: Callable[[np.ndarray, Dict[str, np.ndarray]], None], apply_entry: Callable[[dict], None]) -> int:
+        self.run_id = run_id
+        meta_path = self._path(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get("run_id") != run_id:
+                print(f"Online journal belongs to model run {meta.get('run_id')}, starting a new one for {run_id}")
+                self._reset_files(run_id)
+                self._open_wal(self.seq + 1)
+                return 0
+        else:
+            self._reset_files(run_id)
+
+        checkpoint_seq = 0
+        for path in sorted(glob.glob(self._path(CHECKPOINT_PATTERN)), key=_file_seq):
+            with np.load(path) as checkpoint:
+                apply_rows(checkpoint["states"], {key: checkpoint[key] for key in checkpoint.files if key != "states"})
+            checkpoint_seq = _file_seq(path)
+        self.seq = checkpoint_seq
+
+        replayed = 0
+        for path in sorted(glob.glob(self._path(WAL_PATTERN)), key=_file_seq):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a torn last line from the crash, nothing after it was applied
+                        break
+                    if entry["seq"] <= checkpoint_seq:
+                        continue
+                    apply_entry(entry)
+                    self.dirty.update(entry["states"])
+                    self.seq = entry["seq"]
+                    replayed += 1
+
+        self._open_wal(self.seq + 1)
+        return replayed
+
+    def _reset_files(self, run_id: str):
+        self._remove_files(CHECKPOINT_PATTERN)
+        self._remove_files(WAL_PATTERN)
+        with open(self._path(META_FILE), "w") as f:
+            json.dump({"run_id": run_id, "created_at": time.time()}, f)
+
+    # records one applied update, caller holds self.lock
+    # only bumps a counter and queues the entry, the file work happens in the background
+    def record(self, entry: dict, states: Iterable[int]) -> int:
+        self.seq += 1
+        entry["seq"] = self.seq
+        entry["states"] = [int(state) for state in states]
+        self.dirty.update(entry["states"])
+        self.entries.put(("entry", entry, self.seq))
+        return self.seq
+
+    def start(self):
+        if self.wal_file is None:
+            self._open_wal(self.seq + 1)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _next_batch(self) -> list:
+        batch = []
+        try:
+            batch.append(self.entries.get(timeout=1.0))
+            # drain whatever else is waiting so it is flushed once
+            while True:
+                batch.append(self.entries.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                for kind, payload, seq in batch:
+                    self._handle(kind, payload, seq)
+                self.wal_file.flush()
+                if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+            except Exception as e:
+                print(f"[ERROR] Online journal write failed: {e}")
+
+    def _handle(self, kind: str, payload, seq: int):
+        if kind == "entry":
+            self.wal_file.write(json.dumps(payload) + "\n")
+        elif kind == "rebase":
+            self._reset_files(payload)
+            self._open_wal(seq + 1)
+            with self.lock:
+                self.rebase_pending -= 1
+            self.last_checkpoint = 0.0
+
+    # writes the dirty rows, then starts a new log segment and drops the covered ones
+    def checkpoint(self):
+        with self.lock:
+            if self.rebase_pending:
+                return
+            states = sorted(self.dirty)
+            self.dirty = set()
+            seq = self.seq
+            rows = self.snapshot_rows(states) if states else {}
+        self.last_checkpoint = time.monotonic()
+        if not states:
+            return
+
+        try:
+            self.wal_file.flush()
+            os.fsync(self.wal_file.fileno())
+            self._write_checkpoint(seq, np.asarray(states, dtype=np.int64), rows)
+        except Exception:
+            # keep the rows dirty, the log still covers them until a checkpoint succeeds
+            with self.lock:
+                self.dirty.update(states)
+            raise
+        self._open_wal(seq + 1)
+        self._remove_files(WAL_PATTERN, up_to_seq=seq)
+
+        if len(glob.glob(self._path(CHECKPOINT_PATTERN))) > self.max_checkpoints:
+            self._compact()
+
+    def _write_checkpoint(self, seq: int, states: np.ndarray, rows: Dict[str, np.ndarray]):
+        path = self._path(f"ckpt_{seq:012d}.npz")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, states=states, **rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    # folds all incremental checkpoints into one, later rows win
+    def _compact(self):
+        paths = sorted(glob.glob(self._path(CHECKPOINT_PATTERN)), key=_file_seq)
+        merged = {}
+        for path in paths:
+            with np.load(path) as checkpoint:
+                for index, state in enumerate(checkpoint["states"]):
+                    merged[int(state)] = {key: checkpoint[key][index] for key in checkpoint.files if key != "states"}
+
+        states = sorted(merged)
+        keys = merged[states[0]].keys()
+        rows = {key: np.stack([merged[state][key] for state in states]) for key in keys}
+        last_seq = _file_seq(paths[-1])
+        self._write_checkpoint(last_seq, np.asarray(states, dtype=np.int64), rows)
+        for path in paths[:-1]:
+            os.remove(path)
@@ -0,0 +1,110 @@
+# compact decision table of a trained Q table, for controllers that decide on their own
+#
+# a controller only needs the greedy action of every state: one uint8 per state instead of
+# num_actions float64 values. the optional float16 margin is how far the best action is ahead
+# of the runner-up (0 for a tie, clipped for actions the pod limits rule out), so a client can
+# tell confident states from ones worth asking the server about. the table is a model_store
+# file, its header carries the config hash a client has to check before indexing states.
+#   python policy_export.py export api/brain_model.bin api/brain_policy.bin
+#   python policy_export.py verify api/brain_policy.bin api/brain_model.bin
+import argparse
+import hashlib
+from typing import Dict, Optional
+import numpy as np
+from config_loader import APP_CONFIG
+import model_store
+
+POLICY_ARRAY = "policy"
+MARGIN_ARRAY = "margin"
+MARGIN_MAX = float(np.finfo(np.float16).max)
+
+
+class PolicyMismatchError(ValueError):
+    pass
+
+
+# {"policy": [num_states] uint8, "margin": [num_states] float16}, the lowest action wins ties
+# like greedy_policy() of the agent
+def build_policy(q_table, with_margin: bool = True) -> Dict[str, np.ndarray]:
+    q_values = np.asarray(q_table, dtype=np.float64)
+    if q_values.shape[1] > np.iinfo(np.uint8).max + 1:
+        raise ValueError(f"{q_values.shape[1]} actions do not fit a uint8 policy")
+
+    arrays = {POLICY_ARRAY: q_values.argmax(axis=1).astype(np.uint8)}
+    if with_margin:
+        if q_values.shape[1] > 1:
+            top_two = np.partition(q_values, -2, axis=1)[:, -2:]
+            gap = top_two[:, 1] - top_two[:, 0]
+        else:
+            gap = np.full(len(q_values), np.inf)
+        arrays[MARGIN_ARRAY] = np.minimum(gap, MARGIN_MAX).astype(np.float16)
+    return arrays
+
+# weak ETag of the table contents, equal for equal policies whatever model version built them
+def policy_etag(arrays: Dict[str, np.ndarray], config: dict = APP_CONFIG) -> str:
+    digest = hashlib.sha256(model_store.config_hash(config).encode("utf-8"))
+    for name in sorted(arrays):
+        digest.update(name.encode("utf-8"))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return f'W/"{digest.hexdigest()[:32]}"'
+
+# If-None-Match holds one ETag, a comma separated list or "*", compared weakly
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in [tag.removeprefix("W/") for tag in tags]
+
+# states where the table disagrees with the greedy choice of q_table
+# an action tied for the best is accepted, the margin has to match the float16 gap exactly
+def mismatched_states(arrays: Dict[str, np.ndarray], q_table) -> np.ndarray:
+    q_values = np.asarray(q_table, dtype=np.float64)
+    policy = np.asarray(arrays[POLICY_ARRAY])
+    if policy.shape != (len(q_values),):
+        raise PolicyMismatchError(f"policy has shape {policy.shape}, the Q table has {len(q_values)} states")
+    if policy.max(initial=0) >= q_values.shape[1]:
+        raise PolicyMismatchError(f"policy has an action outside of the {q_values.shape[1]} actions")
+
+    chosen = q_values[np.arange(len(q_values)), policy]
+    wrong = chosen != q_values.max(axis=1)
+    if MARGIN_ARRAY in arrays:
+        ordered = np.sort(q_values, axis=1)
+        gap = ordered[:, -1] - ordered[:, -2] if q_values.shape[1] > 1 else np.full(len(q_values), np.inf)
+        wrong |= np.asarray(arrays[MARGIN_ARRAY]) != np.minimum(gap, MARGIN_MAX).astype(np.float16)
+    return np.flatnonzero(wrong)
+
+def verify_policy(arrays: Dict[str, np.ndarray], q_table, source: str = "policy"):
+    wrong = mismatched_states(arrays, q_table)
+    if len(wrong):
+        raise PolicyMismatchError(f"{source} disagrees with the Q table in {len(wrong)} states, e.g. {wrong[:5].tolist()}")
+
+# writes the table of q_table to path, reads it back from disk and verifies it
+def export_policy(path: str, q_table, with_margin: bool = True, run_id: Optional[str] = None) -> dict:
+    header = model_store.save_model(path, build_policy(q_table, with_margin), run_id=run_id)
+    verify_policy(model_store.load_model(path).arrays, q_table, source=path)
+    return header
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export and verify compact policy tables")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="write the policy table of a model file")
+    export_parser.add_argument("model_path")
+    export_parser.add_argument("output_path")
+    export_parser.add_argument("--no-margin", action="store_true", help="leave out the float16 margins")
+
+    verify_parser = commands.add_parser("verify", help="check a policy table against the Q table of a model file")
+    verify_parser.add_argument("policy_path")
+    verify_parser.add_argument("model_path")
+
+    args = parser.parse_args()
+
+    if args.command == "export":
+        model = model_store.load_model(args.model_path)
+        header = export_policy(args.output_path, model.arrays["q_table"], with_margin=not args.no_margin, run_id=f"policy-{model.header['run_id']}")
+        print(f"Exported {args.model_path} -> {args.output_path} (run {header['run_id']})")
+    else:
+        policy = model_store.load_model(args.policy_path)
+        q_table = model_store.load_model_arrays(args.model_path)["q_table"]
+        verify_policy(policy.arrays, q_table, source=args.policy_path)
+        print(f"{args.policy_path} matches the greedy choices of {args.model_path} in all {len(q_table)} states")
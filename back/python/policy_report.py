@@ -0,0 +1,149 @@
+# report of what a trained brain decides, generated on demand instead of dumped after every run
+#
+# states are picked by CPU / RAM usage and pod ranges, and optionally only the ones whose best
+# action changed since an earlier model or policy file. the selection and the decoding of the
+# states are array operations, the rows are formatted and streamed a chunk at a time as CSV or
+# JSON lines, so a query for a handful of states never formats the whole table.
+#   python policy_report.py api/brain_model.bin --cpu 80: --pods 1:3
+#   python policy_report.py api/brain_model.bin --changed-since old_brain_model.bin --format jsonl
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Iterator, NamedTuple, Optional, Tuple
+import numpy as np
+from config_loader import APP_CONFIG
+import model_store
+import policy_export
+from state_codec import StateCodec
+
+FORMAT_CSV = "csv"
+FORMAT_JSONL = "jsonl"
+FORMATS = (FORMAT_CSV, FORMAT_JSONL)
+MEDIA_TYPES = {FORMAT_CSV: "text/csv", FORMAT_JSONL: "application/x-ndjson"}
+CHUNK_ROWS = 1024
+
+
+class ReportQuery(NamedTuple):
+    # (low, high) inclusive, None on either side is unbounded
+    cpu: Optional[Tuple] = None
+    ram: Optional[Tuple] = None
+    pods: Optional[Tuple] = None
+
+
+# "50:80", "50:", ":80" or a single value "3", None or "" for no limit
+def parse_range(text: Optional[str], cast=float) -> Optional[Tuple]:
+    if text is None or not text.strip():
+        return None
+    low, separator, high = text.partition(":")
+    if not separator:
+        return cast(low), cast(low)
+    low = cast(low) if low.strip() else None
+    high = cast(high) if high.strip() else None
+    if low is not None and high is not None and low > high:
+        raise ValueError(f"Empty range: {text}")
+    return low, high
+
+# best action of every state of a model file (argmax of its Q table) or a policy file
+def saved_best_actions(path: str) -> np.ndarray:
+    arrays = model_store.load_model_arrays(path)
+    if policy_export.POLICY_ARRAY in arrays:
+        return np.asarray(arrays[policy_export.POLICY_ARRAY])
+    return policy_export.build_policy(arrays["q_table"], with_margin=False)[policy_export.POLICY_ARRAY]
+
+# states matching the query, previous keeps only the ones where best differs from it
+def select_states(codec: StateCodec, query: ReportQuery, best: Optional[np.ndarray] = None, previous: Optional[np.ndarray] = None) -> np.ndarray:
+    states = np.arange(codec.num_states)
+    cpu_buckets, ram_buckets, replicas = codec.decode(states)
+    keep = np.ones(codec.num_states, dtype=bool)
+
+    # a usage range covers every bucket from the one its low end falls in to the one of its high end
+    for buckets, usage_range in ((cpu_buckets, query.cpu), (ram_buckets, query.ram)):
+        if usage_range is None:
+            continue
+        low, high = usage_range
+        if low is not None:
+            keep &= buckets >= codec.bucket(low)
+        if high is not None:
+            keep &= buckets <= codec.bucket(high)
+    if query.pods is not None:
+        low, high = query.pods
+        if low is not None:
+            keep &= replicas >= low
+        if high is not None:
+            keep &= replicas <= high
+
+    if previous is not None:
+        if len(previous) != codec.num_states:
+            raise ValueError(f"The previous model has {len(previous)} states, the current config has {codec.num_states}")
+        keep &= best != previous
+    return states[keep]
+
+# CSV (with a header line) or JSON lines of the given states, one chunk of rows per string
+def report_lines(q_table, states: np.ndarray, codec: StateCodec, fmt: str = FORMAT_CSV, previous: Optional[np.ndarray] = None) -> Iterator[str]:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    action_names = [name for name, _ in sorted(APP_CONFIG["actions"].items(), key=lambda item: item[1])]
+    columns = ["state", "cpu_bucket", "cpu_low", "cpu_high", "ram_bucket", "ram_low", "ram_high", "pods", "best_action"]
+    if previous is not None:
+        columns.append("previous_action")
+    columns += [f"q_{name}" for name in action_names]
+
+    if fmt == FORMAT_CSV:
+        yield ",".join(columns) + "\r\n"
+
+    for start in range(0, len(states), CHUNK_ROWS):
+        chunk = states[start:start + CHUNK_ROWS]
+        q_values = np.asarray(q_table[chunk], dtype=np.float64)
+        cpu_buckets, ram_buckets, replicas = codec.decode(chunk)
+        cpu_low, cpu_high = codec.bucket_range(cpu_buckets)
+        ram_low, ram_high = codec.bucket_range(ram_buckets)
+        names = np.asarray(action_names, dtype=object)
+
+        values = [chunk, cpu_buckets, cpu_low, cpu_high, ram_buckets, ram_low, ram_high, replicas, names[q_values.argmax(axis=1)]]
+        if previous is not None:
+            values.append(names[previous[chunk]])
+        values += list(q_values.T)
+        rows = zip(*(column.tolist() for column in values))
+
+        if fmt == FORMAT_CSV:
+            out = io.StringIO()
+            csv.writer(out).writerows(rows)
+            yield out.getvalue()
+        else:
+            yield "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query what a trained brain decides per state")
+    parser.add_argument("model_path", nargs="?", default="api/brain_model.bin")
+    parser.add_argument("--cpu", default=None, help="CPU usage range in %%, e.g. 80: or 40:60")
+    parser.add_argument("--ram", default=None, help="RAM usage range in %%")
+    parser.add_argument("--pods", default=None, help="replica range, e.g. 1:3")
+    parser.add_argument("--changed-since", default=None, help="only states whose best action differs from this model or policy file")
+    parser.add_argument("--format", choices=FORMATS, default=FORMAT_CSV)
+    parser.add_argument("--output", default="-", help="file to write, - for stdout")
+    args = parser.parse_args()
+
+    try:
+        query = ReportQuery(parse_range(args.cpu), parse_range(args.ram), parse_range(args.pods, int))
+    except ValueError as e:
+        parser.error(str(e))
+
+    codec = StateCodec.from_config()
+    q_table = model_store.load_model_arrays(args.model_path)["q_table"]
+
+    best = previous = None
+    if args.changed_since:
+        best = policy_export.build_policy(q_table, with_margin=False)[policy_export.POLICY_ARRAY]
+        previous = saved_best_actions(args.changed_since)
+    states = select_states(codec, query, best, previous)
+
+    out = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        for lines in report_lines(q_table, states, codec, args.format, previous):
+            out.write(lines)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(states)} of {codec.num_states} states", file=sys.stderr)
@@ -1,88 +1,111 @@
 from kazoo.client import KazooClient
+import argparse
 import json
 
+CONFIG_DATA = {
+    "system_limits": {
+        "min_pods": 1,
+        "max_pods": 15,
+        "replica_change_up": 1,
+        "replica_change_down": -1,
+        "loop_delay_seconds": 30
+    },
+    
+    "metrics_config": {
+        "max_percentage": 100,
+        "bucket_step": 3,
+        "num_buckets": 34
+        # "bucket_edges": [...]  num_buckets - 1 increasing cut points in % instead of every bucket_step,
+        #                        e.g. finer around 50% and above 80%; the bucket levels in logic_constants
+        #                        then refer to these buckets (python state_codec.py CPU RAM PODS shows them)
+    },
+    
+    "rl_hyperparameters": {
+        "num_episodes": 300000,
+        "epsilon": 1,         # how often to explore
+        "alpha": 0.05,           # how fast the agent learns
+        "gamma": 0.99,          # how much future rewards are valued
+        "epsilon_min": 0.05,     # minimum exploration rate
+        "epsilon_decay": 0.999985,  # rate at which epsilon decays
+        "max_steps": 100,
+        "q_value_init": 0.0,
+        "catastrophic_penalty": -500.0,
+        "convergence_threshold": 0.1
+        # stop on Q-value stability instead of the reward window (see convergence.py), e.g.
+        # "q_delta_threshold": 3.0,   # once the smoothed per-episode max |dQ| is below this
+        # "convergence_patience": 3   # ...for this many checks in a row
+    },
+
+    "rewards": {
+        "good": 10.0,
+        "neutral": 0.0,
+        "bad": -10.0,
+        "safe_reward": 0.0,
+        "mock_ideal": 5.0,
+        "mock_cpu_high_load": -8.0,
+        "mock_ram_high_load": -12.0,
+        "mock_waste": -2.0,
+        "mock_restart_penalty": -1.0,
+        "mock_thrashing_penalty": -500.0
+    },
+
+    "actions": {
+        "scale_up": 0,
+        "scale_down": 1,
+        "no_action": 2,
+        "restart": 3
+    },
+    
+    "logic_constants": {
+        "action_count_init": 0,
+        "random_range_start": 0,
+        "offset_to_last_index": 1,
+        "update_factor_numerator": 1.0,
+        "min_learning_rate": 0.05,
+        "failure_count_init": 0,
+        "failure_count_increment": 1,
+        "min_tries_default": 10,
+        "step_size": 1,
+        "min_level": 0,        # Bucket 0 (0-2%)
+        "ideal_cpu_level": 16,              # Bucket 16 represents ~48-50%
+        "ideal_ram_level": 16,              # Bucket 16 represents ~48-50%
+        "initial_cpu_percentage": 50,
+        "initial_ram_percentage": 50,
+        "high_load_threshold": 24,
+        "low_load_threshold": 8,
+        "critical_load_offset": 3,
+        "critical_min_pods": 2,
+        "ideal_replicas": 1,
+        "initial_replicas": 1,
+        "initial_step_count": 0,
+        "initial_reward": 0.0,
+        "min_index": 0
+    },
+
+    "agent": {
+        "type": "tabular",      # "tile_coding" for the linear agent over raw CPU%/RAM%/replicas
+        "storage": "numpy",     # "sparse" allocates Q/bandit rows only for states that were written
+        "num_tilings": 8,
+        "cpu_tiles": 10,
+        "ram_tiles": 10,
+        "replica_tiles": 8
+    }
+}
+
+
+# writes the config as a local snapshot for offline runs (AUTOSCALER_CONFIG_SOURCE=snapshot)
+def write_snapshot(path: str):
+    with open(path, "w") as f:
+        json.dump(CONFIG_DATA, f, indent=4)
+    print(f"Configuration snapshot written to {path}")
+
 def setup_zookeeper_config():
     print("Connecting to ZooKeeper...")
     zk = KazooClient(hosts='127.0.0.1:2181')
     zk.start()
     print("Connected!")
 
-    config_data = {
-        "system_limits": {
-            "min_pods": 1,
-            "max_pods": 15,
-            "replica_change_up": 1,
-            "replica_change_down": -1,
-            "loop_delay_seconds": 30
-        },
-        
-        "metrics_config": {
-            "max_percentage": 100,
-            "bucket_step": 3,
-            "num_buckets": 34
-        },
-        
-        "rl_hyperparameters": {
-            "num_episodes": 300000,
-            "epsilon": 1,         # how often to explore
-            "alpha": 0.05,           # how fast the agent learns
-            "gamma": 0.99,          # how much future rewards are valued
-            "epsilon_min": 0.05,     # minimum exploration rate
-            "epsilon_decay": 0.999985,  # rate at which epsilon decays
-            "max_steps": 100,
-            "q_value_init": 0.0,
-            "catastrophic_penalty": -500.0,
-            "convergence_threshold": 0.1
-        },
-
-        "rewards": {
-            "good": 10.0,
-            "neutral": 0.0,
-            "bad": -10.0,
-            "safe_reward": 0.0,
-            "mock_ideal": 5.0,
-            "mock_cpu_high_load": -8.0,
-            "mock_ram_high_load": -12.0,
-            "mock_waste": -2.0,
-            "mock_restart_penalty": -1.0,
-            "mock_thrashing_penalty": -500.0
-        },
-
-        "actions": {
-            "scale_up": 0,
-            "scale_down": 1,
-            "no_action": 2,
-            "restart": 3
-        },
-        
-        "logic_constants": {
-            "action_count_init": 0,
-            "random_range_start": 0,
-            "offset_to_last_index": 1,
-            "update_factor_numerator": 1.0,
-            "min_learning_rate": 0.05,
-            "failure_count_init": 0,
-            "failure_count_increment": 1,
-            "min_tries_default": 10,
-            "step_size": 1,
-            "min_level": 0,        # Bucket 0 (0-2%)
-            "ideal_cpu_level": 16,              # Bucket 16 represents ~48-50%
-            "ideal_ram_level": 16,              # Bucket 16 represents ~48-50%
-            "initial_cpu_percentage": 50,
-            "initial_ram_percentage": 50,
-            "high_load_threshold": 24,
-            "low_load_threshold": 8,
-            "critical_load_offset": 3,
-            "critical_min_pods": 2,
-            "ideal_replicas": 1,
-            "initial_replicas": 1,
-            "initial_step_count": 0,
-            "initial_reward": 0.0,
-            "min_index": 0
-        }
-    }
-
-    json_data = json.dumps(config_data, indent=4).encode('utf-8')
+    json_data = json.dumps(CONFIG_DATA, indent=4).encode('utf-8')
     path = "/autoscaler/config"
 
     if zk.exists(path):
@@ -95,4 +118,11 @@ def setup_zookeeper_config():
     zk.stop()
 
 if __name__ == "__main__":
-    setup_zookeeper_config()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Publish the autoscaler config to ZooKeeper")
+    parser.add_argument("--snapshot", help="write the config to this file instead of ZooKeeper")
+    args = parser.parse_args()
+
+    if args.snapshot:
+        write_snapshot(args.snapshot)
+    else:
+        setup_zookeeper_config()
\ No newline at end of file
@@ -0,0 +1,41 @@
+# solves the mock environment exactly instead of sampling episodes
+# writes the same model file as train.py
+from agents.q_learning.solver import build_transition_model, value_iteration
+from agents.q_learning.q_learning import QLearningAgent
+from agents.bandit.bandit_safety import SafetyBandit
+from config_loader import APP_CONFIG
+from train import POLICY_PATH, get_state_space, save_model, save_policy
+import argparse
+import time
+
+def solve(tolerance: float = 1e-6, max_iterations: int = 100000, output: str = "api/brain_model.bin", policy_output: str = POLICY_PATH):
+    num_states, num_actions, _ = get_state_space()
+
+    start = time.time()
+    model = build_transition_model()
+    print(f"Transition model built: {model.next_states.shape} in {time.time() - start:.2f}s")
+
+    start = time.time()
+    result = value_iteration(model, gamma=APP_CONFIG["rl_hyperparameters"]["gamma"], tolerance=tolerance, max_iterations=max_iterations)
+    print(f"Value iteration: {result.iterations} iterations, final delta {result.delta:.2e}, {time.time() - start:.2f}s")
+
+    if result.delta > tolerance:
+        print(f"Warning: stopped after {max_iterations} iterations before reaching tolerance {tolerance}")
+
+    agent = QLearningAgent(num_states=num_states, num_actions=num_actions, storage="numpy")
+    agent.load_q_table(result.q_table)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+
+    header = save_model(agent, safety_bandit, output)
+    save_policy(agent, header["run_id"], policy_output)
+    return agent, safety_bandit
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve the mock environment with value iteration")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="stop when no Q value changes more than this")
+    parser.add_argument("--max-iterations", type=int, default=100000)
+    parser.add_argument("--output", default="api/brain_model.bin")
+    parser.add_argument("--policy-output", default=POLICY_PATH, help="compact policy table, see policy_export.py")
+    args = parser.parse_args()
+
+    solve(tolerance=args.tolerance, max_iterations=args.max_iterations, output=args.output, policy_output=args.policy_output)
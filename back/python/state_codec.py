@@ -0,0 +1,91 @@
+# maps (cpu %, ram %, replicas) to the bucketed state index of the Q table and back
+#
+# state = (cpu_bucket * num_buckets + ram_bucket) * valid_pod_states + (replicas - min_pods)
+# buckets are cut at metrics_config.bucket_edges when given (num_buckets - 1 increasing
+# interior edges in %, e.g. 1% wide around the 50% target and 80-100%, coarse elsewhere),
+# otherwise every bucket_step %. every method takes plain numbers or numpy arrays.
+#   python state_codec.py 48.5 91 3
+from bisect import bisect_right
+from typing import Optional, Sequence, Tuple
+import argparse
+import numpy as np
+from config_loader import AppConfig, get_config
+
+
+class StateCodec:
+    def __init__(self, edges: Sequence[float], min_pods: int, max_pods: int, max_percentage: float = 100):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        if self.edges.ndim != 1 or np.any(np.diff(self.edges) <= 0):
+            raise ValueError(f"Bucket edges must be strictly increasing, got {list(edges)}")
+        if len(self.edges) and (self.edges[0] <= 0 or self.edges[-1] >= max_percentage):
+            raise ValueError(f"Bucket edges must lie strictly between 0 and {max_percentage}")
+        # bisect on a list is the fast path for the single values the server encodes
+        self._edge_list = self.edges.tolist()
+
+        self.num_buckets = len(self.edges) + 1
+        self.min_pods = min_pods
+        self.max_pods = max_pods
+        self.max_percentage = max_percentage
+        self.valid_pod_states = max_pods - min_pods + 1
+        self.num_states = self.num_buckets * self.num_buckets * self.valid_pod_states
+
+    # uniform bucket_step buckets, or bucket_edges when the config has them
+    @classmethod
+    def from_config(cls, config: Optional[AppConfig] = None) -> "StateCodec":
+        config = config or get_config()
+        metrics_config = config.metrics_config
+        if metrics_config.bucket_edges is None:
+            edges = np.arange(1, metrics_config.num_buckets) * metrics_config.bucket_step
+        else:
+            edges = metrics_config.bucket_edges
+        if len(edges) != metrics_config.num_buckets - 1:
+            raise ValueError(f"{metrics_config.num_buckets} buckets need {metrics_config.num_buckets - 1} bucket edges, got {len(edges)}")
+        return cls(edges, config.system_limits.min_pods, config.system_limits.max_pods, metrics_config.max_percentage)
+
+    # values below 0 land in the first bucket, above max_percentage in the last
+    def bucket(self, usage):
+        if np.ndim(usage) == 0:
+            return bisect_right(self._edge_list, usage)
+        return np.searchsorted(self.edges, np.asarray(usage, dtype=np.float64), side="right")
+
+    # [low, high) percentage range of a bucket (or array of buckets)
+    def bucket_range(self, bucket) -> Tuple:
+        bounds = np.concatenate(([0.0], self.edges, [float(self.max_percentage)]))
+        bucket = np.asarray(bucket)
+        low, high = bounds[bucket], bounds[bucket + 1]
+        if bucket.ndim == 0:
+            return float(low), float(high)
+        return low, high
+
+    def encode(self, cpu_bucket, ram_bucket, replicas):
+        pod_index = replicas - self.min_pods
+        return (cpu_bucket * self.num_buckets + ram_bucket) * self.valid_pod_states + pod_index
+
+    # raw metrics straight to the state index
+    def encode_usage(self, cpu_percentage, ram_percentage, replicas):
+        return self.encode(self.bucket(cpu_percentage), self.bucket(ram_percentage), replicas)
+
+    # returns (cpu_bucket, ram_bucket, replicas)
+    def decode(self, state):
+        buckets, pod_index = divmod(state, self.valid_pod_states)
+        cpu_bucket, ram_bucket = divmod(buckets, self.num_buckets)
+        return cpu_bucket, ram_bucket, pod_index + self.min_pods
+
+    def __repr__(self) -> str:
+        return f"StateCodec(num_buckets={self.num_buckets}, pods={self.min_pods}..{self.max_pods}, states={self.num_states})"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the state index and buckets of a cluster reading")
+    parser.add_argument("cpu_percentage", type=float)
+    parser.add_argument("ram_percentage", type=float)
+    parser.add_argument("replicas", type=int)
+    args = parser.parse_args()
+
+    codec = StateCodec.from_config()
+    state = codec.encode_usage(args.cpu_percentage, args.ram_percentage, args.replicas)
+    cpu_bucket, ram_bucket, replicas = codec.decode(state)
+    print(f"State {state} of {codec.num_states}")
+    print(f"  CPU bucket {cpu_bucket} {codec.bucket_range(cpu_bucket)}")
+    print(f"  RAM bucket {ram_bucket} {codec.bucket_range(ram_bucket)}")
+    print(f"  Pods {replicas}")
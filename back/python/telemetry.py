@@ -0,0 +1,202 @@
+# per-episode training telemetry, streamed to disk in fixed-size binary chunks
+#
+# layout: 8 byte magic | uint32 format version | uint32 header length | JSON header
+# followed by back-to-back RECORD_DTYPE records. the writer only ever appends whole
+# chunks, so a reader can open the file while training is still running and simply
+# ignores a trailing partial record.
+#   python telemetry.py summary api/training_telemetry.bin
+#   python telemetry.py plot api/training_telemetry.bin --output api/learning_curve.png
+import argparse
+import json
+import os
+import struct
+import time
+from typing import NamedTuple, Optional
+import numpy as np
+from config_loader import APP_CONFIG
+import model_store
+
+MAGIC = b"APSETEL\0"
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct("<8sII")
+
+RECORD_DTYPE = np.dtype([
+    ("episode", "<u8"),
+    ("reward", "<f8"),
+    ("length", "<u4"),
+    ("failures", "<u4"),
+    ("epsilon", "<f4"),
+    ("q_max_delta", "<f4"),
+    ("q_mean_delta", "<f4"),
+])
+
+
+class TelemetryLog(NamedTuple):
+    header: dict
+    records: np.ndarray
+
+
+class TelemetryWriter:
+    # chunk_size records are kept in memory, then appended to the file in one write
+    def __init__(self, path: str, chunk_size: int = 4096, run_id: Optional[str] = None, config: dict = APP_CONFIG):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.buffer = np.zeros(chunk_size, dtype=RECORD_DTYPE)
+        self.position = 0
+        self.records_written = 0
+
+        header = {
+            "format_version": FORMAT_VERSION,
+            "dtype": RECORD_DTYPE.descr,
+            "run_id": run_id or model_store.new_run_id(),
+            "config_hash": model_store.config_hash(config),
+            "rl_hyperparameters": config["rl_hyperparameters"],
+            "created_at": time.time(),
+        }
+        encoded_header = json.dumps(header).encode("utf-8")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(encoded_header)))
+        self.file.write(encoded_header)
+        self.file.flush()
+
+    def record(self, episode: int, reward: float, length: int, failures: int, epsilon: float, q_max_delta: float, q_mean_delta: float):
+        self.buffer[self.position] = (episode, reward, length, failures, epsilon, q_max_delta, q_mean_delta)
+        self.position += 1
+        if self.position == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.position:
+            self.file.write(self.buffer[:self.position].tobytes())
+            self.file.flush()
+            self.records_written += self.position
+            self.position = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def read_header(path: str) -> dict:
+    with open(path, "rb") as f:
+        magic, version, header_size = PREAMBLE.unpack(f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a telemetry file")
+        if version != FORMAT_VERSION:
+            raise ValueError(f"{path} has telemetry format version {version}, expected {FORMAT_VERSION}")
+        header = json.loads(f.read(header_size).decode("utf-8"))
+    header["data_offset"] = PREAMBLE.size + header_size
+    return header
+
+# maps the complete records written so far (safe while the writer is still appending)
+def load_log(path: str) -> TelemetryLog:
+    header = read_header(path)
+    dtype = np.dtype([tuple(field) for field in header["dtype"]])
+    count = (os.path.getsize(path) - header["data_offset"]) // dtype.itemsize
+    if count == 0:
+        return TelemetryLog(header, np.zeros(0, dtype=dtype))
+    return TelemetryLog(header, np.memmap(path, dtype=dtype, mode="r", offset=header["data_offset"], shape=(count,)))
+
+def _moving_average(values: np.ndarray, window: int) -> np.ndarray:
+    cumulative = np.cumsum(np.asarray(values, dtype=np.float64))
+    cumulative[window:] = cumulative[window:] - cumulative[:-window]
+    return cumulative[window - 1:] / window
+
+def summarize(path: str, window: int = 1000) -> dict:
+    header, records = load_log(path)
+    summary = {"run_id": header["run_id"], "episodes": len(records)}
+    if len(records) == 0:
+        return summary
+
+    rewards = records["reward"]
+    window = min(window, len(records))
+    moving_avg = _moving_average(rewards, window)
+    best = int(np.argmax(moving_avg))
+    summary.update({
+        "last_episode": int(records["episode"][-1]),
+        "reward_mean": float(rewards.mean()),
+        "reward_std": float(rewards.std()),
+        f"last_{window}_reward_mean": float(moving_avg[-1]),
+        f"best_{window}_reward_mean": float(moving_avg[best]),
+        f"best_{window}_ends_at_episode": int(records["episode"][best + window - 1]),
+        "mean_length": float(records["length"].mean()),
+        "failure_episodes": int(np.count_nonzero(records["failures"])),
+        "failure_rate": float(np.count_nonzero(records["failures"]) / len(records)),
+        "last_epsilon": float(records["epsilon"][-1]),
+        f"last_{window}_q_max_delta": float(records["q_max_delta"][-window:].mean()),
+    })
+    return summary
+
+# reward (raw and moving average) on top, Q-value change and epsilon below
+def plot(path: str, output: str, window: int = 50, max_points: int = 20000):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    header, records = load_log(path)
+    if len(records) == 0:
+        raise ValueError(f"{path} has no complete records yet")
+    hyperparameters = header["rl_hyperparameters"]
+
+    # long runs are drawn from every stride-th point, the moving average still sees every episode
+    stride = max(1, len(records) // max_points)
+    episodes = np.asarray(records["episode"][::stride])
+
+    figure, (reward_axis, delta_axis) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+    reward_axis.plot(episodes, records["reward"][::stride], alpha=0.3, label='Raw Reward')
+    if len(records) >= window:
+        moving_avg = _moving_average(records["reward"], window)
+        reward_axis.plot(records["episode"][window - 1::stride], moving_avg[::stride], color='red', label='Moving Avg')
+    reward_axis.set_title(
+        f'Learning Curve\nAlpha: {hyperparameters["alpha"]} | Gamma: {hyperparameters["gamma"]} | '
+        f'Epsilon Decay: {hyperparameters["epsilon_decay"]}\nStop Diff: {hyperparameters["convergence_threshold"]:.3f}'
+    )
+    reward_axis.set_ylabel('Reward')
+    reward_axis.legend()
+
+    # single episodes swing between ~0 and the full penalty, only the average is readable
+    if len(records) >= window:
+        delta_axis.plot(records["episode"][window - 1::stride], _moving_average(records["q_max_delta"], window)[::stride], label='Max |dQ| Moving Avg')
+    delta_axis.set_xlabel('Episodes')
+    delta_axis.set_ylabel('Max |dQ|')
+    epsilon_axis = delta_axis.twinx()
+    epsilon_axis.plot(episodes, records["epsilon"][::stride], color='green', label='Epsilon')
+    epsilon_axis.set_ylabel('Epsilon')
+
+    figure.tight_layout()
+    figure.savefig(output)
+    plt.close(figure)
+    print(f"Plot of {len(records)} episodes saved to {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarize or plot a training telemetry log")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    summary_parser = commands.add_parser("summary", help="print statistics of the episodes logged so far")
+    summary_parser.add_argument("path")
+    summary_parser.add_argument("--window", type=int, default=1000)
+
+    plot_parser = commands.add_parser("plot", help="render the learning curve")
+    plot_parser.add_argument("path")
+    plot_parser.add_argument("--output", default="api/learning_curve.png")
+    plot_parser.add_argument("--window", type=int, default=50)
+    plot_parser.add_argument("--max-points", type=int, default=20000)
+
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        print(json.dumps(summarize(args.path, args.window), indent=4))
+    else:
+        plot(args.path, args.output, args.window, args.max_points)
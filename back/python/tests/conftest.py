@@ -0,0 +1,16 @@
+# the modules load their config at import time, so the tests point them at a snapshot of
+# the defaults in setup_config.py before anything imports config_loader (ZK is never touched)
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+SNAPSHOT_PATH = os.path.join(tempfile.mkdtemp(prefix="autoscaler-tests-"), "config_snapshot.json")
+os.environ["AUTOSCALER_CONFIG_SOURCE"] = "snapshot"
+os.environ["AUTOSCALER_CONFIG_SNAPSHOT"] = SNAPSHOT_PATH
+
+import setup_config
+
+setup_config.write_snapshot(SNAPSHOT_PATH)
@@ -0,0 +1,151 @@
+import copy
+import json
+import threading
+import time
+import pytest
+import config_loader
+import setup_config
+from config_loader import CONFIG_PATH, ConfigStore, ConfigUnavailableError, InMemoryZooKeeper
+from agents.q_learning.mock_env import MockKubernetesEnv
+from agents.q_learning.vector_env import VectorizedMockKubernetesEnv
+
+
+def encode(data: dict) -> bytes:
+    return json.dumps(data).encode("utf-8")
+
+
+def store_for(zookeeper: InMemoryZooKeeper, snapshot_path) -> ConfigStore:
+    return ConfigStore(snapshot_path=str(snapshot_path), client_factory=lambda hosts: zookeeper)
+
+
+@pytest.fixture(autouse=True)
+def restore_config():
+    # publish() also updates the module-wide APP_CONFIG, every test leaves it as it was
+    original = config_loader.config_store
+    yield
+    config_loader.use_store(original, source="snapshot")
+
+
+@pytest.fixture
+def defaults():
+    return copy.deepcopy(setup_config.CONFIG_DATA)
+
+
+def test_initial_load_reads_typed_values_and_writes_the_snapshot(tmp_path, defaults):
+    defaults["rl_hyperparameters"]["alpha"] = 0.2
+    snapshot_path = tmp_path / "snapshot.json"
+    store = store_for(InMemoryZooKeeper({CONFIG_PATH: encode(defaults)}), snapshot_path)
+
+    config = store.load()
+
+    assert config.rl_hyperparameters.alpha == 0.2
+    assert config.system_limits.max_pods == defaults["system_limits"]["max_pods"]
+    assert config.num_states == config.metrics_config.num_buckets ** 2 * config.valid_pod_states
+    assert json.loads(snapshot_path.read_text()) == defaults
+
+
+def test_watched_update_changes_typed_values_and_notifies_once(tmp_path, defaults):
+    zookeeper = InMemoryZooKeeper({CONFIG_PATH: encode(defaults)})
+    store = store_for(zookeeper, tmp_path / "snapshot.json")
+    store.load()
+    seen = []
+
+    def on_change(config):
+        seen.append(config)
+
+    store.subscribe(on_change)
+    store.watch()
+    # the watch fires once with the current data, which changes nothing
+    assert seen == []
+
+    defaults["rl_hyperparameters"]["gamma"] = 0.5
+    defaults["system_limits"]["max_pods"] = 10
+    zookeeper.set(CONFIG_PATH, encode(defaults))
+
+    assert len(seen) == 1
+    assert seen[0] is store.config
+    assert store.config.rl_hyperparameters.gamma == 0.5
+    assert store.config.valid_pod_states == 10 - defaults["system_limits"]["min_pods"] + 1
+    assert config_loader.APP_CONFIG["system_limits"]["max_pods"] == 10
+
+    # the same data again and an invalid update are both ignored
+    zookeeper.set(CONFIG_PATH, encode(defaults))
+    zookeeper.set(CONFIG_PATH, b"{not json")
+    assert len(seen) == 1
+    assert store.config.rl_hyperparameters.gamma == 0.5
+
+
+def test_missing_node_falls_back_to_the_default_snapshot(tmp_path):
+    snapshot_path = tmp_path / "snapshot.json"
+    setup_config.write_snapshot(str(snapshot_path))
+    store = store_for(InMemoryZooKeeper(), snapshot_path)
+
+    config = store.load()
+
+    assert config.raw == setup_config.CONFIG_DATA
+    assert config.rl_hyperparameters.alpha == setup_config.CONFIG_DATA["rl_hyperparameters"]["alpha"]
+
+
+def test_missing_node_without_a_snapshot_raises(tmp_path):
+    store = store_for(InMemoryZooKeeper(), tmp_path / "missing.json")
+    with pytest.raises(ConfigUnavailableError, match="does not exist"):
+        store.load()
+
+
+def test_both_mock_envs_follow_a_zookeeper_update(tmp_path, defaults):
+    zookeeper = InMemoryZooKeeper({CONFIG_PATH: encode(defaults)})
+    config_loader.use_store(store_for(zookeeper, tmp_path / "snapshot.json"))
+    config_loader.config_store.watch()
+    env = MockKubernetesEnv()
+    vector_env = VectorizedMockKubernetesEnv(num_envs=4, seed=0)
+
+    defaults["rl_hyperparameters"]["max_steps"] = 7
+    defaults["logic_constants"]["step_size"] = 2
+    zookeeper.set(CONFIG_PATH, encode(defaults))
+
+    for current in (env, vector_env):
+        assert current.max_steps == 7
+        assert current.step_size == 2
+
+
+# an InMemoryZooKeeper that is unreachable until connect() is called
+class LateZooKeeper(InMemoryZooKeeper):
+    def __init__(self, nodes=None):
+        super().__init__(nodes)
+        self.live = threading.Event()
+        self.clients_made = 0
+
+    def start_async(self) -> threading.Event:
+        return self.live
+
+    def connect(self):
+        self.live.set()
+
+
+def test_unreachable_zookeeper_starts_from_the_snapshot_and_watches_once_it_connects(tmp_path, defaults):
+    snapshot_path = tmp_path / "snapshot.json"
+    setup_config.write_snapshot(str(snapshot_path))
+    zookeeper = LateZooKeeper({CONFIG_PATH: encode(defaults)})
+
+    def factory(hosts):
+        zookeeper.clients_made += 1
+        return zookeeper
+
+    store = ConfigStore(snapshot_path=str(snapshot_path), client_factory=factory, connect_timeout=0.05, watch_retry_seconds=0.01)
+    assert store.load().raw == setup_config.CONFIG_DATA
+
+    started = time.monotonic()
+    store.watch()
+    assert time.monotonic() - started < 0.05
+    assert zookeeper.watchers == {}
+
+    defaults["rl_hyperparameters"]["gamma"] = 0.5
+    zookeeper.set(CONFIG_PATH, encode(defaults))
+    zookeeper.connect()
+    deadline = time.monotonic() + 5
+    while store.config.rl_hyperparameters.gamma != 0.5 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    # the watch delivers the current node as soon as it is registered, on the client load() made
+    assert store.config.rl_hyperparameters.gamma == 0.5
+    assert zookeeper.clients_made == 1
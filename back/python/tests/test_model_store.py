@@ -0,0 +1,46 @@
+import copy
+import numpy as np
+import pytest
+import model_store
+from config_loader import APP_CONFIG
+
+
+def arrays():
+    rng = np.random.default_rng(0)
+    return {
+        "q_table": rng.random((30, 4)),
+        "bandit_counts": rng.integers(0, 100, (30, 4)),
+    }
+
+
+def test_a_saved_model_maps_back_to_the_same_arrays(tmp_path):
+    path = str(tmp_path / "model.bin")
+    saved = arrays()
+    model_store.save_model(path, saved, run_id="run-1")
+
+    loaded = model_store.load_model(path)
+    assert loaded.header["run_id"] == "run-1"
+    for name, array in saved.items():
+        assert loaded.arrays[name].dtype == array.dtype
+        assert np.array_equal(loaded.arrays[name], array)
+    # read only unless asked for copy-on-write
+    with pytest.raises(ValueError):
+        loaded.arrays["q_table"][0, 0] = 1.0
+    model_store.load_model(path, mode="c").arrays["q_table"][0, 0] = 1.0
+    assert np.array_equal(model_store.load_model(path).arrays["q_table"], saved["q_table"])
+
+def test_a_model_from_another_state_layout_is_refused(tmp_path):
+    path = str(tmp_path / "model.bin")
+    other = copy.deepcopy(APP_CONFIG)
+    other["system_limits"]["max_pods"] += 1
+    model_store.save_model(path, arrays(), config=other)
+
+    with pytest.raises(model_store.ModelConfigMismatchError):
+        model_store.load_model(path)
+    assert model_store.load_model(path, verify_config=False).header["max_pods"] == other["system_limits"]["max_pods"]
+
+def test_files_in_another_format_are_refused(tmp_path):
+    path = tmp_path / "model.bin"
+    path.write_bytes(b"not a model file at all")
+    with pytest.raises(ValueError):
+        model_store.load_model(str(path))
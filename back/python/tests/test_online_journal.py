@@ -0,0 +1,122 @@
+import glob
+import json
+import os
+import threading
+import time
+import numpy as np
+from agents.q_learning.q_learning import QLearningAgent, STORAGE_NUMPY
+from online_journal import OnlineJournal
+
+NUM_STATES = 50
+NUM_ACTIONS = 4
+RUN_ID = "run-1"
+
+
+# the server's side of the journal (snapshot_rows, apply_checkpoint_rows, replay_journal_entry)
+# around one agent
+class Learner:
+    def __init__(self, directory):
+        self.agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=STORAGE_NUMPY)
+        self.lock = threading.RLock()
+        self.journal = OnlineJournal(str(directory), self.lock, self.snapshot_rows, checkpoint_interval=3600)
+
+    def snapshot_rows(self, states):
+        return {"q_table": self.agent.q_table[states]}
+
+    def apply_rows(self, states, arrays):
+        self.agent.q_table[states] = arrays["q_table"]
+        self.agent.invalidate_policy(states)
+
+    def apply_entry(self, entry):
+        if entry["kind"] == "train":
+            self.agent.updateAction(entry["state"], entry["action"], entry["reward"], entry["next_state"], entry["done"])
+        else:
+            self.agent.update_batch(entry["states"], entry["actions"], entry["rewards"], entry["next_states"], entry["dones"])
+
+    def train(self, rng) -> int:
+        entry = {
+            "kind": "train",
+            "state": int(rng.integers(NUM_STATES)),
+            "action": int(rng.integers(NUM_ACTIONS)),
+            "reward": float(rng.normal()),
+            "next_state": int(rng.integers(NUM_STATES)),
+            "done": bool(rng.random() < 0.1),
+        }
+        with self.lock:
+            self.apply_entry(entry)
+            return self.journal.record(entry, [entry["state"]])
+
+    def replay(self, rng) -> int:
+        states = rng.integers(0, NUM_STATES, 8).tolist()
+        entry = {
+            "kind": "replay",
+            "actions": rng.integers(0, NUM_ACTIONS, 8).tolist(),
+            "rewards": rng.normal(size=8).tolist(),
+            "next_states": rng.integers(0, NUM_STATES, 8).tolist(),
+            "dones": [False] * 8,
+            "states": states,
+        }
+        with self.lock:
+            self.apply_entry(entry)
+            return self.journal.record(entry, states)
+
+
+def wait_for_log(directory, seq: int):
+    # the writer thread appends in the background, wait until entry seq is on disk
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        for path in glob.glob(os.path.join(str(directory), "wal_*.jsonl")):
+            with open(path) as f:
+                if any(json.loads(line)["seq"] == seq for line in f if line.endswith("\n")):
+                    return
+        time.sleep(0.01)
+    raise AssertionError(f"log entry {seq} was never written")
+
+def recovered(directory, run_id=RUN_ID):
+    restarted = Learner(directory)
+    with restarted.lock:
+        replayed = restarted.journal.recover(run_id, restarted.apply_rows, restarted.apply_entry)
+    return restarted, replayed
+
+
+def test_recovery_after_a_crash_rebuilds_the_exact_table(tmp_path):
+    rng = np.random.default_rng(0)
+    learner = Learner(tmp_path)
+    learner.journal.recover(RUN_ID, learner.apply_rows, learner.apply_entry)
+    learner.journal.start()
+
+    for _ in range(40):
+        learner.train(rng)
+    wait_for_log(tmp_path, learner.replay(rng))
+    learner.journal.checkpoint()
+    assert len(glob.glob(str(tmp_path / "ckpt_*.npz"))) == 1
+
+    for _ in range(25):
+        learner.train(rng)
+    last_seq = learner.replay(rng)
+    wait_for_log(tmp_path, last_seq)
+    expected = np.array(learner.agent.q_table)
+
+    # the crash tears the line of one more update, which was applied but never fully logged
+    learner.apply_entry({"kind": "train", "state": 0, "action": 0, "reward": 5.0, "next_state": 1, "done": False})
+    wal_path = sorted(glob.glob(str(tmp_path / "wal_*.jsonl")))[-1]
+    with open(wal_path, "a") as f:
+        f.write('{"kind": "train", "seq": %d, "sta' % (last_seq + 1))
+
+    # reopened without closing the crashed journal
+    restarted, replayed = recovered(tmp_path)
+    assert replayed == 26
+    assert np.array_equal(restarted.agent.q_table, expected)
+    assert restarted.journal.seq == last_seq
+
+def test_recovery_for_another_model_run_starts_empty(tmp_path):
+    rng = np.random.default_rng(1)
+    learner = Learner(tmp_path)
+    learner.journal.recover(RUN_ID, learner.apply_rows, learner.apply_entry)
+    learner.journal.start()
+    wait_for_log(tmp_path, learner.train(rng))
+
+    restarted, replayed = recovered(tmp_path, run_id="run-2")
+    assert replayed == 0
+    assert np.array_equal(restarted.agent.q_table, Learner(tmp_path).agent.q_table)
+    assert glob.glob(str(tmp_path / "wal_*.jsonl")) and not glob.glob(str(tmp_path / "ckpt_*.npz"))
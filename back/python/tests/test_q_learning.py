@@ -0,0 +1,60 @@
+import random
+import numpy as np
+import pytest
+from agents.q_learning.q_learning import QLearningAgent, STORAGE_LIST, STORAGE_NUMPY, STORAGE_SPARSE
+
+NUM_STATES = 60
+NUM_ACTIONS = 4
+STORAGES = [STORAGE_LIST, STORAGE_NUMPY, STORAGE_SPARSE]
+
+
+def agents(**kwargs):
+    return {storage: QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=storage, epsilon=0.0, **kwargs) for storage in STORAGES}
+
+def tables(by_storage):
+    return {storage: np.asarray(agent.q_table, dtype=np.float64) for storage, agent in by_storage.items()}
+
+
+def test_single_updates_agree_across_storages_and_return_plain_floats():
+    rng = np.random.default_rng(0)
+    by_storage = agents()
+    for _ in range(500):
+        state, next_state = rng.integers(NUM_STATES, size=2).tolist()
+        action = int(rng.integers(NUM_ACTIONS))
+        reward, done = float(rng.normal()), bool(rng.random() < 0.1)
+        changes = {storage: agent.updateAction(state, action, reward, next_state, done) for storage, agent in by_storage.items()}
+        assert all(type(change) is float for change in changes.values())
+        assert len(set(changes.values())) == 1
+
+    values = tables(by_storage)
+    assert np.array_equal(values[STORAGE_LIST], values[STORAGE_NUMPY])
+    assert np.array_equal(values[STORAGE_LIST], values[STORAGE_SPARSE])
+
+def test_batch_updates_use_the_table_before_the_batch_for_every_storage():
+    rng = np.random.default_rng(1)
+    by_storage = agents()
+    # few states so the batch repeats (state, action) pairs and reads states it also writes
+    states = rng.integers(0, 5, 64)
+    actions = rng.integers(0, NUM_ACTIONS, 64)
+    rewards = rng.normal(size=64)
+    next_states = rng.integers(0, 5, 64)
+    dones = rng.random(64) < 0.2
+
+    td_errors = {storage: agent.update_batch(states, actions, rewards, next_states, dones) for storage, agent in by_storage.items()}
+    values = tables(by_storage)
+    for storage in (STORAGE_NUMPY, STORAGE_SPARSE):
+        assert np.allclose(td_errors[storage], td_errors[STORAGE_LIST])
+        assert np.allclose(values[storage], values[STORAGE_LIST])
+
+@pytest.mark.parametrize("cache_policy", [True, False])
+def test_greedy_choice_matches_the_argmax_for_every_storage(cache_policy):
+    random.seed(0)
+    table = np.random.default_rng(2).random((NUM_STATES, NUM_ACTIONS))
+    for agent in agents(cache_policy=cache_policy).values():
+        agent.load_q_table(table)
+        for state in range(NUM_STATES):
+            assert agent.select_action(state, [0, 1, 2, 3]) == table[state].argmax()
+            assert agent.select_action(state, [1, 3]) == [1, 3][int(table[state, [1, 3]].argmax())]
+        # the cache has to follow single updates
+        agent.updateAction(0, 2, 100.0, 0, True)
+        assert agent.select_action(0, [0, 1, 2, 3]) == 2
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from agents.q_learning.replay_buffer import ReplayBuffer
+
+
+def fill(buffer, start, count):
+    states = np.arange(start, start + count)
+    buffer.add_batch(states, states % 4, states * 1.0, states + 1, np.zeros(count, dtype=bool))
+
+
+def test_a_full_buffer_overwrites_the_oldest_transitions():
+    buffer = ReplayBuffer(8, seed=0)
+    fill(buffer, 0, 5)
+    fill(buffer, 5, 6)
+    assert len(buffer) == 8
+    assert sorted(buffer.states.tolist()) == list(range(3, 11))
+
+    batch = buffer.sample(64)
+    assert np.array_equal(batch.next_states, batch.states + 1)
+    assert np.array_equal(batch.rewards, batch.states * 1.0)
+    assert np.all(batch.weights == 1.0)
+
+def test_sampling_an_empty_buffer_fails():
+    with pytest.raises(ValueError):
+        ReplayBuffer(8).sample(4)
+
+def test_new_transitions_start_at_the_highest_priority_so_far():
+    buffer = ReplayBuffer(8, prioritized=True, seed=0)
+    fill(buffer, 0, 4)
+    buffer.update_priorities(np.array([0, 1]), np.array([5.0, -0.5]))
+    # lowering a priority later does not lower the priority of new transitions
+    buffer.update_priorities(np.array([0]), np.array([0.0]))
+    fill(buffer, 4, 2)
+    assert buffer.max_priority == pytest.approx(5.0 + buffer.priority_epsilon)
+    assert np.allclose(buffer.priorities[4:6], buffer.max_priority)
+
+def test_prioritized_sampling_prefers_large_errors():
+    buffer = ReplayBuffer(8, prioritized=True, seed=0)
+    fill(buffer, 0, 8)
+    buffer.update_priorities(np.arange(8), np.array([10.0] + [0.0] * 7))
+    batch = buffer.sample(1000)
+    assert np.mean(batch.indices == 0) > 0.5
+    # the most sampled transition gets the smallest correction
+    assert batch.weights[batch.indices == 0].max() < batch.weights[batch.indices != 0].min()
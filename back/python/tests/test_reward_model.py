@@ -0,0 +1,83 @@
+import itertools
+import numpy as np
+import pytest
+from config_loader import get_config
+from agents.q_learning import mock_env
+from agents.q_learning.reward_model import NO_LAST_ACTION, RewardModel
+
+
+@pytest.fixture(scope="module")
+def reward_model():
+    return RewardModel()
+
+
+def test_table_matches_calculate_reward_on_the_full_grid(reward_model):
+    config = get_config()
+    num_buckets = config.metrics_config.num_buckets
+    min_pods, max_pods = config.system_limits.min_pods, config.system_limits.max_pods
+    last_actions = list(range(config.num_actions)) + [None]
+
+    assert reward_model.table.shape == (num_buckets, num_buckets, config.valid_pod_states, config.num_actions, config.num_actions + 1)
+
+    checked = 0
+    for cpu_bucket, ram_bucket, replicas, action, last_action in itertools.product(
+        range(num_buckets),
+        range(num_buckets),
+        range(min_pods, max_pods + 1),
+        range(config.num_actions),
+        last_actions,
+    ):
+        expected = mock_env.calculate_reward(cpu_bucket, ram_bucket, replicas, action, last_action)
+        assert reward_model.reward(cpu_bucket, ram_bucket, replicas, action, last_action) == pytest.approx(expected), (
+            cpu_bucket, ram_bucket, replicas, action, last_action
+        )
+        checked += 1
+    assert checked == reward_model.table.size
+
+
+@pytest.mark.parametrize("cpu_bucket", [0, -1])
+@pytest.mark.parametrize("ram_bucket", [0, -1])
+@pytest.mark.parametrize("replicas", ["min", "max"])
+def test_edge_buckets_and_pod_limits(reward_model, cpu_bucket, ram_bucket, replicas):
+    config = get_config()
+    cpu_bucket %= config.metrics_config.num_buckets
+    ram_bucket %= config.metrics_config.num_buckets
+    replicas = config.system_limits.min_pods if replicas == "min" else config.system_limits.max_pods
+
+    for action in range(config.num_actions):
+        for last_action in list(range(config.num_actions)) + [None]:
+            expected = mock_env.calculate_reward(cpu_bucket, ram_bucket, replicas, action, last_action)
+            assert reward_model.reward(cpu_bucket, ram_bucket, replicas, action, last_action) == pytest.approx(expected)
+
+
+def test_batch_lookup_and_catastrophic_reward(reward_model):
+    config = get_config()
+    rng = np.random.default_rng(0)
+    size = 500
+    cpu = rng.integers(0, config.metrics_config.num_buckets, size)
+    ram = rng.integers(0, config.metrics_config.num_buckets, size)
+    replicas = rng.integers(config.system_limits.min_pods, config.system_limits.max_pods + 1, size)
+    actions = rng.integers(0, config.num_actions, size)
+    last_actions = rng.integers(NO_LAST_ACTION, config.num_actions, size)
+    dones = rng.random(size) < 0.1
+
+    rewards = reward_model.reward_batch(cpu, ram, replicas, actions, last_actions, dones)
+    for row in range(size):
+        last_action = None if last_actions[row] == NO_LAST_ACTION else int(last_actions[row])
+        expected = mock_env.calculate_reward(int(cpu[row]), int(ram[row]), int(replicas[row]), int(actions[row]), last_action, bool(dones[row]))
+        assert rewards[row] == pytest.approx(expected)
+
+
+def test_inputs_outside_the_table_fall_back_to_calculate_reward(reward_model):
+    max_pods = get_config().system_limits.max_pods
+    assert reward_model.reward(0, 0, max_pods + 3, 1, None) == mock_env.calculate_reward(0, 0, max_pods + 3, 1, None)
+
+
+def test_verify_passes_and_catches_a_wrong_entry():
+    model = RewardModel()
+    model.verify()
+
+    model.table = model.table.copy()
+    model.table[0, -1, -1, 0, NO_LAST_ACTION] += 1.0
+    with pytest.raises(ValueError, match="Reward table mismatch"):
+        model.verify()
@@ -0,0 +1,127 @@
+import os
+import pickle
+import sys
+import tempfile
+import numpy as np
+import pytest
+from conftest import BACKEND_DIR
+
+# everything the server writes goes to a scratch directory, scaling never reaches a cluster
+SCRATCH_DIR = tempfile.mkdtemp(prefix="autoscaler-server-")
+os.environ["JOURNAL_DIR"] = os.path.join(SCRATCH_DIR, "journal")
+os.environ["DEPLOYMENT_MODEL_DIR"] = os.path.join(SCRATCH_DIR, "deployments")
+os.environ["REPLAY_INTERVAL"] = "0"
+os.environ["SCALER_BACKEND"] = "fake"
+sys.path.insert(0, os.path.join(BACKEND_DIR, "api"))
+
+from fastapi.testclient import TestClient
+import model_store
+import server
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def greedy_model():
+    # a table without ties and no exploration, so every endpoint has exactly one right answer
+    def install():
+        server.agent.epsilon = 0.0
+        server.agent.load_q_table(np.random.default_rng(0).random((server.num_states, server.num_actions)))
+
+    server.learner.call(install)
+
+
+def test_decide_batch_matches_decide_for_every_row(client, greedy_model):
+    # pod counts outside of the limits are clipped the same way by both endpoints
+    rows = [
+        {"pod_count": pod_count, "cpu_usage": cpu_usage, "ram_usage": ram_usage}
+        for cpu_usage in (0, 37.5, 99.9, 100)
+        for ram_usage in (0, 64)
+        for pod_count in (-2, 0, 1, 7, server.MAX_PODS, server.MAX_PODS + 5)
+    ]
+    response = client.post("/decide-batch", json={"states": [{"deployment": "batch-vs-single", **row} for row in rows]})
+    assert response.status_code == 200
+    decisions = response.json()["decisions"]
+    assert len(decisions) == len(rows)
+
+    for row, decision in zip(rows, decisions):
+        single = client.post("/decide", json={**row, "is_crashed": False})
+        assert single.status_code == 200
+        assert decision["action"] == single.json()["action"], row
+
+
+def test_policy_answers_a_matching_etag_with_304(client, greedy_model):
+    response = client.get("/policy")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.content
+
+    unchanged = client.get("/policy", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+    assert not unchanged.content
+
+    # a list holding the tag matches too, another tag gets the table again
+    assert client.get("/policy", headers={"If-None-Match": f'W/"other", {etag}'}).status_code == 304
+    assert client.get("/policy", headers={"If-None-Match": 'W/"other"'}).status_code == 200
+
+def test_policy_query_streams_the_matching_states(client, greedy_model):
+    response = client.get("/policy/query", params={"pods": "1:2", "cpu": "90:", "format": "csv"})
+    assert response.status_code == 200
+    lines = response.text.strip().splitlines()
+    assert lines[0].startswith("state,cpu_bucket")
+    assert len(lines) - 1 == int(response.headers["X-Matching-States"]) > 0
+    assert all(row.split(",")[7] in ("1", "2") for row in lines[1:])
+
+    assert client.get("/policy/query", params={"format": "xml"}).status_code == 400
+
+
+@pytest.fixture
+def model_dir(tmp_path, monkeypatch):
+    directory = tmp_path / "models"
+    directory.mkdir()
+    monkeypatch.setattr(server, "MODEL_DIR", os.path.realpath(directory))
+    return directory
+
+# unpickling it leaves a file behind
+class Exploit:
+    def __init__(self, marker):
+        self.marker = marker
+
+    def __reduce__(self):
+        return (open, (self.marker, "w"))
+
+
+def test_reload_only_reads_model_files_inside_the_model_directory(client, model_dir, tmp_path):
+    outside = tmp_path / "outside.bin"
+    model_store.save_model(str(outside), {"q_table": np.zeros((server.num_states, server.num_actions))})
+    (model_dir / "link.bin").symlink_to(outside)
+
+    for path in ("../outside.bin", str(outside), "link.bin"):
+        response = client.post("/admin/reload-model", json={"path": path})
+        assert response.status_code == 403, path
+    assert client.post("/admin/reload-model", json={"path": "missing.bin"}).status_code == 404
+
+def test_reload_never_unpickles(client, model_dir, tmp_path):
+    marker = tmp_path / "unpickled"
+    with open(model_dir / "brain_model.pkl", "wb") as f:
+        pickle.dump(Exploit(str(marker)), f)
+
+    response = client.post("/admin/reload-model", json={"path": "brain_model.pkl"})
+    assert response.status_code == 400
+    assert not marker.exists()
+
+def test_merge_reload_keeps_what_was_learned_online(client, model_dir, greedy_model):
+    with server.model_lock:
+        current = np.asarray(server.agent.q_table, dtype=np.float64).copy()
+        merge_base = server.base_arrays or server.initial_arrays()
+    new = np.random.default_rng(1).random((server.num_states, server.num_actions))
+    model_store.save_model(str(model_dir / "next.bin"), {"q_table": new})
+
+    response = client.post("/admin/reload-model", json={"path": "next.bin", "policy": "merge"})
+    assert response.status_code == 200
+    assert np.allclose(server.learner.snapshot.model.q_table, new + current - merge_base["q_table"])
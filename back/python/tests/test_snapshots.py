@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from agents.q_learning.q_learning import QLearningAgent, STORAGE_LIST, STORAGE_NUMPY, STORAGE_SPARSE
+from agents.q_learning.tile_coding import TileCodingAgent
+
+NUM_STATES = 200
+NUM_ACTIONS = 4
+
+
+def dense(agent) -> np.ndarray:
+    return np.asarray(agent.q_table, dtype=np.float64)
+
+def learn(agent, rng, count):
+    for _ in range(count):
+        agent.updateAction(int(rng.integers(NUM_STATES)), int(rng.integers(NUM_ACTIONS)), float(rng.normal()), int(rng.integers(NUM_STATES)), False)
+    size = 8
+    agent.update_batch(rng.integers(0, NUM_STATES, size), rng.integers(0, NUM_ACTIONS, size), rng.normal(size=size), rng.integers(0, NUM_STATES, size), np.zeros(size, dtype=bool))
+
+
+@pytest.mark.parametrize("storage", [STORAGE_LIST, STORAGE_NUMPY, STORAGE_SPARSE])
+def test_snapshots_match_the_live_table_and_never_change(storage):
+    rng = np.random.default_rng(0)
+    agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=storage, epsilon=0.0)
+    held = []
+    for step in range(30):
+        learn(agent, rng, 5)
+        snapshot = agent.snapshot()
+        assert np.array_equal(dense(snapshot), dense(agent))
+        # readers warm the policy cache of the snapshot, it has to follow the synced rows
+        assert np.array_equal(snapshot.greedy_policy(), agent.greedy_policy())
+        if step % 7 == 0:
+            held.append((snapshot, dense(snapshot)))
+
+    for snapshot, values in held:
+        assert np.array_equal(dense(snapshot), values)
+
+def test_a_publish_copies_only_the_written_rows():
+    agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=STORAGE_NUMPY)
+    agent.snapshot()
+    agent.snapshot()
+    agent.updateAction(3, 1, 1.0, 4, False)
+    buffer, rows = agent.snapshot_buffers.acquire(agent.q_table)
+    assert rows.tolist() == [3]
+
+def test_a_held_snapshot_gets_a_fresh_copy_instead_of_being_reused():
+    agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=STORAGE_NUMPY)
+    first = agent.snapshot()
+    second = agent.snapshot()
+    agent.updateAction(3, 1, 1.0, 4, False)
+    third = agent.snapshot()
+    assert first.q_table is not third.q_table and second.q_table is not third.q_table
+    assert first.q_table[3, 1] == second.q_table[3, 1] != third.q_table[3, 1]
+
+def test_reloading_the_table_copies_it_in_full():
+    agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=STORAGE_NUMPY)
+    agent.snapshot()
+    agent.snapshot()
+    agent.load_q_table(np.arange(NUM_STATES * NUM_ACTIONS, dtype=np.float64).reshape(NUM_STATES, NUM_ACTIONS))
+    assert np.array_equal(dense(agent.snapshot()), dense(agent))
+
+def test_snapshots_of_read_only_tables_reject_writes():
+    agent = QLearningAgent(NUM_STATES, NUM_ACTIONS, storage=STORAGE_NUMPY)
+    agent.snapshot()
+    agent.updateAction(3, 1, 1.0, 4, False)
+    snapshot = agent.snapshot()
+    with pytest.raises(ValueError):
+        snapshot.q_table[3, 1] = 0.0
+
+def test_tile_coding_snapshots_follow_the_weights():
+    rng = np.random.default_rng(0)
+    agent = TileCodingAgent(NUM_ACTIONS, seed=0)
+    held = []
+    for _ in range(10):
+        states = np.column_stack([rng.uniform(0, 100, 8), rng.uniform(0, 100, 8), rng.integers(1, 10, 8)])
+        agent.update_batch(states, rng.integers(0, NUM_ACTIONS, 8), rng.normal(size=8), states, np.zeros(8, dtype=bool))
+        agent.updateAction(states[0], 1, 1.0, states[1], False)
+        snapshot = agent.snapshot()
+        assert np.array_equal(snapshot.weights, agent.weights)
+        held.append((snapshot, snapshot.weights.copy()))
+    for snapshot, weights in held:
+        assert np.array_equal(snapshot.weights, weights)
@@ -1,176 +1,455 @@
 from agents.q_learning.mock_env import MockKubernetesEnv
+from agents.q_learning.vector_env import VectorizedMockKubernetesEnv
 from agents.q_learning.q_learning import QLearningAgent
-from agents.bandit.bandit_safety import SafetyBandit
-from config_loader import APP_CONFIG
-import pickle
-import matplotlib.pyplot as plt
+from agents.bandit.bandit_safety import SafetyBandit, build_pod_limit_masks
+from config_loader import APP_CONFIG, get_config
+from convergence import ConvergenceMonitor
+from state_codec import StateCodec
+from telemetry import TelemetryWriter
+import model_store
+import policy_export
+import argparse
+import multiprocessing
+import queue
+import random
+from multiprocessing import shared_memory
 import numpy as np
+from typing import NamedTuple
 
-def train_system():
-    min_pods = APP_CONFIG["system_limits"]["min_pods"]
-    max_pods = APP_CONFIG["system_limits"]["max_pods"]
-    num_buckets = APP_CONFIG["metrics_config"]["num_buckets"]
-    valid_pod_states = max_pods - min_pods + 1
-    
-    num_states = num_buckets * num_buckets * valid_pod_states
+TELEMETRY_PATH = "api/training_telemetry.bin"
+# how often train_parallel looks for crashed workers while it waits for results
+WORKER_POLL_SECONDS = 1.0
+POLICY_PATH = "api/brain_policy.bin"
+
+
+class WorkerDiedError(RuntimeError):
+    pass
+
+
+class EpisodeResult(NamedTuple):
+    total_reward: float
+    length: int
+    failures: int
+    epsilon: float
+    q_max_delta: float
+    q_mean_delta: float
+
+
+def get_state_space():
+    codec = StateCodec.from_config(get_config())
     num_actions = len(APP_CONFIG["actions"])
-    
+    return codec.num_states, num_actions, codec.valid_pod_states
+
+def build_agent(num_states: int, num_actions: int, valid_pod_states: int, storage: str = "numpy") -> QLearningAgent:
+    agent = QLearningAgent(num_states=num_states, num_actions=num_actions, storage=storage)
+
+    # actions that break the pod limits should never look attractive
+    pod_limit_masks = build_pod_limit_masks(valid_pod_states, num_actions)
+    if storage == "sparse":
+        # one default row per pod count instead of writing every edge state
+        agent.q_table.set_defaults(np.where(pod_limit_masks, APP_CONFIG["rl_hyperparameters"]["q_value_init"], -1e9))
+        return agent
+    state_pod_index = np.arange(num_states) % valid_pod_states
+    agent.q_table[~pod_limit_masks[state_pod_index]] = -1e9
+    return agent
+
+# plays one episode on the mock environment, learning from every step
+# the result carries the max and mean |dQ| of its updates and the epsilon it was played with
+def run_episode(env, agent, safety_bandit) -> EpisodeResult:
+    state = env.reset()
+    epsilon = agent.epsilon
+    done = False
+    total_reward = 0
+    max_delta = 0.0
+    sum_delta = 0.0
+    steps = 0
+    failures = 0
+
+    while not done:
+        # bandit-safe actions (all of them when none is safe) inside the pod limits
+        final_safe_actions = safety_bandit.get_allowed_actions(state)
+
+        action = agent.select_action(state, allowed_actions=final_safe_actions)
+        is_catastrophic = env.is_failure(action)
+        next_state, reward, done, info = env.step(action)
+
+        if is_catastrophic:
+            reward += APP_CONFIG["rl_hyperparameters"]["catastrophic_penalty"]
+            done = True
+            failures += 1
+
+        safety_bandit.update_from_outcome(state=state, action=action, is_catastrophic_failure=is_catastrophic)
+        q_delta = abs(agent.updateAction(state, action, reward, next_state, done))
+        max_delta = max(max_delta, q_delta)
+        sum_delta += q_delta
+        steps += 1
+
+        state = next_state
+        total_reward += reward
+
+    return EpisodeResult(total_reward, steps, failures, epsilon, max_delta, sum_delta / steps)
+
+def train_system(warm_start: str = None, telemetry_path: str = TELEMETRY_PATH, storage: str = "numpy"):
+    num_states, num_actions, valid_pod_states = get_state_space()
+
     env = MockKubernetesEnv()
-    agent = QLearningAgent(num_states=num_states, num_actions=num_actions)
-    
-    all_possible_actions = list(APP_CONFIG["actions"].values())
-
-    for state_idx in range(num_states):
-        current_pods = (state_idx % valid_pod_states) + min_pods
-        allowed_for_this_state = all_possible_actions.copy()
-        
-        if current_pods <= min_pods and APP_CONFIG["actions"]["scale_down"] in allowed_for_this_state:
-            allowed_for_this_state.remove(APP_CONFIG["actions"]["scale_down"])
-            
-        if current_pods >= max_pods and APP_CONFIG["actions"]["scale_up"] in allowed_for_this_state:
-            allowed_for_this_state.remove(APP_CONFIG["actions"]["scale_up"])
-            
-        for action in all_possible_actions:
-            if action not in allowed_for_this_state:
-                agent.q_table[state_idx][action] = -1e9
-                
-    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+    env.reward_model.verify()
+    agent = build_agent(num_states, num_actions, valid_pod_states, storage)
+    if warm_start:
+        load_warm_start(agent, warm_start)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions, storage=storage)
 
     print("Start Training Session")
-    
-    alpha_val = APP_CONFIG["rl_hyperparameters"]["alpha"]
-    
-    episodes_history = []
-    rewards_history = []
+
+    monitor = ConvergenceMonitor()
+    print(monitor.criteria())
+
+    count_with_epsilon_above_min = 0
+
+    episode = 0
+    converged = False
+    with TelemetryWriter(telemetry_path) as telemetry:
+        while not converged:
+            result = run_episode(env, agent, safety_bandit)
+
+            agent.decay_epsilon()
+            if(agent.epsilon > APP_CONFIG["rl_hyperparameters"]["epsilon_min"]):
+                count_with_epsilon_above_min += 1
+
+            telemetry.record(episode + 1, *result)
+            converged = monitor.end_episode(result.total_reward, result.q_max_delta, result.q_mean_delta)
+
+            if (episode + 1) % 100 == 0:
+                print(f"Episode {episode + 1}: Avg Reward: {result.total_reward:.2f}")
+
+            if monitor.checked:
+                print(monitor.describe())
+
+            episode += 1
+
+    print("Training Finished!")
+    print("------------------------------------")
+    print("epsilon:", agent.epsilon)
+    print("Total episodes ran:", episode)
+    print("Episodes with epsilon > min:", count_with_epsilon_above_min)
+    print("Episodes with epsilon < min:", episode - count_with_epsilon_above_min)
+    print("------------------------------------")
+
+    save_results(agent, safety_bandit, episode, telemetry_path)
+
+    return agent, safety_bandit
+
+# same training loop as train_system, but steps num_envs clusters in lockstep
+def train_vectorized(num_envs: int = 256, seed: int = None, warm_start: str = None, telemetry_path: str = TELEMETRY_PATH, storage: str = "numpy"):
+    num_states, num_actions, valid_pod_states = get_state_space()
+
+    env = VectorizedMockKubernetesEnv(num_envs=num_envs, seed=seed)
+    env.reward_model.verify()
+    agent = build_agent(num_states, num_actions, valid_pod_states, storage)
+    agent.rng = np.random.default_rng(seed)
+    if warm_start:
+        load_warm_start(agent, warm_start)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions, storage=storage)
+
+    print(f"Start Vectorized Training Session ({num_envs} environments)")
+
+    epsilon_min = APP_CONFIG["rl_hyperparameters"]["epsilon_min"]
+    catastrophic_penalty = APP_CONFIG["rl_hyperparameters"]["catastrophic_penalty"]
+
+    monitor = ConvergenceMonitor()
+    print(monitor.criteria())
+    telemetry = TelemetryWriter(telemetry_path)
+
     count_with_epsilon_above_min = 0
 
-    recent_rewards = []
-    window_size = 1000
-    
-    convergence_threshold = APP_CONFIG["rl_hyperparameters"]["convergence_threshold"]
-    print(f"Dynamic Convergence Threshold set to: {convergence_threshold:.3f} (based on Alpha: {alpha_val})")
-    
-    previous_window_avg = None
-    reward_diff = float('inf')
+    states = env.reset()
+    total_rewards = np.zeros(num_envs, dtype=np.float64)
+    # per-environment |dQ| of the running episodes
+    max_deltas = np.zeros(num_envs, dtype=np.float64)
+    sum_deltas = np.zeros(num_envs, dtype=np.float64)
+    steps = np.zeros(num_envs, dtype=np.int64)
+    failures = np.zeros(num_envs, dtype=np.int64)
 
     episode = 0
-    while reward_diff > convergence_threshold:
-        state = env.reset()
-        done = False
-        total_reward = 0
-
-        while not done:
-            bandit_safe_actions = safety_bandit.get_safe_actions(state=state, max_failure_rate=0.4, min_tries=200)
-            
-            if not bandit_safe_actions:
-                bandit_safe_actions = [APP_CONFIG["actions"]["scale_up"], APP_CONFIG["actions"]["scale_down"], APP_CONFIG["actions"]["no_action"], APP_CONFIG["actions"]["restart"]]
-                
-            current_pods = (state % valid_pod_states) + min_pods
-            final_safe_actions = bandit_safe_actions.copy()
-            
-            if current_pods <= min_pods:
-                if APP_CONFIG["actions"]["scale_down"] in final_safe_actions: final_safe_actions.remove(APP_CONFIG["actions"]["scale_down"])
-            if current_pods >= max_pods:
-                if APP_CONFIG["actions"]["scale_up"] in final_safe_actions: final_safe_actions.remove(APP_CONFIG["actions"]["scale_up"])
-            
-            action = agent.select_action(state, allowed_actions=final_safe_actions)
-            is_catastrophic = env.is_failure(action)
-            next_state, reward, done, info = env.step(action)
-            
-            if is_catastrophic:
-                reward += APP_CONFIG["rl_hyperparameters"]["catastrophic_penalty"]
-                done = True
-            
-            safety_bandit.update_from_outcome(state=state, action=action, is_catastrophic_failure=is_catastrophic)
-            agent.updateAction(state, action, reward, next_state, done)
-            
-            state = next_state
-            total_reward += reward
-        
-        agent.decay_epsilon()
-        if(agent.epsilon > APP_CONFIG["rl_hyperparameters"]["epsilon_min"]):
-            count_with_epsilon_above_min += 1
-            
-        rewards_history.append(total_reward)
-        episodes_history.append(episode + 1)
-        
-        recent_rewards.append(total_reward)
-        if len(recent_rewards) > window_size:
-            recent_rewards.pop(0)
-
-        if (episode + 1) % 100 == 0:
-            print(f"Episode {episode + 1}: Avg Reward: {total_reward:.2f}")
-
-        if (episode + 1) % 5000 == 0 and len(recent_rewards) == window_size:
-            current_window_avg = np.mean(recent_rewards)
-            
-            if previous_window_avg is not None:
-                reward_diff = abs(current_window_avg - previous_window_avg)
-                print(f"--- Episode {episode+1}: Current Avg: {current_window_avg:.2f}, Prev Avg: {previous_window_avg:.2f}, Diff: {reward_diff:.4f} ---")
-                    
-            previous_window_avg = current_window_avg
-            
-        episode += 1
+    converged = False
+    try:
+        while not converged:
+            masks = safety_bandit.allowed_masks(states)
+
+            actions = agent.select_actions(states, masks)
+            is_catastrophic = env.is_failure(actions)
+            next_states, rewards, dones, info = env.step(actions)
+
+            rewards = rewards + np.where(is_catastrophic, catastrophic_penalty, 0.0)
+            dones = dones | is_catastrophic
+
+            safety_bandit.update_from_outcomes(states, actions, is_catastrophic)
+            td_errors = agent.update_batch(states, actions, rewards, info["final_states"], dones)
+
+            q_deltas = np.abs(agent.alpha * td_errors)
+            np.maximum(max_deltas, q_deltas, out=max_deltas)
+            sum_deltas += q_deltas
+            steps += 1
+            failures += is_catastrophic
+
+            states = next_states
+            total_rewards += rewards
+
+            for env_index in np.flatnonzero(dones):
+                total_reward = float(total_rewards[env_index])
+                q_max_delta = max_deltas[env_index]
+                q_mean_delta = sum_deltas[env_index] / steps[env_index]
+                telemetry.record(episode + 1, total_reward, steps[env_index], failures[env_index], agent.epsilon, q_max_delta, q_mean_delta)
+
+                agent.decay_epsilon()
+                if agent.epsilon > epsilon_min:
+                    count_with_epsilon_above_min += 1
+
+                if monitor.end_episode(total_reward, q_max_delta, q_mean_delta):
+                    converged = True
+
+                if (episode + 1) % 10000 == 0:
+                    print(f"Episode {episode + 1}: Avg Reward: {monitor.window_mean:.2f}")
+
+                if monitor.checked:
+                    print(monitor.describe())
+
+                episode += 1
+            total_rewards[dones] = 0.0
+            max_deltas[dones] = 0.0
+            sum_deltas[dones] = 0.0
+            steps[dones] = 0
+            failures[dones] = 0
+    finally:
+        telemetry.close()
 
     print("Training Finished!")
     print("------------------------------------")
     print("epsilon:", agent.epsilon)
-    print("Total episodes ran:", episode + 1)
+    print("Total episodes ran:", episode)
     print("Episodes with epsilon > min:", count_with_epsilon_above_min)
-    print("Episodes with epsilon < min:", (episode + 1) - count_with_epsilon_above_min)
+    print("Episodes with epsilon < min:", episode - count_with_epsilon_above_min)
     print("------------------------------------")
 
-    gamma_val = APP_CONFIG["rl_hyperparameters"]["gamma"]
-    decay_val = APP_CONFIG["rl_hyperparameters"]["epsilon_decay"]
-    
-    plt.figure(figsize=(10, 5))
-    plt.plot(episodes_history, rewards_history, alpha=0.3, label='Raw Reward')
-    
-    window = 50
-    if len(rewards_history) >= window:
-        moving_avg = np.convolve(rewards_history, np.ones(window)/window, mode='valid')
-        plt.plot(episodes_history[window-1:], moving_avg, color='red', label='Moving Avg')
-    
-    plt.title(f'Learning Curve\nAlpha: {alpha_val} | Gamma: {gamma_val} | Epsilon Decay: {decay_val}\nStop Diff: {convergence_threshold:.3f}')
-    plt.xlabel('Episodes')
-    plt.ylabel('Reward')
-    plt.legend()
-    plt.savefig('api/learning_curve.png')
-    
-    with open("api/brain_model.pkl", "wb") as f:
-        pickle.dump({
-            "q_table": agent.q_table,
-            "bandit_counts": safety_bandit.action_counts,
-            "bandit_failures": safety_bandit.failure_counts
-        }, f)
-    
-    print("Model saved to brain_model.pkl")
-    
-    action_names = {v: k for k, v in APP_CONFIG["actions"].items()}
-    with open("api/brain_readable.txt", "w") as f:
-        f.write("--- Q-Learning Final Report ---\n")
-        f.write(f"Total Episodes: {episode + 1}\n")
-        f.write("-----------------------------\n\n")
-        
-        for state_idx, q_values in enumerate(agent.q_table):
-            replicas = (state_idx % valid_pod_states) + min_pods
-            remaining = state_idx // valid_pod_states
-            ram_bucket = remaining % num_buckets
-            cpu_bucket = remaining // num_buckets
-            
-            f.write(f"State {state_idx} [CPU Bucket: {cpu_bucket}, RAM Bucket: {ram_bucket}, Pods: {replicas}]:\n")
-            for action_idx, score in enumerate(q_values):
-                action_name = action_names.get(action_idx, "Unknown")
-                f.write(f"  Action '{action_name}': {score:.2f}\n")
-            
-            best_action_idx = q_values.index(max(q_values))
-            best_action_name = action_names.get(best_action_idx, "Unknown")
-            f.write(f"  >> BEST CHOICE: {best_action_name}\n")
-            f.write("-----------------------------\n")
-            
-    print("Readable report saved to brain_readable.txt")
+    save_results(agent, safety_bandit, episode, telemetry_path)
 
     return agent, safety_bandit
 
+# shared-memory arrays the parallel workers train on together
+SHARED_TABLES = {
+    "q_table": np.float64,
+    "bandit_counts": np.int64,
+    "bandit_failures": np.int64,
+}
+
+def _attach_shared_tables(names: dict, shape: tuple):
+    handles = {}
+    arrays = {}
+    for key, dtype in SHARED_TABLES.items():
+        handles[key] = shared_memory.SharedMemory(name=names[key])
+        arrays[key] = np.ndarray(shape, dtype=dtype, buffer=handles[key].buf)
+    return handles, arrays
+
+# one actor process: its own env and seed, learning straight into the shared tables
+# updates are lock-free (hogwild), a lost update now and then does not hurt Q-learning
+def _parallel_worker(worker_seed: int, names: dict, shape: tuple, episode_counter, stop_event, results, report_every: int = 50):
+    random.seed(worker_seed)
+    num_states, num_actions, _ = get_state_space()
+    epsilon_start = APP_CONFIG["rl_hyperparameters"]["epsilon"]
+    epsilon_min = APP_CONFIG["rl_hyperparameters"]["epsilon_min"]
+    epsilon_decay = APP_CONFIG["rl_hyperparameters"]["epsilon_decay"]
+
+    env = MockKubernetesEnv()
+    # other workers write the shared table too, a per-process greedy cache would go stale
+    agent = QLearningAgent(num_states=num_states, num_actions=num_actions, storage="numpy", seed=worker_seed, cache_policy=False)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+
+    handles, arrays = _attach_shared_tables(names, shape)
+    agent.q_table = arrays["q_table"]
+    safety_bandit.load_counts(arrays["bandit_counts"], arrays["bandit_failures"], copy=False)
+
+    pending = []
+    while not stop_event.is_set():
+        # epsilon follows the global episode count so N workers decay it like one long run
+        with episode_counter.get_lock():
+            episode_counter.value += 1
+            global_episode = episode_counter.value
+        agent.epsilon = max(epsilon_min, epsilon_start * epsilon_decay ** global_episode)
+
+        pending.append(run_episode(env, agent, safety_bandit))
+        if len(pending) >= report_every:
+            results.put(pending)
+            pending = []
+            # pick up the failure counts the other workers added
+            safety_bandit.refresh_safety()
+
+    results.put(pending)
+    results.put(None)
+
+    del agent.q_table, safety_bandit.action_counts, safety_bandit.failure_counts, arrays
+    for handle in handles.values():
+        handle.close()
+
+def _check_workers(processes):
+    crashed = [process for process in processes if process.exitcode not in (None, 0)]
+    if crashed:
+        details = ", ".join(f"{process.name} (exit code {process.exitcode})" for process in crashed)
+        raise WorkerDiedError(f"Training worker died: {details}")
+
+# results.get() that raises when a worker died (OOM kill, an exception) instead of waiting forever
+def _next_result(results, processes, poll_seconds: float = WORKER_POLL_SECONDS):
+    while True:
+        _check_workers(processes)
+        try:
+            return results.get(timeout=poll_seconds)
+        except queue.Empty:
+            pass
+
+# same training as train_system, split across independent worker processes
+# that share one Q table, convergence is checked here on the rewards of all workers
+def train_parallel(workers: int, seed: int = None, warm_start: str = None, telemetry_path: str = TELEMETRY_PATH):
+    num_states, num_actions, valid_pod_states = get_state_space()
+    shape = (num_states, num_actions)
+
+    MockKubernetesEnv().reward_model.verify()
+    agent = build_agent(num_states, num_actions, valid_pod_states)
+    if warm_start:
+        load_warm_start(agent, warm_start)
+    safety_bandit = SafetyBandit(num_states=num_states, arms_count=num_actions)
+
+    handles = {}
+    for key, dtype in SHARED_TABLES.items():
+        handles[key] = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    names = {key: handle.name for key, handle in handles.items()}
+    shared = {key: np.ndarray(shape, dtype=dtype, buffer=handles[key].buf) for key, dtype in SHARED_TABLES.items()}
+    shared["q_table"][:] = agent.q_table
+    shared["bandit_counts"][:] = 0
+    shared["bandit_failures"][:] = 0
+
+    print(f"Start Parallel Training Session ({workers} workers)")
+
+    epsilon_min = APP_CONFIG["rl_hyperparameters"]["epsilon_min"]
+
+    episode_counter = multiprocessing.Value("q", 0)
+    stop_event = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    base_seed = seed if seed is not None else random.randrange(2 ** 31)
+    processes = [
+        multiprocessing.Process(target=_parallel_worker, args=(base_seed + worker_id, names, shape, episode_counter, stop_event, results))
+        for worker_id in range(workers)
+    ]
+
+    monitor = ConvergenceMonitor()
+    print(monitor.criteria())
+    telemetry = TelemetryWriter(telemetry_path)
+
+    try:
+        for process in processes:
+            process.start()
+
+        episode = 0
+        finished_workers = 0
+        converged = False
+        while not converged and finished_workers < workers:
+            batch = _next_result(results, processes)
+            if batch is None:
+                finished_workers += 1
+                continue
+
+            for result in batch:
+                telemetry.record(episode + 1, *result)
+                if monitor.end_episode(result.total_reward, result.q_max_delta, result.q_mean_delta):
+                    converged = True
+
+                if (episode + 1) % 10000 == 0:
+                    print(f"Episode {episode + 1}: Avg Reward: {monitor.window_mean:.2f}")
+
+                if monitor.checked:
+                    print(monitor.describe())
+
+                episode += 1
+
+        stop_event.set()
+        # drain the queue so no worker blocks on a full pipe while exiting
+        while finished_workers < workers:
+            if _next_result(results, processes) is None:
+                finished_workers += 1
+        for process in processes:
+            process.join()
+        _check_workers(processes)
+
+        agent.load_q_table(shared["q_table"])
+        safety_bandit.load_counts(shared["bandit_counts"], shared["bandit_failures"])
+    finally:
+        telemetry.close()
+        stop_event.set()
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        del shared
+        for handle in handles.values():
+            handle.close()
+            handle.unlink()
+
+    agent.epsilon = max(epsilon_min, agent.epsilon * agent.epsilon_decay ** episode_counter.value)
+
+    print("Training Finished!")
+    print("------------------------------------")
+    print("epsilon:", agent.epsilon)
+    print("Total episodes ran:", episode_counter.value)
+    print("Episodes reported before stopping:", episode)
+    print("------------------------------------")
+
+    save_results(agent, safety_bandit, episode_counter.value, telemetry_path)
+
+    return agent, safety_bandit
+
+def save_model(agent, safety_bandit, path: str = "api/brain_model.bin", run_id: str = None) -> dict:
+    header = model_store.save_model(path, {
+        "q_table": np.asarray(agent.q_table, dtype=np.float64),
+        "bandit_counts": np.asarray(safety_bandit.action_counts, dtype=np.int64),
+        "bandit_failures": np.asarray(safety_bandit.failure_counts, dtype=np.int64),
+    }, run_id=run_id)
+
+    print(f"Model saved to {path} (run {header['run_id']})")
+    return header
+
+# the greedy action per state for controllers that decide locally, checked against the Q table
+def save_policy(agent, run_id: str, path: str = POLICY_PATH):
+    header = policy_export.export_policy(path, agent.q_table, run_id=f"policy-{run_id}")
+    print(f"Policy table saved to {path} and verified against the Q table (run {header['run_id']})")
+
+# starts training from a saved Q table (e.g. the one solve.py writes)
+# accepts both the binary model and an old brain_model.pkl
+def load_warm_start(agent, path: str):
+    arrays = model_store.load_model_arrays(path)
+    agent.load_q_table(arrays["q_table"])
+    print(f"Warm start from {path}")
+
+# the learning curve is no longer drawn here, telemetry.py plots the log (also during training)
+# and the per-state report is generated on demand by policy_report.py instead of dumped here
+def save_results(agent, safety_bandit, total_episodes, telemetry_path: str = TELEMETRY_PATH):
+    header = save_model(agent, safety_bandit)
+    save_policy(agent, header["run_id"])
+
+    print(f"Trained for {total_episodes} episodes, query the policy with: python policy_report.py api/brain_model.bin --help")
+    print(f"Training telemetry saved to {telemetry_path} (plot it with: python telemetry.py plot {telemetry_path})")
+
 if __name__ == "__main__":
-    train_system()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the autoscaler Q-learning brain")
+    parser.add_argument("--vectorized", action="store_true", help="step many mock clusters in lockstep")
+    parser.add_argument("--num-envs", type=int, default=256, help="number of mock clusters in vectorized mode")
+    parser.add_argument("--workers", type=int, default=0, help="train with this many worker processes sharing one Q table")
+    parser.add_argument("--seed", type=int, default=None, help="random seed for vectorized and parallel modes")
+    parser.add_argument("--warm-start", default=None, help="model file to start from instead of an empty Q table")
+    parser.add_argument("--telemetry", default=TELEMETRY_PATH, help="per-episode stats log, see telemetry.py")
+    parser.add_argument("--storage", choices=["numpy", "sparse"], default=APP_CONFIG.get("agent", {}).get("storage", "numpy"),
+                        help="Q table and bandit storage, parallel workers always share dense tables")
+    args = parser.parse_args()
+
+    if args.workers > 0:
+        train_parallel(workers=args.workers, seed=args.seed, warm_start=args.warm_start, telemetry_path=args.telemetry)
+    elif args.vectorized:
+        train_vectorized(num_envs=args.num_envs, seed=args.seed, warm_start=args.warm_start, telemetry_path=args.telemetry, storage=args.storage)
+    else:
+        train_system(warm_start=args.warm_start, telemetry_path=args.telemetry, storage=args.storage)
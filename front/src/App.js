@@ -1,6 +1,8 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
 
+const MAX_LOG_LINES = 100;
+
 function App() {
   const [status, setStatus] = useState({
     pods: 0,
@@ -18,48 +20,37 @@ function App() {
   const [isConnected, setIsConnected] = useState(false);
   const [currentView, setCurrentView] = useState('dashboard');
 
-  const fetchStatus = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/status');
-      if (response.ok) {
-        const data = await response.json();
-        setStatus(data);
-        setIsConnected(true);
-        setIsCooldown(data.action && data.action.includes("Resting"));
-      } else {
-        setIsConnected(false);
-      }
-    } catch (error) {
+  // the server pushes "status" and "log" events, EventSource reconnects by itself and
+  // resumes the log after the last entry it received
+  useEffect(() => {
+    const events = new EventSource('http://localhost:8000/events');
+
+    events.onopen = () => setIsConnected(true);
+
+    events.addEventListener('status', (event) => {
+      const data = JSON.parse(event.data);
+      setStatus(data);
+      setIsConnected(true);
+      setIsCooldown(data.action && data.action.includes("Resting"));
+    });
+
+    events.addEventListener('log', (event) => {
+      const entry = JSON.parse(event.data);
+      setLogs((previous) => [...previous, entry].slice(-MAX_LOG_LINES));
+    });
+
+    events.onerror = () => {
       setIsConnected(false);
       setIsCooldown(false);
-    }
-  };
+    };
 
-  const fetchLogs = async () => {
-    try {
-      const response = await fetch('http://localhost:8000/logs-data');
-      if (response.ok) {
-        const data = await response.json();
-        setLogs(data.logs || []);
-      }
-    } catch (error) {}
-  };
-
-  useEffect(() => {
-    fetchStatus();
-    fetchLogs();
-    const interval = setInterval(() => {
-      fetchStatus();
-      fetchLogs();
-    }, 2000); 
-    return () => clearInterval(interval);
+    return () => events.close();
   }, []);
 
   const triggerLoad = async (type) => {
     if (!isConnected) return;
     try {
       await fetch(`http://localhost:8000/${type}`, { method: 'POST' });
-      fetchStatus();
     } catch (error) {
       console.error(`Error triggering ${type}:`, error);
     }
@@ -85,8 +76,8 @@ function App() {
             ) : logs.length === 0 ? (
               <span className="log-placeholder">Waiting for logs...</span>
             ) : (
-              logs.map((log, index) => (
-                <div key={index} className="log-line">{log}</div>
+              logs.map((entry) => (
+                <div key={entry.seq} className="log-line">{entry.message}</div>
               ))
             )}
           </div>